@@ -1,12 +1,24 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, Response, request, jsonify, session, stream_with_context
 from aim_waves.core.engine import (
+    compute_fingerprints,
     generate_batch_recommendations, 
     generate_recommendations_batch_push,
+    iter_recommendations_batch_push,
     START_TIME
 )
+from aim_waves.core import jobs
+from aim_waves.core.admission import admission
+from aim_waves.core.cascade import TierStats
+from aim_waves.core.neighbours import fitment_index
+from aim_waves.core.scheduler import scheduler
+from aim_waves.core.validator import ValidationStats
+from aim_waves.data.job_store import get_job_store
 from aim_waves.data.loader import vehicle_size_map
 from aim_waves.config import Config
 import re
+import json
+import threading
+import time
 import logging
 from datetime import datetime
 
@@ -32,6 +44,9 @@ def api_recommendations_batch():
     """
     NEW: Push Batch Endpoint.
     Growth Job sends a list of CAMs to process.
+    With `Accept: application/x-ndjson` the response is streamed: one
+    {"type": "result", "index", "result"} line per CAM as it completes,
+    then a final {"type": "summary", "run_id", "usage", ...} line.
     """
     payload = request.json
     if not payload:
@@ -50,11 +65,175 @@ def api_recommendations_batch():
     if len(cams) > 500:
         return jsonify({"error": "Batch size exceeds limit of 500"}), 400
 
+    # Optional fair-queuing hint ("low" / "normal" / "high" or a weight)
+    if payload.get("priority") is not None:
+        params = {**params, "priority": payload["priority"]}
+
+    # Admission control: reject with an estimated wait instead of overloading
+    if not admission.try_acquire(len(cams)):
+        retry_after = admission.estimate_wait(len(cams))
+        logger.warning(f"🚦 Engine saturated, rejecting run_id {run_id} ({len(cams)} CAMs), retry in {retry_after}s")
+        resp = jsonify({"error": "Engine saturated", "retry_after": retry_after, **admission.snapshot()})
+        resp.headers["Retry-After"] = str(retry_after)
+        return resp, 429
+
     logger.info(f"🚀 Processing batch for run_id: {run_id} ({len(cams)} CAMs)")
-    
-    results = generate_recommendations_batch_push(run_id, cams, params)
+
+    if "application/x-ndjson" in request.headers.get("Accept", ""):
+        response = Response(
+            stream_with_context(_stream_batch_lines(run_id, cams, params)),
+            mimetype="application/x-ndjson"
+        )
+        # Released when the WSGI server closes the response, even if the client
+        # goes away before the generator ever starts
+        response.call_on_close(_release_once(len(cams), time.time()))
+        return response
+
+    t_start = time.time()
+    try:
+        results = generate_recommendations_batch_push(run_id, cams, params)
+    finally:
+        admission.release(len(cams), time.time() - t_start)
     return jsonify(results)
 
+def _release_once(n, t_start):
+    """Admission release for a streamed batch that runs exactly once."""
+    lock = threading.Lock()
+    released = False
+
+    def release():
+        nonlocal released
+        with lock:
+            if released:
+                return
+            released = True
+        admission.release(n, time.time() - t_start)
+    return release
+
+def _stream_batch_lines(run_id, cams, params):
+    """NDJSON lines: a result line per completed CAM, then a summary line."""
+    usage = {
+        "prompt_token_count": 0,
+        "candidates_token_count": 0,
+        "total_token_count": 0,
+        "cached_content_token_count": 0
+    }
+    succeeded = 0
+    cache_report = {}
+    tier_stats = TierStats()
+    validation_stats = ValidationStats()
+    for idx, res in iter_recommendations_batch_push(run_id, cams, params, cache_report):
+        tier_stats.add(res)
+        validation_stats.add(res)
+        for k in usage:
+            usage[k] += (res.get("usage") or {}).get(k, 0) or 0
+        if res.get("success"):
+            succeeded += 1
+        yield json.dumps({"type": "result", "index": idx, "result": res}) + "\n"
+
+    summary = {
+        "type": "summary",
+        "run_id": run_id,
+        "count": len(cams),
+        "succeeded": succeeded,
+        "usage": usage
+    }
+    if cache_report:
+        summary["context_cache"] = cache_report
+    if tier_stats:
+        summary["cascade"] = tier_stats.report()
+    if validation_stats:
+        summary["validation"] = validation_stats.report()
+    yield json.dumps(summary) + "\n"
+
+@api_bp.route("/api/recommendations/fingerprints", methods=["POST"])
+def api_recommendation_fingerprints():
+    """
+    Input fingerprints for a list of CAMs (no model calls).
+    Same payload as the batch endpoint; returns {"fingerprints": [...]} in CAM order,
+    null for CAMs without candidate rows. Lets the Growth Job skip unchanged CAMs.
+    """
+    payload = request.json
+    if not payload:
+        return jsonify({"error": "Missing JSON payload"}), 400
+
+    cams = payload.get("cams")
+    params = payload.get("params", {})
+    if not isinstance(cams, list) or not cams:
+        return jsonify({"error": "Missing required field: cams"}), 400
+    if len(cams) > Config.JOB_MAX_CAMS:
+        return jsonify({"error": f"Fingerprint request exceeds limit of {Config.JOB_MAX_CAMS} CAMs"}), 400
+
+    return jsonify({"fingerprints": compute_fingerprints(cams, params)})
+
+@api_bp.route("/api/recommendations/jobs", methods=["POST"])
+def api_submit_job():
+    """
+    Asynchronous batch: stores the CAMs as a job and returns its id immediately.
+    Poll /api/recommendations/jobs/<job_id> and page through
+    /api/recommendations/jobs/<job_id>/results with the returned cursor.
+    """
+    payload = request.json
+    if not payload:
+        return jsonify({"error": "Missing JSON payload"}), 400
+
+    run_id = payload.get("run_id")
+    cams = payload.get("cams")
+    params = payload.get("params", {})
+
+    if not run_id or not cams:
+        return jsonify({"error": "Missing required fields: run_id, cams"}), 400
+
+    if not isinstance(cams, list):
+        return jsonify({"error": "cams must be a list"}), 400
+
+    if len(cams) > Config.JOB_MAX_CAMS:
+        return jsonify({"error": f"Job size exceeds limit of {Config.JOB_MAX_CAMS}"}), 400
+
+    if payload.get("priority") is not None:
+        params = {**params, "priority": payload["priority"]}
+
+    job_id = jobs.submit_job(run_id, cams, params)
+    logger.info(f"📥 Queued job {job_id} for run_id: {run_id} ({len(cams)} CAMs)")
+    return jsonify({"job_id": job_id, "run_id": run_id, "status": jobs.JOB_QUEUED, "total": len(cams)}), 202
+
+@api_bp.route("/api/recommendations/jobs/<job_id>")
+def api_job_status(job_id):
+    job = get_job_store().get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@api_bp.route("/api/recommendations/jobs/<job_id>/results")
+def api_job_results(job_id):
+    """Completed CAM results after `cursor`, in completion order."""
+    store = get_job_store()
+    job = store.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    try:
+        cursor = int(request.args.get("cursor", "0"))
+        limit = max(1, min(int(request.args.get("limit", "500")), 1000))
+    except ValueError:
+        return jsonify({"error": "cursor and limit must be integers"}), 400
+
+    items, next_cursor = store.get_results(job_id, cursor, limit)
+    return jsonify({
+        "job_id": job_id,
+        "status": job["status"],
+        "results": items,
+        "next_cursor": next_cursor,
+        "has_more": len(items) == limit
+    })
+
+@api_bp.route("/api/recommendations/jobs/<job_id>/resume", methods=["POST"])
+def api_job_resume(job_id):
+    """Re-runs only the failed CAMs of a job."""
+    requeued = jobs.resume_job(job_id)
+    if requeued is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"job_id": job_id, "requeued": requeued}), 202
+
 @api_bp.route("/api/status/engine")
 def api_status_engine():
     """Diagnostic info about the compute engine."""
@@ -66,10 +245,18 @@ def api_status_engine():
         "concurrency": {
             "batch_max_cams": 500,
             "parallel_vehicles": 5,
-            "sku_workers_per_vehicle": 8
-        }
+            "sku_workers_per_vehicle": 8,
+            "engine_workers": scheduler.max_workers
+        },
+        "admission": admission.snapshot(),
+        "neighbour_index": fitment_index.stats()
     })
 
+@api_bp.route("/api/status/queues")
+def api_status_queues():
+    """Per-run_id queue depth on the engine-wide worker pool."""
+    return jsonify(scheduler.snapshot())
+
 @api_bp.route("/api/recommendations")
 def api_recommendations():
     """DEPRECATED: Support for legacy paging runner."""
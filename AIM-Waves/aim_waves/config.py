@@ -24,6 +24,8 @@ class Config:
     # Data paths 
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     CSV_PATH = os.environ.get("CSV_PATH", os.path.join(BASE_DIR, "data/resources/segmentlist.csv"))
+    # Local catalogue index for vertex_ai_search.grounding: local (scripts/build_catalogue_index.py)
+    CATALOGUE_INDEX_PATH = os.environ.get("AIM_CATALOGUE_INDEX_PATH", os.path.join(BASE_DIR, "data/resources/catalogue.jsonl"))
     
     # GCP Project
     GCP_PROJECT = os.environ.get("GOOGLE_CLOUD_PROJECT", "bqsqltesting")
@@ -40,3 +42,9 @@ class Config:
     # Prompt Template Path
     PROMPT_TEMPLATE_DIR = os.path.join(BASE_DIR, "resources/prompts")
     GCS_BUCKET = "aim-home"
+
+    # Async batch jobs (/api/recommendations/jobs)
+    JOB_STORE_BACKEND = os.environ.get("AIM_JOB_STORE_BACKEND", "sqlite")
+    JOB_STORE_PATH = os.environ.get("AIM_JOB_STORE_PATH", "/tmp/aim_jobs.sqlite3")
+    JOB_MAX_CAMS = int(os.environ.get("AIM_JOB_MAX_CAMS", "10000"))
+    JOB_CHUNK_SIZE = int(os.environ.get("AIM_JOB_CHUNK_SIZE", "200"))
@@ -0,0 +1,81 @@
+import math
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """
+    Global in-flight CAM budget for this engine process.
+    Batches are admitted whole; when the budget is saturated callers get an
+    estimated wait (from observed CAM throughput) to return as Retry-After.
+    """
+
+    def __init__(self, budget, default_cam_seconds=1.0, smoothing=0.2):
+        self.budget = budget
+        self.in_flight = 0
+        self.rejected = 0
+        # EWMA of CAMs completed per second across the process
+        self._throughput = None
+        self._default_cam_seconds = default_cam_seconds
+        self._smoothing = smoothing
+        self._cond = threading.Condition()
+
+    def _fits(self, n):
+        # A batch larger than the whole budget is let through on an idle engine
+        return self.in_flight == 0 or self.in_flight + n <= self.budget
+
+    def try_acquire(self, n):
+        """Admits n CAMs if they fit in the budget. Never blocks."""
+        with self._cond:
+            if not self._fits(n):
+                self.rejected += 1
+                return False
+            self.in_flight += n
+            return True
+
+    def acquire(self, n, timeout=None):
+        """Blocks until n CAMs fit (used by background jobs, which queue instead of failing)."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while not self._fits(n):
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += n
+            return True
+
+    def release(self, n, elapsed_s=None):
+        """Returns n CAMs to the budget and feeds the throughput estimate."""
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - n)
+            if elapsed_s and elapsed_s > 0 and n:
+                observed = n / elapsed_s
+                if self._throughput is None:
+                    self._throughput = observed
+                else:
+                    self._throughput += self._smoothing * (observed - self._throughput)
+            self._cond.notify_all()
+
+    def estimate_wait(self, n):
+        """Seconds until n more CAMs would fit, from the observed throughput."""
+        with self._cond:
+            excess = max(1, self.in_flight + n - self.budget)
+            throughput = self._throughput or (1.0 / self._default_cam_seconds)
+        return max(1, math.ceil(excess / throughput))
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "budget": self.budget,
+                "in_flight": self.in_flight,
+                "rejected": self.rejected,
+                "throughput_cams_per_s": round(self._throughput, 3) if self._throughput else None,
+            }
+
+
+admission = AdmissionController(int(os.environ.get("AIM_INFLIGHT_CAM_BUDGET", "1000")))
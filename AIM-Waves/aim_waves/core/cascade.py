@@ -0,0 +1,72 @@
+import statistics
+import threading
+
+from aim_waves.config import Config
+
+
+def cascade_tiers(params):
+    """
+    Model tiers for a batch, cheapest first, or None when the cascade is off.
+    params.cascade (bool) overrides cascade.enabled; params.cascade_tiers replaces the tier list.
+    """
+    cfg = Config.MODEL_CONFIG.get("cascade", {})
+    enabled = params.get("cascade")
+    if enabled is None:
+        enabled = cfg.get("enabled", False)
+    if not enabled:
+        return None
+    tiers = params.get("cascade_tiers") or cfg.get("tiers") or []
+    return [dict(tier, name=tier.get("name") or f"tier{i + 1}") for i, tier in enumerate(tiers)] or None
+
+
+class TierStats:
+    """Per-tier attempts, escalations, local repairs, latency and tokens over a batch's cascade results."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers = {}
+
+    def add(self, result):
+        steps = result.get("cascade") or []
+        with self._lock:
+            for n, step in enumerate(steps):
+                t = self._tiers.setdefault(step["tier"], {
+                    "model": step.get("model"), "attempts": 0, "final": 0, "escalated": 0, "repaired": 0,
+                    "latencies": [], "prompt_token_count": 0, "candidates_token_count": 0,
+                    "total_token_count": 0, "violations": {},
+                })
+                t["attempts"] += 1
+                if step.get("repaired"):
+                    t["repaired"] += 1
+                t["latencies"].append(step.get("latency_ms", 0))
+                for k in ("prompt_token_count", "candidates_token_count", "total_token_count"):
+                    t[k] += (step.get("usage") or {}).get(k, 0) or 0
+                for v in step.get("violations") or []:
+                    t["violations"][v] = t["violations"].get(v, 0) + 1
+                if n == len(steps) - 1:
+                    t["final"] += 1
+                else:
+                    t["escalated"] += 1
+
+    def __bool__(self):
+        return bool(self._tiers)
+
+    def report(self):
+        with self._lock:
+            report = {}
+            for name, t in self._tiers.items():
+                latencies = sorted(t["latencies"])
+                report[name] = {
+                    "model": t["model"],
+                    "attempts": t["attempts"],
+                    "final": t["final"],
+                    "escalated": t["escalated"],
+                    "repaired": t["repaired"],
+                    "latency_ms_p50": int(statistics.median(latencies)) if latencies else 0,
+                    "latency_ms_max": latencies[-1] if latencies else 0,
+                    "prompt_token_count": t["prompt_token_count"],
+                    "candidates_token_count": t["candidates_token_count"],
+                    "total_token_count": t["total_token_count"],
+                    "violations": dict(t["violations"]),
+                }
+            return report
@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+
+from google import genai
+from google.genai import types
+
+from aim_waves.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Cached input tokens are billed at 25% of the normal input price
+CACHED_TOKEN_DISCOUNT = 0.75
+
+
+class ContextCacheManager:
+    """
+    Explicit Gemini context caches for one batch.
+
+    Sizes with at least min_cams CAMs that use the generic size table (no rows
+    for their own vehicle) get one cached-content entry holding the system
+    instruction and that table. Each such CAM then sends only its vehicle/size
+    and references the cache. Entries are created on first use and deleted by
+    close() when the batch ends.
+
+    `client` only needs `caches.create(model=, config=)` and `caches.delete(name=)`,
+    so tests can pass a local fake.
+    """
+
+    def __init__(self, client, model, min_cams=5, ttl_seconds=900, display_prefix="aim"):
+        self.client = client
+        self.model = model
+        self.min_cams = min_cams
+        self.ttl_seconds = ttl_seconds
+        self.display_prefix = display_prefix
+        self._lock = threading.Lock()
+        self._eligible = set()
+        self._entries = {}  # key -> {"event", "name", "tokens", "served"}
+        self._cached_tokens = 0
+        self._create_failures = 0
+
+    @classmethod
+    def for_batch(cls, run_id, params):
+        """Manager for a batch, or None when caching is off for it."""
+        cache_cfg = Config.MODEL_CONFIG.get("context_cache", {})
+        enabled = params.get("context_cache")
+        if enabled is None:
+            enabled = cache_cfg.get("enabled", False)
+        if not enabled:
+            return None
+        if not params.get("disable_search", True):
+            # Tools would have to live inside the cache as well
+            logger.info("ℹ️ Context cache skipped: search grounding is enabled for this batch.")
+            return None
+
+        model_cfg = Config.MODEL_CONFIG.get("model", {})
+        project_id = model_cfg.get("project") or os.environ.get("GOOGLE_CLOUD_PROJECT") or os.environ.get("GCLOUD_PROJECT")
+        client = genai.Client(vertexai=True, project=project_id, location=model_cfg.get("location", "europe-west1"))
+        return cls(
+            client,
+            model_cfg.get("name", "gemini-2.5-flash-lite"),
+            min_cams=cache_cfg.get("min_cams", 5),
+            ttl_seconds=cache_cfg.get("ttl_seconds", 900),
+            display_prefix=f"aim-{run_id}"[:100],
+        )
+
+    def plan(self, generic_cams_by_key):
+        """Marks keys (normalised sizes) with at least min_cams generic-table CAMs as cacheable."""
+        with self._lock:
+            for key, count in generic_cams_by_key.items():
+                if count >= self.min_cams:
+                    self._eligible.add(key)
+
+    def is_eligible(self, key):
+        with self._lock:
+            return key in self._eligible
+
+    def get(self, key, system_instruction, table_text):
+        """
+        Name of the cache for key, creating it on first use (other CAMs of the
+        same size wait for that creation). None if the key is not cacheable or
+        creation failed; the caller then sends the full prompt.
+        """
+        with self._lock:
+            if key not in self._eligible:
+                return None
+            entry = self._entries.get(key)
+            creator = entry is None
+            if creator:
+                entry = self._entries[key] = {"event": threading.Event(), "name": None, "tokens": 0, "served": 0}
+
+        if creator:
+            try:
+                cache = self.client.caches.create(
+                    model=self.model,
+                    config=types.CreateCachedContentConfig(
+                        display_name=f"{self.display_prefix}-{key}"[:128],
+                        system_instruction=system_instruction,
+                        contents=[types.Content(role="user", parts=[types.Part(text=table_text)])],
+                        ttl=f"{self.ttl_seconds}s",
+                    ),
+                )
+                entry["name"] = cache.name
+                usage = getattr(cache, "usage_metadata", None)
+                entry["tokens"] = getattr(usage, "total_token_count", 0) or 0
+                logger.info(f"🗃️ Context cache created for size {key}: {cache.name}")
+            except Exception as e:
+                logger.warning(f"⚠️ Context cache creation failed for size {key}: {e}")
+                with self._lock:
+                    self._create_failures += 1
+                    self._eligible.discard(key)
+            finally:
+                entry["event"].set()
+        else:
+            entry["event"].wait(timeout=30)
+
+        if entry["name"]:
+            with self._lock:
+                entry["served"] += 1
+        return entry["name"]
+
+    def record_usage(self, usage):
+        """Adds a cached call's cached_content_token_count to the batch total."""
+        with self._lock:
+            self._cached_tokens += (usage or {}).get("cached_content_token_count", 0) or 0
+
+    def close(self):
+        """Deletes every cache created for the batch and returns the savings report."""
+        with self._lock:
+            entries = dict(self._entries)
+        deleted = 0
+        for key, entry in entries.items():
+            if not entry["name"]:
+                continue
+            try:
+                self.client.caches.delete(name=entry["name"])
+                deleted += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to delete context cache {entry['name']}: {e}")
+        report = self.report()
+        report["caches_deleted"] = deleted
+        if report["caches_created"]:
+            logger.info(
+                f"🗃️ Context cache: {report['caches_created']} size(s), {report['cams_served']} CAMs served, "
+                f"{report['cached_tokens']:,} cached tokens (~{report['billable_tokens_saved']:,} billable tokens saved)"
+            )
+        return report
+
+    def report(self):
+        with self._lock:
+            created = [e for e in self._entries.values() if e["name"]]
+            return {
+                "min_cams": self.min_cams,
+                "sizes_planned": len(self._eligible),
+                "caches_created": len(created),
+                "create_failures": self._create_failures,
+                "cams_served": sum(e["served"] for e in created),
+                "cache_tokens": sum(e["tokens"] for e in created),
+                "cached_tokens": self._cached_tokens,
+                "billable_tokens_saved": int(self._cached_tokens * CACHED_TOKEN_DISCOUNT),
+            }
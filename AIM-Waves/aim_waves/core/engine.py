@@ -9,10 +9,22 @@ from google.genai import types
 from google.api_core.exceptions import GoogleAPIError
 
 from aim_waves.config import Config
-from aim_waves.core.utils import normalize_string_for_comparison, robust_parse_output, parse_recommendation_output
-from aim_waves.core.prompts import get_error_output, construct_prompt
-
-from aim_waves.data.bigquery import fetch_feedback_from_bigquery, fetch_feedback_batch, _normalise_size, _normalise_vehicle
+from aim_waves.core.utils import normalize_string_for_comparison, robust_parse_output, parse_recommendation_output, resolve_row_aliases
+from aim_waves.core.prompts import (
+    get_error_output, construct_prompt, build_tyre_table, build_enhancer_texts,
+    construct_system_instruction, construct_request, construct_size_table, build_catalogue_notes,
+)
+from aim_waves.core.cascade import TierStats, cascade_tiers
+from aim_waves.core.context_cache import ContextCacheManager
+from aim_waves.core.fingerprint import input_fingerprint, params_digest
+from aim_waves.core.neighbours import fitment_features, fitment_index, segment_for
+from aim_waves.core.prefilter import prefilter_candidates
+from aim_waves.core.ranker import rank_locally
+from aim_waves.core.scheduler import scheduler
+from aim_waves.core.validator import ValidationStats, repair_answer, validate_answer
+
+from aim_waves.data.bigquery import fetch_feedback_from_bigquery, fetch_feedback_batch, iter_feedback_batches, _normalise_size, _normalise_vehicle
+from aim_waves.data.catalogue import grounding_snippets
 from aim_waves.data.loader import vehicle_batch_map
 
 logger = logging.getLogger(__name__)
@@ -24,7 +36,301 @@ START_TIME = datetime.now()
 
 import time
 
-def process_single_cam(cam, params, prefetched_data=None):
+def use_local_ranker(cam, params):
+    """
+    True when a CAM is answered by the local ranker without calling Gemini:
+    the CAM or batch asks for ranker "local" (e.g. runlist tail CAMs), or the
+    batch priority is listed in local_ranker.priorities.
+    """
+    mode = cam.get("ranker") or params.get("ranker")
+    if mode:
+        return str(mode).strip().lower() == "local"
+    priorities = Config.MODEL_CONFIG.get("local_ranker", {}).get("priorities") or []
+    return str(params.get("priority") or "").strip().lower() in {str(p).strip().lower() for p in priorities}
+
+def local_fallback_enabled(params):
+    """Whether failed or timed-out CAMs are answered by the local ranker (params.local_fallback overrides)."""
+    fallback = params.get("local_fallback")
+    if fallback is None:
+        fallback = Config.MODEL_CONFIG.get("local_ranker", {}).get("fallback", False)
+    return bool(fallback)
+
+def rank_cam_locally(cam, params, prefetched_data=None, fallback_for=None, allow_fetch=True):
+    """
+    Answers a CAM with the deterministic local ranker (no model call, no tokens).
+    fallback_for records the error code the answer replaces. None if the CAM has no rows.
+    """
+    veh = cam.get("Vehicle")
+    sz = cam.get("Size")
+    feedback_data, _ = fetch_fitment_rows(veh, sz, prefetched_data, allow_fetch=allow_fetch)
+    if not feedback_data:
+        return None
+
+    hotboxes, skus = rank_locally(
+        feedback_data,
+        goldilocks_zone_pct=params.get("goldilocks_zone_pct", 15),
+        price_fluctuation_upper=params.get("price_fluctuation_upper", 1.1),
+        price_fluctuation_lower=params.get("price_fluctuation_lower", 0.9),
+        brand_enhancer_lower=(params.get("brand_enhancer") or "anybrand").strip().lower(),
+        model_enhancer_lower=(params.get("model_enhancer") or "anymodel").strip().lower(),
+        seasonal_performance=params.get("season"),
+        keep_top_popular=Config.MODEL_CONFIG.get("local_ranker", {}).get("keep_top_popular", 5),
+    )
+    # Same shape as a model answer: open slots filled from the table, SKU1-SKU20
+    hb1, hb2, hb3, hb4, skus = backfill_slots(hotboxes, skus + ["-"] * (20 - len(skus)), feedback_data)
+    is_success = all(h.isdigit() and len(h) in (7, 8) for h in (hb1, hb2, hb3, hb4))
+    result = {
+        "Vehicle": veh,
+        "Size": sz,
+        "HB1": hb1,
+        "HB2": hb2,
+        "HB3": hb3,
+        "HB4": hb4,
+        "SKUs": skus,
+        "success": is_success,
+        "error_code": None if is_success else "NO_RESULTS",
+        "usage": {},
+        "ranker": "local"
+    }
+    if fallback_for:
+        result["fallback_for"] = fallback_for
+    return result
+
+def neighbour_reuse_enabled(params):
+    """Whether sparse CAMs may reuse a similar fitment's answer (params.neighbour_reuse overrides)."""
+    enabled = params.get("neighbour_reuse")
+    if enabled is None:
+        enabled = Config.MODEL_CONFIG.get("neighbours", {}).get("enabled", False)
+    return bool(enabled)
+
+def describe_fitment(vehicle, size, prefetched_data=None):
+    """(feature vector, number of the vehicle's own rows) of a CAM for neighbour lookups."""
+    rows, _ = fetch_fitment_rows(vehicle, size, prefetched_data)
+    n_veh = _normalise_vehicle(vehicle)
+    own = [r for r in rows if _normalise_vehicle(r.get("Vehicle")) == n_veh]
+    segment = segment_for(vehicle, size) or (own[0].get("Segment") if own else "")
+    return fitment_features(own or rows, segment), len(own)
+
+def reuse_neighbour(cam, params, vector, own_rows):
+    """
+    The nearest answer computed under the same answer params on the same size,
+    for a CAM with fewer than neighbours.min_vehicle_rows rows of its own, if
+    similar enough; else None.
+    """
+    cfg = Config.MODEL_CONFIG.get("neighbours", {})
+    if own_rows >= cfg.get("min_vehicle_rows", 3):
+        return None
+    veh = cam.get("Vehicle")
+    sz = cam.get("Size")
+    match = fitment_index.nearest(veh, sz, vector, cfg.get("min_similarity", 0.97), params_digest(params))
+    if not match:
+        return None
+    neighbour, similarity, answer = match
+    logger.info(f"♻️ Reusing {neighbour} answer for {veh}/{sz} (similarity {similarity:.3f}).")
+    return {
+        "Vehicle": veh,
+        "Size": sz,
+        **answer,
+        "SKUs": list(answer["SKUs"]),
+        "success": True,
+        "error_code": None,
+        "usage": {},
+        "ranker": "neighbour",
+        "reused_from": {"Vehicle": neighbour, "Size": sz, "similarity": round(similarity, 4)}
+    }
+
+def repair_enabled(params):
+    """Whether rule violations are repaired locally before any re-prompt (params.repair overrides)."""
+    enabled = params.get("repair")
+    if enabled is None:
+        enabled = Config.MODEL_CONFIG.get("validator", {}).get("repair", False)
+    return bool(enabled)
+
+def repair_cam_answer(hotboxes, skus, feedback_data, params):
+    """repair_answer with the batch's enhancers. Returns (hotboxes, skus, violations, remaining)."""
+    hotboxes, skus, violations, remaining = repair_answer(
+        hotboxes, skus, feedback_data,
+        brand_enhancer=params.get("brand_enhancer"),
+        model_enhancer=params.get("model_enhancer"),
+        seasonal_performance=params.get("season"))
+    if violations:
+        logger.info(f"🩹 Violations {', '.join(violations)}; "
+                    f"{'re-prompt needed for ' + ', '.join(remaining) if remaining else 'repaired locally'}.")
+    return hotboxes, skus, violations, remaining
+
+def backfill_slots(hotboxes, skus, feedback_data):
+    """
+    Clears invalid/duplicate ids from a parsed answer and fills the gaps with
+    unused table ProductIds (in table order). Returns (hb1, hb2, hb3, hb4, skus),
+    skus padded to 20.
+    """
+    # 1. Gather Used IDs
+    slots = list(hotboxes) + list(skus)
+    used_ids = set()
+    clean_slots = []
+
+    for s in slots:
+        s_str = str(s).strip()
+        # Keep if valid digit and length 7 or 8 and not duplicate
+        if s_str.isdigit() and len(s_str) in (7, 8) and s_str not in used_ids:
+            clean_slots.append(s_str)
+            used_ids.add(s_str)
+        else:
+            clean_slots.append(None) # Mark for fill
+
+    # 2. Prepare Candidates (ordered by relevance/popularity from BQ)
+    candidates = []
+    for row in feedback_data:
+        pid = str(row.get('ProductId', ''))
+        if pid and pid.isdigit() and len(pid) in (7, 8):
+            candidates.append(pid)
+
+    # 3. Fill Gaps
+    final_ids = []
+    cand_idx = 0
+
+    for slot in clean_slots:
+        if slot:
+            final_ids.append(slot)
+        else:
+            # Find next unused candidate
+            filled = False
+            while cand_idx < len(candidates):
+                c = candidates[cand_idx]
+                cand_idx += 1
+                if c not in used_ids:
+                    final_ids.append(c)
+                    used_ids.add(c)
+                    filled = True
+                    break
+            if not filled:
+               final_ids.append("-") # Truly out of stock
+
+    # 4. Re-assign
+    hb1, hb2, hb3, hb4 = final_ids[0], final_ids[1], final_ids[2], final_ids[3]
+    skus = final_ids[4:]
+
+    # Ensure skus has 20 items
+    while len(skus) < 20:
+        skus.append("-")
+    return hb1, hb2, hb3, hb4, skus
+
+def finish_cam(cam, params, prefetched_data, fitment, result):
+    """Feeds a successful answer to the neighbour index, or swaps a failed one for the local ranker's."""
+    veh = cam.get("Vehicle")
+    sz = cam.get("Size")
+    if result["success"] and fitment is not None:
+        fitment_index.add(veh, sz, fitment[0], {
+            "HB1": result["HB1"], "HB2": result["HB2"], "HB3": result["HB3"], "HB4": result["HB4"],
+            "SKUs": list(result["SKUs"])
+        }, params_digest(params))
+
+    if not result["success"] and result.get("error_code") == "UPSTREAM_ERROR" and local_fallback_enabled(params):
+        local = rank_cam_locally(cam, params, prefetched_data, fallback_for="UPSTREAM_ERROR")
+        if local and local["success"]:
+            logger.warning(f"🧮 Local ranker fallback for {veh}/{sz} (UPSTREAM_ERROR).")
+            local["usage"] = result.get("usage", {})
+            return local
+    return result
+
+def run_cascade(veh, sz, params, tiers, prefetched_data=None, context_cache=None):
+    """
+    Runs a CAM through the model tiers cheapest first. The next tier is only
+    called when the answer fails parsing or hard-rule validation (and, with
+    validator.repair, cannot be repaired locally); the last tier's answer is
+    kept regardless. Usage is summed over tiers and each attempt is recorded
+    in result["cascade"] (tier, model, latency, usage, violations, repaired).
+    """
+    usage = {}
+    steps = []
+    for n, tier in enumerate(tiers):
+        t_tier = time.time()
+        res_data = generate_recommendation(
+            vehicle=veh,
+            size=sz,
+            goldilocks_zone_pct=params.get("goldilocks_zone_pct", 15),
+            price_fluctuation_upper=params.get("price_fluctuation_upper", 1.1),
+            price_fluctuation_lower=params.get("price_fluctuation_lower", 0.9),
+            brand_enhancer=params.get("brand_enhancer"),
+            model_enhancer=params.get("model_enhancer"),
+            seasonal_performance=params.get("season"),
+            pod_filter=params.get("pod"),
+            segment_filter=params.get("segment"),
+            override_model=tier.get("model"),
+            disable_search=not tier.get("search", False),
+            thinking_budget=tier.get("thinking_budget"),
+            grounding=tier.get("grounding") or params.get("grounding"),
+            table_encoding=params.get("table_encoding"),
+            row_aliases=params.get("row_aliases"),
+            prefilter=params.get("prefilter"),
+            prefilter_token_budget=params.get("prefilter_token_budget"),
+            return_metadata=True,
+            prefetched_data=prefetched_data,
+            context_cache=context_cache
+        )
+        raw_result = res_data["output"]
+        feedback_data = res_data.get("feedback_data", [])
+        tier_usage = res_data.get("usage") or {}
+        for k, v in tier_usage.items():
+            usage[k] = (usage.get(k) or 0) + (v or 0)
+
+        if "NoDataError" in raw_result:
+            return {
+                "Vehicle": veh, "Size": sz,
+                "HB1": "Error", "HB2": "Error", "HB3": "Error", "HB4": "Error",
+                "SKUs": ["-"] * 20,
+                "success": False, "error_code": "NO_RESULTS",
+                "usage": usage
+            }
+
+        veh_out, size_out, hb1, hb2, hb3, hb4, skus = parse_recommendation_output(raw_result)
+        if repair_enabled(params):
+            (hb1, hb2, hb3, hb4), skus, violations, remaining = repair_cam_answer(
+                [hb1, hb2, hb3, hb4], skus, feedback_data, params)
+        else:
+            violations = remaining = validate_answer(
+                [hb1, hb2, hb3, hb4], feedback_data, skus,
+                brand_enhancer=params.get("brand_enhancer"),
+                model_enhancer=params.get("model_enhancer"),
+                seasonal_performance=params.get("season"))
+        # Output that fails parsing always escalates: a repaired non-answer is not the tier's answer
+        if "parse" in violations and "parse" not in remaining:
+            remaining = remaining + ["parse"]
+        steps.append({
+            "tier": tier["name"],
+            "model": res_data.get("model"),
+            "latency_ms": int((time.time() - t_tier) * 1000),
+            "usage": tier_usage,
+            "violations": violations,
+            "repaired": bool(violations) and not remaining
+        })
+        if not remaining:
+            break
+        if n < len(tiers) - 1:
+            logger.info(f"⤴️ Escalating {veh}/{sz} from tier {tier['name']}: {', '.join(remaining)}")
+
+    hb1, hb2, hb3, hb4, skus = backfill_slots([hb1, hb2, hb3, hb4], skus, feedback_data)
+    is_success = all(h.isdigit() and len(h) in (7, 8) for h in (hb1, hb2, hb3, hb4))
+    result = {
+        "Vehicle": veh,
+        "Size": sz,
+        "HB1": hb1,
+        "HB2": hb2,
+        "HB3": hb3,
+        "HB4": hb4,
+        "SKUs": skus,
+        "success": is_success,
+        "error_code": None if is_success else "UPSTREAM_ERROR",
+        "usage": usage,
+        "tier": steps[-1]["tier"],
+        "cascade": steps
+    }
+    if repair_enabled(params):
+        result["validation"] = {"violations": steps[0]["violations"], "repaired": steps[-1]["repaired"],
+                                "reprompted": len(steps) > 1, "remaining": remaining}
+    return result
+
+def process_single_cam(cam, params, prefetched_data=None, context_cache=None):
     """Worker function for batch processing a single Vehicle/Size combination."""
     veh = cam.get("Vehicle")
     sz = cam.get("Size")
@@ -37,9 +343,34 @@ def process_single_cam(cam, params, prefetched_data=None):
             "error_code": "INVALID_INPUT"
         }
 
+    if use_local_ranker(cam, params):
+        local = rank_cam_locally(cam, params, prefetched_data)
+        if local:
+            return local
+        return {
+            "Vehicle": veh, "Size": sz,
+            "HB1": "Error", "HB2": "Error", "HB3": "Error", "HB4": "Error",
+            "SKUs": ["-"] * 20,
+            "success": False, "error_code": "NO_RESULTS",
+            "usage": {}, "ranker": "local"
+        }
+
     try:
-        # Call with return_metadata=True to get usage stats even on success
-        res_data = generate_recommendation(
+        fitment = None
+        if neighbour_reuse_enabled(params):
+            fitment = describe_fitment(veh, sz, prefetched_data)
+            reused = reuse_neighbour(cam, params, *fitment)
+            if reused:
+                return reused
+
+        tiers = cascade_tiers(params)
+        if tiers:
+            return finish_cam(cam, params, prefetched_data, fitment,
+                              run_cascade(veh, sz, params, tiers, prefetched_data, context_cache))
+
+        # Call with return_metadata=True to get usage stats even on success.
+        # The same arguments are reused for the retry (prefetched rows, context cache, filters).
+        request = dict(
             vehicle=veh,
             size=sz,
             goldilocks_zone_pct=params.get("goldilocks_zone_pct", 15),
@@ -51,70 +382,34 @@ def process_single_cam(cam, params, prefetched_data=None):
             pod_filter=params.get("pod"),
             segment_filter=params.get("segment"),
             disable_search=params.get("disable_search", True), # Default to True for cost/speed in batch
+            grounding=params.get("grounding"),
 
+            table_encoding=params.get("table_encoding"),
+            row_aliases=params.get("row_aliases"),
+            prefilter=params.get("prefilter"),
+            prefilter_token_budget=params.get("prefilter_token_budget"),
             return_metadata=True,
-            prefetched_data=prefetched_data
+            prefetched_data=prefetched_data,
+            context_cache=context_cache
         )
+        res_data = generate_recommendation(**request)
 
         raw_result = res_data["output"]
         feedback_data = res_data.get("feedback_data", [])
         usage = res_data.get("usage", {})
         veh_out, size_out, hb1, hb2, hb3, hb4, skus = parse_recommendation_output(raw_result)
+
+        # --- LOCAL REPAIR: fix rule violations against the table, re-prompt only if impossible ---
+        validation = None
+        if repair_enabled(params) and "NoDataError" not in raw_result:
+            (hb1, hb2, hb3, hb4), skus, violations, remaining = repair_cam_answer(
+                [hb1, hb2, hb3, hb4], skus, feedback_data, params)
+            validation = {"violations": violations, "repaired": bool(violations) and not remaining,
+                          "reprompted": bool(remaining), "remaining": remaining}
         
         # --- BACKFILL LOGIC ---
         # Ensure we have a full set of 20 unique SKUs (4 HB + 16 SKU)
-        # 1. Gather Used IDs
-        slots = [hb1, hb2, hb3, hb4] + skus
-        used_ids = set()
-        clean_slots = []
-        
-        for s in slots:
-            s_str = str(s).strip()
-            # Keep if valid digit and not duplicate
-            # Keep if valid digit and length 7 or 8 and not duplicate
-            if s_str.isdigit() and len(s_str) in (7, 8) and s_str not in used_ids:
-                clean_slots.append(s_str)
-                used_ids.add(s_str)
-            else:
-                clean_slots.append(None) # Mark for fill
-        
-        # 2. Prepare Candidates (ordered by relevance/popularity from BQ)
-        candidates = []
-        for row in feedback_data:
-            pid = str(row.get('ProductId', ''))
-            if pid and pid.isdigit() and len(pid) in (7, 8):
-                candidates.append(pid)
-        
-        # 3. Fill Gaps
-        final_ids = []
-        cand_idx = 0
-        
-        for slot in clean_slots:
-            if slot:
-                final_ids.append(slot)
-            else:
-                # Find next unused candidate
-                filled = False
-                while cand_idx < len(candidates):
-                    c = candidates[cand_idx]
-                    cand_idx += 1
-                    if c not in used_ids:
-                        final_ids.append(c)
-                        used_ids.add(c)
-                        filled = True
-                        break
-                if not filled:
-                   final_ids.append("-") # Truly out of stock
-
-        # 4. Re-assign
-        if len(final_ids) >= 4:
-            hb1, hb2, hb3, hb4 = final_ids[0], final_ids[1], final_ids[2], final_ids[3]
-            skus = final_ids[4:] if len(final_ids) > 4 else []
-        
-        # Pad SKUs to 16 if needed (though loop above should handle 24 slots if clean_slots was 24)
-        # Ensure skus has 20 items
-        while len(skus) < 20:
-            skus.append("-")
+        hb1, hb2, hb3, hb4, skus = backfill_slots([hb1, hb2, hb3, hb4], skus, feedback_data)
             
         # Specific check for NoDataError from BigQuery
         if "NoDataError" in str(hb1) or "NoDataError" in raw_result:
@@ -131,19 +426,9 @@ def process_single_cam(cam, params, prefetched_data=None):
                      (hb3.isdigit() and len(hb3) in (7, 8)) and \
                      (hb4.isdigit() and len(hb4) in (7, 8))
 
-        if not is_success:
+        if not is_success or (validation and validation["reprompted"]):
             logger.warning(f"Batch attempt 1 failed for {veh}/{sz}. Retrying...")
-            res_data = generate_recommendation(
-                vehicle=veh,
-                size=sz,
-                goldilocks_zone_pct=params.get("goldilocks_zone_pct", 15),
-                price_fluctuation_upper=params.get("price_fluctuation_upper", 1.1),
-                price_fluctuation_lower=params.get("price_fluctuation_lower", 0.9),
-                brand_enhancer=params.get("brand_enhancer"),
-                model_enhancer=params.get("model_enhancer"),
-                seasonal_performance=params.get("season"),
-                return_metadata=True
-            )
+            res_data = generate_recommendation(**request)
             raw_result = res_data["output"]
             feedback_data = res_data.get("feedback_data", []) # Update feedback data? Usually same.
             
@@ -153,55 +438,19 @@ def process_single_cam(cam, params, prefetched_data=None):
                 usage[k] = (usage.get(k) or 0) + (new_usage.get(k) or 0)
 
             veh_out, size_out, hb1, hb2, hb3, hb4, skus = parse_recommendation_output(raw_result)
+            if validation:
+                (hb1, hb2, hb3, hb4), skus, _, validation["remaining"] = repair_cam_answer(
+                    [hb1, hb2, hb3, hb4], skus, feedback_data, params)
             
             # --- BACKFILL LOGIC (RETRY) ---
-            # Repeat backfill for retry result
-            slots = [hb1, hb2, hb3, hb4] + skus
-            used_ids = set()
-            clean_slots = []
-            for s in slots:
-                s_str = str(s).strip()
-                if s_str.isdigit() and len(s_str) in (7, 8) and s_str not in used_ids:
-                    clean_slots.append(s_str)
-                    used_ids.add(s_str)
-                else:
-                    clean_slots.append(None)
-            
-            # Candidates again
-            candidates = []
-            for row in feedback_data:
-                pid = str(row.get('ProductId', ''))
-                if pid and pid.isdigit() and len(pid) in (7, 8):
-                    candidates.append(pid)
-                    
-            final_ids = []
-            cand_idx = 0
-            for slot in clean_slots:
-                if slot:
-                    final_ids.append(slot)
-                else:
-                    filled = False
-                    while cand_idx < len(candidates):
-                        c = candidates[cand_idx]
-                        cand_idx += 1
-                        if c not in used_ids:
-                            final_ids.append(c)
-                            used_ids.add(c)
-                            filled = True
-                            break
-                    if not filled: final_ids.append("-")
-
-            if len(final_ids) >= 4:
-                hb1, hb2, hb3, hb4 = final_ids[0], final_ids[1], final_ids[2], final_ids[3]
-                skus = final_ids[4:] if len(final_ids) > 4 else []
-            while len(skus) < 20: skus.append("-")
+            hb1, hb2, hb3, hb4, skus = backfill_slots([hb1, hb2, hb3, hb4], skus, feedback_data)
 
             is_success = (hb1.isdigit() and len(hb1) in (7, 8)) and \
                          (hb2.isdigit() and len(hb2) in (7, 8)) and \
                          (hb3.isdigit() and len(hb3) in (7, 8)) and \
                          (hb4.isdigit() and len(hb4) in (7, 8))
 
-        return {
+        result = {
             "Vehicle": veh,
             "Size": sz,
             "HB1": hb1,
@@ -213,12 +462,25 @@ def process_single_cam(cam, params, prefetched_data=None):
             "error_code": None if is_success else "UPSTREAM_ERROR",
             "usage": usage
         }
+        if validation:
+            result["validation"] = validation
+        return finish_cam(cam, params, prefetched_data, fitment, result)
     except Exception as e:
         logger.error(f"❌ Batch error for {veh}/{sz}: {e}")
         err_msg = str(e).upper()
         code = "INTERNAL_ERROR"
         if "TIMEOUT" in err_msg: code = "TIMEOUT"
         elif "API" in err_msg: code = "UPSTREAM_ERROR"
+
+        if local_fallback_enabled(params):
+            try:
+                local = rank_cam_locally(cam, params, prefetched_data, fallback_for=code)
+            except Exception as fallback_error:
+                logger.error(f"❌ Local ranker fallback failed for {veh}/{sz}: {fallback_error}")
+                local = None
+            if local and local["success"]:
+                logger.warning(f"🧮 Local ranker fallback for {veh}/{sz} ({code}).")
+                return local
         
         return {
             "Vehicle": veh,
@@ -229,85 +491,238 @@ def process_single_cam(cam, params, prefetched_data=None):
             "error_code": code
         }
 
-def generate_recommendations_batch_push(run_id, cams, params):
+def cam_fingerprint(cam, params, prefetched_data=None):
+    """Input fingerprint of a CAM from the batch prefetch (no extra BigQuery round trip)."""
+    rows, _ = fetch_fitment_rows(cam.get("Vehicle"), cam.get("Size"), prefetched_data, allow_fetch=False)
+    return input_fingerprint(cam, rows, params)
+
+def is_generated_answer(res):
+    """True for a successful answer produced for the CAM itself, not a fallback or a neighbour's reuse."""
+    return bool(res.get("success")) and not res.get("fallback_for") and not res.get("reused_from")
+
+
+def compute_fingerprints(cams, params):
     """
-    New Batch Push Engine.
-    Processes a list of CAMs in parallel (5 at a time).
-    Preserves input order.
+    Input fingerprints for a list of CAMs without generating anything: one
+    batched BigQuery prefetch per size group, no model calls. Matches the
+    input_fingerprint of results when params.fingerprint is on.
+    """
+    fingerprints = [None] * len(cams)
+    indices_by_size = {}
+    for i, cam in enumerate(cams):
+        n_size = _normalise_size(cam.get("Size"))
+        if n_size:
+            indices_by_size.setdefault(n_size, []).append(i)
+    for group, prefetched_data in iter_feedback_batches(list(indices_by_size.keys())):
+        for n_size in group:
+            for i in indices_by_size.get(n_size, []):
+                fingerprints[i] = cam_fingerprint(cams[i], params, prefetched_data)
+    return fingerprints
+
+def iter_recommendations_batch_push(run_id, cams, params, cache_report=None):
+    """
+    Streaming Batch Push Engine.
+    Processes a list of CAMs on the engine-wide fair scheduler (queued under
+    run_id, weighted by params["priority"]) and yields (index, result) for each
+    CAM as soon as it completes. CAMs still running at the batch deadline are
+    yielded last with error_code TIMEOUT, or with the local ranker's answer
+    when the local_ranker fallback is on.
+    If a context cache is used, its savings report is written into the
+    cache_report dict when the batch ends.
+    With params.fingerprint, generated answers carry their input_fingerprint;
+    fallbacks and neighbour reuses do not, so they are regenerated next run.
     """
-    results = [None] * len(cams)
-    
     # Limit: 30s per task, 120s total batch
     BATCH_TIMEOUT = 120
     CAM_TIMEOUT = 30
 
-    batch_usage = {
-        "prompt_token_count": 0,
-        "candidates_token_count": 0,
-        "total_token_count": 0
-    }
+    priority = params.get("priority")
+    context_cache = ContextCacheManager.for_batch(run_id, params)
+    local_fallback = local_fallback_enabled(params)
+    fingerprints = bool(params.get("fingerprint"))
+    prefetched_by_index = {}
+
+    def submit(cam, prefetched_data):
+        return scheduler.submit(run_id, process_single_cam, cam, params, prefetched_data, context_cache,
+                                priority=priority)
+
+    def plan_context_cache(group, prefetched_data):
+        # Count, per size, the CAMs that will fall back to the generic size table
+        generic = {}
+        for n_size in group:
+            size_rows = prefetched_data.get(n_size, [])
+            if not size_rows:
+                continue
+            vehicles = {_normalise_vehicle(r.get("Vehicle")) for r in size_rows}
+            generic[n_size] = sum(
+                1 for i in indices_by_size.get(n_size, [])
+                if _normalise_vehicle(cams[i].get("Vehicle")) not in vehicles
+                and not use_local_ranker(cams[i], params)
+            )
+        context_cache.plan(generic)
+
+    # 1. Pipelined prefetch: query BigQuery per size group and release each
+    # group's CAMs to the worker pool as soon as its rows land, so model calls
+    # overlap with the remaining BigQuery I/O.
+    deadline = time.time() + BATCH_TIMEOUT
+    indices_by_size = {}
+    unsized = []
+    for i, cam in enumerate(cams):
+        n_size = _normalise_size(cam.get("Size"))
+        if n_size:
+            indices_by_size.setdefault(n_size, []).append(i)
+        else:
+            unsized.append(i)
+
+    def collect(future):
+        idx = future_to_index[future]
+        try:
+            res = future.result()
+            if fingerprints and is_generated_answer(res):
+                res["input_fingerprint"] = cam_fingerprint(cams[idx], params, prefetched_by_index.get(idx))
+            return idx, res
+        except Exception as e:
+            logger.error(f"CAM error at index {idx}: {e}")
+            return idx, {
+                "Vehicle": cams[idx].get("Vehicle", "Unknown"),
+                "Size": cams[idx].get("Size", "Unknown"),
+                "success": False, "error_code": "INTERNAL_ERROR"
+            }
 
-    # API Limit / Concurrency Control
-    # Default to 10 to be safe with Flash-Lite quotas, was 25
-    max_workers = int(os.environ.get("AIM_MAX_WORKERS", "10"))
+    # CAMs without a usable size fail validation immediately; no prefetch needed.
+    future_to_index = {submit(cams[i], None): i for i in unsized}
+    pending = set(future_to_index)
 
-    # 1. Bulk Fetch Data from BigQuery
-    unique_sizes = list({cam.get("Size") for cam in cams if cam.get("Size")})
-    prefetched_data = fetch_feedback_batch(unique_sizes)
+    try:
+        for group, prefetched_data in iter_feedback_batches(list(indices_by_size.keys())):
+            if context_cache:
+                plan_context_cache(group, prefetched_data)
+            for n_size in group:
+                for i in indices_by_size.get(n_size, []):
+                    prefetched_by_index[i] = prefetched_data
+                    future = submit(cams[i], prefetched_data)
+                    future_to_index[future] = i
+                    pending.add(future)
+
+            # Stream whatever finished while the next group was being fetched
+            for future in [f for f in pending if f.done()]:
+                pending.discard(future)
+                yield collect(future)
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_index = {
-            executor.submit(process_single_cam, cam, params, prefetched_data): i 
-            for i, cam in enumerate(cams)
-        }
-        
         # Wait with total timeout
-        done, not_done = concurrent.futures.wait(
-            future_to_index.keys(), 
-            timeout=BATCH_TIMEOUT
-        )
-        
-        for future in done:
-            idx = future_to_index[future]
-            try:
-                res = future.result()
-                results[idx] = res
-                
-                # Aggregate usage
-                cam_usage = res.get("usage", {})
-                for k in batch_usage:
-                    batch_usage[k] += cam_usage.get(k, 0)
-                    
-            except Exception as e:
-                logger.error(f"CAM error at index {idx}: {e}")
-                results[idx] = {
-                    "Vehicle": cams[idx].get("Vehicle", "Unknown"),
-                    "Size": cams[idx].get("Size", "Unknown"),
-                    "success": False, "error_code": "INTERNAL_ERROR"
-                }
-
-        for future in not_done:
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending,
+                timeout=max(0, deadline - time.time()),
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for future in done:
+                yield collect(future)
+
+        for future in pending:
             idx = future_to_index[future]
             logger.error(f"TIMEOUT for CAM at index {idx}")
-            results[idx] = {
-            "Vehicle": cams[idx].get("Vehicle", "Unknown"),
-            "Size": cams[idx].get("Size", "Unknown"),
-            "HB1": "Error", "HB2": "Error", "HB3": "Error", "HB4": "Error",
-            "SKUs": ["-"] * 20,
-            "success": False,
-            "error_code": "TIMEOUT",
-            "usage": {}
-        }
             future.cancel()
+            if local_fallback:
+                # Prefetched rows only: no BigQuery round trip after the deadline
+                local = rank_cam_locally(cams[idx], params, prefetched_by_index.get(idx),
+                                         fallback_for="TIMEOUT", allow_fetch=False)
+                if local and local["success"]:
+                    yield idx, local
+                    continue
+            yield idx, {
+                "Vehicle": cams[idx].get("Vehicle", "Unknown"),
+                "Size": cams[idx].get("Size", "Unknown"),
+                "HB1": "Error", "HB2": "Error", "HB3": "Error", "HB4": "Error",
+                "SKUs": ["-"] * 20,
+                "success": False,
+                "error_code": "TIMEOUT",
+                "usage": {}
+            }
+    finally:
+        # Consumer went away (e.g. dropped stream): don't start queued CAMs.
+        for future in pending:
+            future.cancel()
+        if context_cache:
+            report = context_cache.close()
+            if cache_report is not None:
+                cache_report.update(report)
 
-    return {
+
+def generate_recommendations_batch_push(run_id, cams, params):
+    """
+    New Batch Push Engine.
+    Collects iter_recommendations_batch_push into a single response.
+    Preserves input order.
+    """
+    results = [None] * len(cams)
+
+    batch_usage = {
+        "prompt_token_count": 0,
+        "candidates_token_count": 0,
+        "total_token_count": 0,
+        "cached_content_token_count": 0
+    }
+
+    cache_report = {}
+    tier_stats = TierStats()
+    validation_stats = ValidationStats()
+    for idx, res in iter_recommendations_batch_push(run_id, cams, params, cache_report):
+        results[idx] = res
+        tier_stats.add(res)
+        validation_stats.add(res)
+
+        # Aggregate usage
+        cam_usage = res.get("usage", {})
+        for k in batch_usage:
+            batch_usage[k] += cam_usage.get(k, 0) or 0
+
+    response = {
         "run_id": run_id,
         "results": results,
         "usage": batch_usage
     }
+    if cache_report:
+        response["context_cache"] = cache_report
+    if tier_stats:
+        response["cascade"] = tier_stats.report()
+    if validation_stats:
+        response["validation"] = validation_stats.report()
+    return response
 
 import time
 
+def fetch_fitment_rows(vehicle, size, prefetched_data=None, allow_fetch=True):
+    """
+    Feedback rows for one CAM: the vehicle's rows from the batch prefetch, else the
+    size's generic table, else (allow_fetch) a standard fetch (cache -> BQ -> CSV).
+    Returns (rows, generic_size_table).
+    """
+    feedback_data = []
+    generic_size_table = False
+
+    if prefetched_data:
+        # Optimisation: Use bulk-fetched data from memory
+        n_size = _normalise_size(size)
+        size_rows = prefetched_data.get(n_size, [])
+
+        # Filter by Vehicle (replicating BQ logic)
+        n_veh = _normalise_vehicle(vehicle)
+        if n_veh:
+            feedback_data = [r for r in size_rows if _normalise_vehicle(r.get("Vehicle")) == n_veh]
+
+        # Fallback: If no vehicle specific data, use all data for size (Generic)
+        if not feedback_data:
+            feedback_data = size_rows
+            generic_size_table = bool(size_rows)
+
+    # If pre-fetch missed (or wasn't provided), standard fetch (cache -> BQ -> CSV)
+    if not feedback_data and allow_fetch:
+        feedback_data = fetch_feedback_from_bigquery(size, vehicle)
+    return feedback_data, generic_size_table
+
 def generate_recommendation(vehicle, size,
                              goldilocks_zone_pct=15, price_fluctuation_upper=1.1, price_fluctuation_lower=0.9,
                              brand_enhancer="Anybrand", model_enhancer="Anymodel",
@@ -315,7 +730,8 @@ def generate_recommendation(vehicle, size,
                              override_model=None, disable_search=False,
 
                              thinking_budget=None, stream=True, benchmark_mode=False, return_metadata=False,
-                             prefetched_data=None):
+                             prefetched_data=None, table_encoding=None, row_aliases=None,
+                             prefilter=None, prefilter_token_budget=None, context_cache=None, grounding=None):
     
     t_start = time.time()
     
@@ -360,25 +776,7 @@ def generate_recommendation(vehicle, size,
         pass # Cache removed per user request
 
     # 3. Fetch Data
-    feedback_data = []
-    
-    if prefetched_data:
-        # Optimisation: Use bulk-fetched data from memory
-        n_size = _normalise_size(size)
-        size_rows = prefetched_data.get(n_size, [])
-        
-        # Filter by Vehicle (replicating BQ logic)
-        n_veh = _normalise_vehicle(vehicle)
-        if n_veh:
-            feedback_data = [r for r in size_rows if _normalise_vehicle(r.get("Vehicle")) == n_veh]
-            
-        # Fallback: If no vehicle specific data, use all data for size (Generic)
-        if not feedback_data:
-            feedback_data = size_rows
-            
-    # If pre-fetch missed (or wasn't provided), standard fetch (cache -> BQ -> CSV)
-    if not feedback_data:
-        feedback_data = fetch_feedback_from_bigquery(size, vehicle)
+    feedback_data, generic_size_table = fetch_fitment_rows(vehicle, size, prefetched_data)
 
     if not feedback_data:
         # logger.warning(f"❌ No feedback data for {vehicle} {size}.")
@@ -397,110 +795,89 @@ def generate_recommendation(vehicle, size,
             }
         return get_error_output(vehicle, size, "NoDataError")
 
-    # Format data string
+    prompt_cfg = Config.MODEL_CONFIG.get('prompt', {})
+    encoding = table_encoding or prompt_cfg.get('table_encoding', 'legacy')
+    if row_aliases is None:
+        row_aliases = bool(prompt_cfg.get('row_aliases', False))
+
+    # Local pre-filter: hard rules, ranking and token budget before the prompt
+    prefilter_cfg = Config.MODEL_CONFIG.get('prefilter', {})
+    if prefilter is None:
+        prefilter = bool(prefilter_cfg.get('enabled', False))
+    prefilter_stats = None
+    table_rows = feedback_data
+    if prefilter:
+        feedback_data, table_rows, prefilter_stats = prefilter_candidates(
+            feedback_data,
+            goldilocks_zone_pct=goldilocks_zone_pct,
+            price_fluctuation_upper=price_fluctuation_upper,
+            price_fluctuation_lower=price_fluctuation_lower,
+            brand_enhancer_lower=brand_enhancer_lower,
+            model_enhancer_lower=model_enhancer_lower,
+            seasonal_performance=seasonal_performance,
+            token_budget=prefilter_token_budget or prefilter_cfg.get('token_budget'),
+            encoding=encoding,
+            keep_top_popular=prefilter_cfg.get('keep_top_popular', 5),
+        )
+        logger.info(
+            f"🧹 Pre-filter: {prefilter_stats['rows_in']} -> {prefilter_stats['rows_out']} rows "
+            f"({prefilter_stats['inactive_dropped']} inactive, {prefilter_stats['duplicates_dropped']} duplicate, "
+            f"{prefilter_stats['trimmed']} over budget)"
+        )
+
     # Format data as CSV (Pipe Separated) to save tokens
-    # Using more descriptive headers to ensure model understands the columns
-    headers = [
-        "TyreScore", "ProdID", "WetGrade", "Brand", "Model", "WetVal", "FuelVal", "NoiseVal", 
-        "Season", "IsOE", "AwardScore", "IsRunflat", "Segment", "PriceScore", "WetScore", "FuelScore", 
-        "WetScorePct", "AwardScorePct", "Vehicle", "Size", "PriceGBP", "IsOffer", "PriceFluct", 
-        "Orders", "Units", "Goldilocks", "PremShare", "MidShare", "BudShare", "RFShare", 
-        "Status", "Views", "ClickRate"
-    ]
-    
-    rows = []
-    rows.append("|".join(headers))
-    
-    for item in feedback_data:
-        row = [
-            str(item.get('TyreScore', '')),
-            str(item.get('ProductId', '')),
-            str(item.get('GRADE', '')),
-            str(item.get('BRAND', '')),
-            str(item.get('Model', '')),
-            str(item.get('WET_GRIP', '')),
-            str(item.get('FUEL', '')),
-            str(item.get('NOISE_REDUCTION', '')),
-            str(item.get('SEASONAL_PERFORMANCE', '')),
-            str(item.get('OE', '')),
-            str(item.get('AWARD_SCORE', '')),
-            str(item.get('RunflatStatus', '')),
-            str(item.get('Segment', '')),
-            str(item.get('PRICE_pct', '')),
-            str(item.get('GRADE_pct', '')),
-            str(item.get('FUEL_pct', '')),
-            str(item.get('WET_GRIP_pct', '')),
-            str(item.get('AWARD_SCORE_pct', '')),
-            str(item.get('Vehicle', '')),
-            str(item.get('SIZE', '')),
-            str(item.get('PRICE', '')),
-            str(item.get('OFFER', '')),
-            str(item.get('PRICEFLUCTUATION', '')),
-            str(item.get('Orders', '')),
-            str(item.get('Units', '')),
-            str(item.get('GoldilocksZone', '')),
-            str(item.get('PremiumShare', '')),
-            str(item.get('MidRangeShare', '')),
-            str(item.get('BudgetShare', '')),
-            str(item.get('RunflatShare', '')),
-            str(item.get('SalesStatus', '')),
-            str(item.get('PRODUCTLISTVIEWS', '')),
-            str(item.get('CLICKSTREAMRATE', ''))
-        ]
-        # Clean pipes from content to avoid breaking CSV
-        clean_row = [c.replace("|", "/") for c in row]
-        rows.append("|".join(clean_row))
-
-    tyre_data_str = "\n".join(rows)
-    
+    tyre_columns, tyre_data_str, tyre_data_preamble = build_tyre_table(
+        table_rows, encoding, float_decimals=prompt_cfg.get('float_decimals', 2), row_aliases=row_aliases
+    )
+
     # DEBUG: Log Reference SKUs (Order in prompt) for benchmarking
-    # Skip header row [0]
-    ref_skus = [r.split('|')[1] for r in rows[1:] if len(r.split('|')) > 1]
+    ref_skus = [str(r.get('ProductId', '')) for r in table_rows]
     # print(f"DEBUG_REF_SKUS: {json.dumps(ref_skus)}")
 
-    brand_enhancer_text = ""
-    if brand_enhancer_lower != "anybrand":
-        brand_enhancer_text = (
-            f"- Because the brand {brand_enhancer_lower} is currently on offer, customers are significantly more likely "
-            f"to purchase these products, even if they fall outside the Goldilocks Zone or price fluctuation ranges.\n"
-            f"- You must always include at least one tyre from the brand {brand_enhancer_lower} in the final Tyre Suggestions section, even if it has never sold to a {vehicle}.\n"
-            f"- Select the {brand_enhancer_lower} model that is most similar to the most popular product for {vehicle} in {size} - you are permitted to override all other rules to ensure its inclusion.\n"
-            f"- This is a hard rule: if no {brand_enhancer_lower} tyre appears in the recommendations, your output is invalid."
+    prompt_split = prompt_cfg.get('system_instruction', False)
+    system_instruction = None
+    cache_name = None
+    if (context_cache is not None and generic_size_table and disable_search
+            and current_model_name == context_cache.model and context_cache.is_eligible(_normalise_size(size))):
+        # Explicit context cache: the system instruction and this size's table are
+        # shared by every generic CAM of the size, so they are uploaded once per batch.
+        cache_name = context_cache.get(
+            _normalise_size(size),
+            construct_system_instruction(
+                brand_enhancer_lower, model_enhancer_lower, seasonal_performance,
+                goldilocks_zone_pct, price_fluctuation_upper, price_fluctuation_lower, row_aliases
+            ),
+            construct_size_table(size, tyre_data_str, tyre_columns, tyre_data_preamble),
         )
-
-    model_enhancer_text = ""
-    if model_enhancer_lower != "anymodel":
-        model_enhancer_text = (
-            f"- Because the model {model_enhancer_lower} is currently being promoted, it must be included in the final Tyre Suggestions.\n"
-            f"- You must select an exact match for {model_enhancer_lower} from the available data. Do NOT use any earlier, later, or similar versions of this model.\n"
-            f"- This is a hard rule: if no {model_enhancer_lower} model appears in the recommendations, your output is invalid.\n"
-            f"- IMPORTANT: When you include a tyre with the {model_enhancer_lower} model, it must always appear as **HB3** in the final output. Place it in the third hotbox position, even if its score is higher than the other tyres."
+    if cache_name:
+        text_input = construct_request(vehicle, size)
+    elif prompt_split:
+        # Static rules go in the system instruction (identical for every CAM of a
+        # batch, so Gemini can serve it from its prefix cache); the request only
+        # carries the fitment and its table.
+        system_instruction = construct_system_instruction(
+            brand_enhancer_lower, model_enhancer_lower, seasonal_performance,
+            goldilocks_zone_pct, price_fluctuation_upper, price_fluctuation_lower, row_aliases
         )
-
-    season_enhancer_text = ""
-    _seasonal_val = (seasonal_performance or "").strip().lower()
-    if _seasonal_val in {"summer", "winter", "allseason"}:
-        season_enhancer_text = (
-            f"- The customer has explicitly requested tyres designed for **{_seasonal_val}** use.\n"
-            f"- You must select at least 1 tyre with Seasonal Performance marked as **{_seasonal_val.capitalize()}** within primary recommendations, subject to Slot Eligibility and the Non-Override Guardrails.\n"
-            f"- If a Season enhancer product is chosen and it is Budget, it may only occupy HB4 (and only if BudgetShare permits). Otherwise use the top-scoring non-Budget seasonal tyre.\n"
-            f"- IMPORTANT: Place the selected seasonal tyre in HB4 unless that would violate Budget placement/count; if so, place it in the highest eligible HB slot (HB3 if Budget; HB1/HB2 only if non-Budget).\n"
-            f"- This is a hard rule: if no eligible **{_seasonal_val}** tyre appears in primary recommendations, your output is invalid."
+        text_input = construct_request(vehicle, size, tyre_data_str, tyre_columns, tyre_data_preamble)
+    else:
+        brand_enhancer_text, model_enhancer_text, season_enhancer_text = build_enhancer_texts(
+            brand_enhancer_lower, model_enhancer_lower, seasonal_performance, vehicle, size
+        )
+        text_input = construct_prompt(
+            vehicle, size, tyre_data_str,
+            brand_enhancer_text, model_enhancer_lower, model_enhancer_text,
+            seasonal_performance, season_enhancer_text,
+            goldilocks_zone_pct, price_fluctuation_upper, price_fluctuation_lower,
+            tyre_columns=tyre_columns, tyre_data_preamble=tyre_data_preamble, row_aliases=row_aliases
         )
-
-    text_input = construct_prompt(
-        vehicle, size, tyre_data_str, 
-        brand_enhancer_text, model_enhancer_lower, model_enhancer_text, 
-        seasonal_performance, season_enhancer_text,
-        goldilocks_zone_pct, price_fluctuation_upper, price_fluctuation_lower
-    )
 
     # Log Prompt Stats
     # Log Prompt Stats
     char_count = len(text_input)
     est_tokens = char_count // 4
     logger.info(f"📝 Generated Prompt: {char_count:,} chars (~{est_tokens:,} tokens)")
-    logger.info(f"📝 Feedback Data Rows: {len(feedback_data)}")
+    logger.info(f"📝 Feedback Data Rows: {len(table_rows)}")
 
     # Call Gemini using Dynamic Config
     model_cfg = Config.MODEL_CONFIG.get('model', {})
@@ -522,15 +899,31 @@ def generate_recommendation(vehicle, size,
     
     contents = [types.Content(role="user", parts=[types.Part(text=text_input)])]
     
+    # Grounding: "remote" attaches the Vertex AI Search tool, "local" inlines snippets from the
+    # local catalogue index (no retrieval hop), "none" sends neither. disable_search turns both off.
+    grounding = (grounding or search_cfg.get('grounding', 'remote')).strip().lower()
+    grounding_used = None
+    grounding_ms = 0
     tools = []
     logger.info(f"🔍 DEBUG: disable_search={disable_search}, type={type(disable_search)}")
-    if not disable_search and search_cfg.get('datastore_id'):
+    if not disable_search and grounding == "local":
+        t_grounding = time.time()
+        snippets = grounding_snippets(
+            size, table_rows, k=search_cfg.get('local_top_k', 5), max_chars=search_cfg.get('local_max_chars', 240)
+        )
+        grounding_ms = int((time.time() - t_grounding) * 1000)
+        if snippets:
+            contents[0].parts.append(types.Part(text=build_catalogue_notes(snippets)))
+            grounding_used = "local"
+        logger.info(f"📚 Local grounding: {len(snippets)} catalogue snippet(s) in {grounding_ms} ms")
+    elif not disable_search and grounding == "remote" and search_cfg.get('datastore_id'):
          logger.info(f"🔍 DEBUG: Enabling Datastore Tool: {search_cfg['datastore_id']}")
          tools = [
             types.Tool(retrieval=types.Retrieval(vertex_ai_search=types.VertexAISearch(datastore=search_cfg['datastore_id'])))
          ]
+         grounding_used = "remote"
     else:
-         logger.info("🔍 DEBUG: Tools are disabled (Search disabled or no datastore_id).")
+         logger.info("🔍 DEBUG: Tools are disabled (Search disabled, grounding none or no datastore_id).")
 
     
     safety_settings = [
@@ -550,9 +943,17 @@ def generate_recommendation(vehicle, size,
         generation_config_args["temperature"] = 0.0
         generation_config_args["top_p"] = 1.0
         
-    if thinking_budget and thinking_budget > 0:
+    # 0 explicitly turns thinking off (2.5 Flash thinks by default); None keeps the model default
+    if thinking_budget is not None:
         generation_config_args["thinking_config"] = types.ThinkingConfig(thinking_budget=thinking_budget)
 
+    if system_instruction:
+        generation_config_args["system_instruction"] = system_instruction
+    if cache_name:
+        # Instructions live in the cache; tools and system_instruction may not be sent alongside it
+        generation_config_args["cached_content"] = cache_name
+        generation_config_args.pop("tools", None)
+
     config = types.GenerateContentConfig(**generation_config_args)
 
     usage_metadata = {}
@@ -585,7 +986,8 @@ def generate_recommendation(vehicle, size,
                         usage_metadata = {
                             "prompt_token_count": chunk.usage_metadata.prompt_token_count,
                             "candidates_token_count": chunk.usage_metadata.candidates_token_count,
-                            "total_token_count": chunk.usage_metadata.total_token_count
+                            "total_token_count": chunk.usage_metadata.total_token_count,
+                            "cached_content_token_count": chunk.usage_metadata.cached_content_token_count or 0
                         }
                 
                 t_model_end = time.time()
@@ -606,7 +1008,8 @@ def generate_recommendation(vehicle, size,
                     usage_metadata = {
                         "prompt_token_count": response.usage_metadata.prompt_token_count,
                         "candidates_token_count": response.usage_metadata.candidates_token_count,
-                        "total_token_count": response.usage_metadata.total_token_count
+                        "total_token_count": response.usage_metadata.total_token_count,
+                        "cached_content_token_count": response.usage_metadata.cached_content_token_count or 0
                     }
             
             # If successful, break retry loop
@@ -639,6 +1042,9 @@ def generate_recommendation(vehicle, size,
     
     t_end = time.time()
 
+    if cache_name:
+        context_cache.record_usage(usage_metadata)
+
     if error_type:
         if return_metadata:
              return {
@@ -647,6 +1053,8 @@ def generate_recommendation(vehicle, size,
                 "error_type": error_type,
                 "model": current_model_name,
                 "search_enabled": bool(tools),
+                "grounding": grounding_used,
+                "grounding_ms": grounding_ms,
                 "thinking_budget": thinking_budget,
                 "latency_ms": int((t_model_end - t_model_start) * 1000) if t_model_end > 0 else 0,
                 "total_ms": int((t_end - t_start) * 1000),
@@ -655,6 +1063,13 @@ def generate_recommendation(vehicle, size,
         return get_error_output(vehicle, size, error_type)
 
     generated_text = full_response_text
+
+    # Row aliases: map r1..rN back to ProductIds (by table row) before parsing
+    alias_misses = 0
+    if row_aliases:
+        generated_text, alias_misses = resolve_row_aliases(generated_text, ref_skus, vehicle, size)
+        if alias_misses:
+            logger.warning(f"⚠️ {alias_misses} row alias(es) outside the table for {vehicle} {size}.")
     
     # DEBUG: Log raw output to understand refusal/format issues
     # print(f"DEBUG_RAW_OUTPUT:\n{generated_text}\n-------------------")
@@ -668,6 +1083,8 @@ def generate_recommendation(vehicle, size,
                 "error_type": "NoContent",
                 "model": current_model_name,
                 "search_enabled": bool(tools),
+                "grounding": grounding_used,
+                "grounding_ms": grounding_ms,
                 "thinking_budget": thinking_budget,
                 "latency_ms": int((t_model_end - t_model_start) * 1000),
                 "total_ms": int((t_end - t_start) * 1000),
@@ -733,10 +1150,16 @@ def generate_recommendation(vehicle, size,
             "error_type": None if success else "FormatError",
             "model": current_model_name,
             "search_enabled": bool(tools),
+            "grounding": grounding_used,
+            "grounding_ms": grounding_ms,
             "thinking_budget": thinking_budget,
             "latency_ms": int((t_model_end - t_model_start) * 1000),
             "total_ms": int((t_end - t_start) * 1000),
             "usage": usage_metadata,
+            "row_aliases": bool(row_aliases),
+            "alias_misses": alias_misses,
+            "prefilter": prefilter_stats,
+            "context_cache": cache_name,
             "feedback_data": feedback_data
         }
             
@@ -750,6 +1173,8 @@ def generate_recommendation(vehicle, size,
             "error_type": "FormatError",
             "model": current_model_name,
             "search_enabled": bool(tools),
+            "grounding": grounding_used,
+            "grounding_ms": grounding_ms,
             "thinking_budget": thinking_budget,
             "latency_ms": int((t_model_end - t_model_start) * 1000),
             "total_ms": int((t_end - t_start) * 1000),
@@ -0,0 +1,52 @@
+import functools
+import hashlib
+import json
+import os
+
+from aim_waves.config import Config
+
+# Batch params that steer scheduling or the response, not the answer itself
+OPERATIONAL_PARAMS = ("priority", "fingerprint")
+
+
+@functools.lru_cache(maxsize=1)
+def engine_version():
+    """Digest of the model config and prompt templates: changing either changes every fingerprint."""
+    h = hashlib.sha256(json.dumps(Config.MODEL_CONFIG, sort_keys=True, default=str).encode())
+    try:
+        names = sorted(os.listdir(Config.PROMPT_TEMPLATE_DIR))
+    except OSError:
+        names = []
+    for name in names:
+        with open(os.path.join(Config.PROMPT_TEMPLATE_DIR, name), "rb") as f:
+            h.update(name.encode())
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def answer_params(params):
+    """Batch params the answer depends on (OPERATIONAL_PARAMS dropped)."""
+    return {k: v for k, v in (params or {}).items() if k not in OPERATIONAL_PARAMS}
+
+
+def params_digest(params):
+    """Short digest of the answer params, for keying answers computed under them."""
+    return hashlib.sha256(json.dumps(answer_params(params), sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def input_fingerprint(cam, rows, params):
+    """
+    Digest of everything a CAM's answer depends on: its candidate rows, the
+    answer params and the engine version. None when the CAM has no rows (its
+    answer can never be carried forward).
+    """
+    if not rows:
+        return None
+    h = hashlib.sha256(engine_version().encode())
+    h.update(json.dumps([cam.get("Vehicle"), cam.get("Size"), cam.get("ranker"), answer_params(params)],
+                        sort_keys=True, default=str).encode())
+    # Row order follows TyreScore/Units ties in BigQuery; hash the set of rows
+    for line in sorted(json.dumps(r, sort_keys=True, default=str) for r in rows):
+        h.update(line.encode())
+        h.update(b"\n")
+    return h.hexdigest()[:20]
@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+
+from aim_waves.config import Config
+from aim_waves.core import engine
+from aim_waves.core.admission import admission
+from aim_waves.data.job_store import get_job_store
+
+logger = logging.getLogger(__name__)
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+_active_jobs = set()
+_active_lock = threading.Lock()
+
+
+def submit_job(run_id, cams, params):
+    """Stores a new job and starts processing it in the background. Returns the job id."""
+    store = get_job_store()
+    job_id = store.create_job(run_id, cams, params)
+    _start(job_id)
+    return job_id
+
+
+def resume_job(job_id):
+    """
+    Re-runs only the failed CAMs of a job. Finished CAMs are never redone.
+    Returns the requeued indices, or None if the job does not exist.
+    """
+    store = get_job_store()
+    if store.get_job(job_id) is None:
+        return None
+    requeued = store.requeue_failed(job_id)
+    if requeued or store.pending_cams(job_id):
+        _start(job_id)
+    return requeued
+
+
+def _start(job_id):
+    with _active_lock:
+        if job_id in _active_jobs:
+            # A running worker picks up newly pending CAMs before it exits
+            return
+        _active_jobs.add(job_id)
+    threading.Thread(target=_run_job, args=(job_id,), name=f"aim-job-{job_id[:8]}", daemon=True).start()
+
+
+def _run_job(job_id):
+    """
+    Worker loop: processes pending CAMs in chunks so every chunk gets the full
+    batch deadline, and records each result as soon as it completes.
+    """
+    store = get_job_store()
+    job = store.get_job(job_id)
+    run_id, params = job["run_id"], job["params"]
+    store.set_job_status(job_id, JOB_RUNNING)
+    logger.info(f"🧵 Job {job_id} started for run_id {run_id} ({job['pending']} pending CAMs)")
+
+    try:
+        while True:
+            pending = store.pending_cams(job_id)
+            if not pending:
+                with _active_lock:
+                    # Re-check under the lock so a concurrent resume can't be missed
+                    if not store.pending_cams(job_id):
+                        _active_jobs.discard(job_id)
+                        break
+                continue
+
+            chunk = pending[:Config.JOB_CHUNK_SIZE]
+            indices = [i for i, _ in chunk]
+            cams = [cam for _, cam in chunk]
+            # Jobs queue for the in-flight budget rather than being rejected
+            admission.acquire(len(cams))
+            t_start = time.time()
+            try:
+                for j, res in engine.iter_recommendations_batch_push(run_id, cams, params):
+                    store.save_result(job_id, indices[j], res)
+            finally:
+                admission.release(len(cams), time.time() - t_start)
+
+        store.set_job_status(job_id, JOB_COMPLETED)
+        logger.info(f"✅ Job {job_id} finished.")
+    except Exception as e:
+        logger.error(f"❌ Job {job_id} failed: {e}")
+        with _active_lock:
+            _active_jobs.discard(job_id)
+        store.set_job_status(job_id, JOB_FAILED, error=str(e))
@@ -0,0 +1,161 @@
+import collections
+import statistics
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from aim_waves.config import Config
+from aim_waves.data.bigquery import _normalise_size, _normalise_vehicle
+from aim_waves.data.loader import vehicle_batch_map
+
+SEGMENT_BUCKETS = 16   # hashed one-hot width for the vehicle segment
+SEGMENT_WEIGHT = 0.5   # weight of the segment block against the share/price/mix block
+UNKNOWN_SEGMENTS = {"", "NAN", "UNKNOWN SEGMENT", "NOT A VEHICLE - NO SEGMENT"}
+
+_segments = None
+_segments_lock = threading.Lock()
+
+
+def segment_for(vehicle, size):
+    """Segment of a fitment from the segment list (normalised Vehicle + Size lookup)."""
+    global _segments
+    with _segments_lock:
+        if _segments is None:
+            _segments = {
+                (_normalise_vehicle(v), _normalise_size(s)): meta.get("segment", "")
+                for (v, s), meta in vehicle_batch_map.items()
+            }
+    return _segments.get((_normalise_vehicle(vehicle), _normalise_size(size)), "")
+
+
+def _median(rows, col):
+    values = []
+    for r in rows:
+        try:
+            values.append(float(r.get(col)))
+        except (TypeError, ValueError):
+            pass
+    return statistics.median(values) if values else 0.0
+
+
+def fitment_features(rows, segment=""):
+    """
+    Feature vector of a fitment from its TyreScore rows: grade and run-flat shares,
+    Goldilocks price relative to the median price, units mix by grade and run-flat,
+    plus a hashed segment one-hot. Shares are fitment constants (median for
+    generic size tables).
+    """
+    units = np.array([max(float(r.get("Units") or 0), 0.0) for r in rows]) if rows else np.zeros(0)
+    grades = [str(r.get("GRADE") or "").strip().upper() for r in rows]
+    runflat = np.array([str(r.get("RunflatStatus") or "").strip().upper() == "RUNFLAT" for r in rows], dtype=bool)
+    total_units = units.sum() or 1.0
+
+    median_price = _median(rows, "PRICE")
+    goldilocks = _median(rows, "GoldilocksZone") / median_price if median_price else 1.0
+
+    vector = np.zeros(9 + SEGMENT_BUCKETS)
+    vector[0] = _median(rows, "PremiumShare") / 100
+    vector[1] = _median(rows, "MidRangeShare") / 100
+    vector[2] = _median(rows, "BudgetShare") / 100
+    vector[3] = _median(rows, "RunflatShare") / 100
+    vector[4] = min(max(goldilocks, 0.0), 2.0) / 2
+    for j, g in enumerate(("PREMIUM", "MIDRANGE", "BUDGET")):
+        vector[5 + j] = units[[x == g for x in grades]].sum() / total_units if rows else 0.0
+    vector[8] = units[runflat].sum() / total_units if rows else 0.0
+
+    segment = str(segment or "").strip().upper()
+    if segment not in UNKNOWN_SEGMENTS:
+        vector[9 + zlib.crc32(segment.encode()) % SEGMENT_BUCKETS] = SEGMENT_WEIGHT
+    return vector
+
+
+class FitmentIndex:
+    """
+    In-process index of computed answers, one block per normalised size and
+    answer-params digest (answers built under other enhancers, season or price
+    settings are never reused). Lookups are a single matrix-vector product over
+    the block's unit vectors (cosine similarity), so a size with thousands of
+    fitments stays cheap. Each block keeps at most max_per_size answers (oldest
+    evicted first); answers older than max_age_s are dropped.
+    """
+
+    def __init__(self, max_per_size=500, max_age_s=24 * 3600):
+        self.max_per_size = max_per_size
+        self.max_age_s = max_age_s
+        self._lock = threading.Lock()
+        # (n_size, params_key) -> {"entries": OrderedDict(n_veh -> (vehicle, unit vector, answer, added)), "matrix", "keys"}
+        self._blocks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, vehicle, size, vector, answer, params_key=""):
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return
+        key, n_veh = (_normalise_size(size), params_key), _normalise_vehicle(vehicle)
+        with self._lock:
+            block = self._blocks.setdefault(key, {"entries": collections.OrderedDict(), "matrix": None, "keys": []})
+            block["entries"].pop(n_veh, None)
+            block["entries"][n_veh] = (vehicle, vector / norm, answer, time.monotonic())
+            while len(block["entries"]) > self.max_per_size:
+                block["entries"].popitem(last=False)
+            block["matrix"] = None
+
+    def _expire(self, key):
+        """Drops a block's answers older than max_age_s (entries are in insertion order). Caller holds the lock."""
+        block = self._blocks[key]
+        cutoff = time.monotonic() - self.max_age_s
+        entries = block["entries"]
+        while entries and next(iter(entries.values()))[3] < cutoff:
+            entries.popitem(last=False)
+            block["matrix"] = None
+        if not entries:
+            del self._blocks[key]
+
+    def nearest(self, vehicle, size, vector, min_similarity, params_key=""):
+        """(neighbour vehicle, similarity, answer) of the closest other fitment on the size, or None."""
+        norm = np.linalg.norm(vector)
+        key, n_veh = (_normalise_size(size), params_key), _normalise_vehicle(vehicle)
+        with self._lock:
+            if key in self._blocks:
+                self._expire(key)
+            block = self._blocks.get(key)
+            if not norm or not block:
+                self.misses += 1
+                return None
+            if block["matrix"] is None:
+                block["keys"] = list(block["entries"])
+                block["matrix"] = np.vstack([block["entries"][k][1] for k in block["keys"]])
+            sims = block["matrix"] @ (vector / norm)
+            if n_veh in block["entries"]:
+                sims[block["keys"].index(n_veh)] = -1.0
+            best = int(np.argmax(sims))
+            if sims[best] < min_similarity:
+                self.misses += 1
+                return None
+            self.hits += 1
+            neighbour, _, answer, _ = block["entries"][block["keys"][best]]
+            return neighbour, float(sims[best]), answer
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sizes": len({n_size for n_size, _ in self._blocks}),
+                "param_sets": len({params_key for _, params_key in self._blocks}),
+                "fitments": sum(len(b["entries"]) for b in self._blocks.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Shared by every batch of the engine process
+fitment_index = FitmentIndex(
+    Config.MODEL_CONFIG.get("neighbours", {}).get("max_per_size", 500),
+    Config.MODEL_CONFIG.get("neighbours", {}).get("max_age_h", 24) * 3600,
+)
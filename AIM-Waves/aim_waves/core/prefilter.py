@@ -0,0 +1,171 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from aim_waves.core.prompts import build_tyre_table
+
+logger = logging.getLogger(__name__)
+
+# Ranking weights (higher score = earlier in the table, kept first under the budget)
+RANK_WEIGHTS = {
+    "tyre_score": 1.0,     # 1.BEST .. 4.FAIR tier
+    "popularity": 2.0,     # Units percentile within the table
+    "goldilocks": 1.0,     # price within ±goldilocks_zone_pct of GoldilocksZone
+    "price_fluct": 0.5,    # price drop favoured, price hike penalised
+    "offer": 0.5,          # ONOFFER
+    "grade_share": 1.0,    # share of the fitment's sales in the row's grade
+    "runflat_share": 0.5,  # runflat status matching RunflatShare
+}
+
+
+def _upper(df, col):
+    if col not in df:
+        return pd.Series("", index=df.index)
+    return df[col].fillna("").astype(str).str.strip().str.upper()
+
+
+def _num(df, col):
+    if col not in df:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[col], errors="coerce")
+
+
+def _score(df, goldilocks_zone_pct, price_fluctuation_upper, price_fluctuation_lower):
+    """Vectorized commercial score mirroring the template's soft rules."""
+    tier = pd.to_numeric(_upper(df, "TyreScore").str.extract(r"^(\d)")[0], errors="coerce")
+    tyre_score = ((5 - tier) / 4).clip(0, 1).fillna(0)
+
+    units = _num(df, "Units").fillna(0)
+    popularity = units.rank(pct=True, method="max") if len(df) > 1 else pd.Series(1.0, index=df.index)
+
+    price, zone = _num(df, "PRICE"), _num(df, "GoldilocksZone")
+    band = zone * goldilocks_zone_pct / 100
+    goldilocks = ((price - zone).abs() <= band).astype(float)
+
+    fluct = _num(df, "PRICEFLUCTUATION").fillna(1.0)
+    price_fluct = np.select([fluct > price_fluctuation_upper, fluct < price_fluctuation_lower], [-1.0, 1.0], 0.0)
+
+    offer = (_upper(df, "OFFER") == "ONOFFER").astype(float)
+
+    grade = _upper(df, "GRADE")
+    grade_share = np.select(
+        [grade == "PREMIUM", grade == "MIDRANGE", grade == "BUDGET"],
+        [_num(df, "PremiumShare"), _num(df, "MidRangeShare"), _num(df, "BudgetShare")],
+        np.nan,
+    )
+    grade_share = np.nan_to_num(grade_share / 100, nan=0.0)
+
+    rf_share = _num(df, "RunflatShare").fillna(0) / 100
+    is_runflat = _upper(df, "RunflatStatus") == "RUNFLAT"
+    runflat_share = np.where(is_runflat, rf_share, 1 - rf_share)
+
+    w = RANK_WEIGHTS
+    return (
+        w["tyre_score"] * tyre_score
+        + w["popularity"] * popularity
+        + w["goldilocks"] * goldilocks
+        + w["price_fluct"] * price_fluct
+        + w["offer"] * offer
+        + w["grade_share"] * grade_share
+        + w["runflat_share"] * runflat_share
+    )
+
+
+def _pinned(df, brand_enhancer_lower, model_enhancer_lower, seasonal_performance, keep_top_popular):
+    """Rows the template can force into the output, which must never be trimmed."""
+    pinned = pd.Series(False, index=df.index)
+    brand = df["BRAND"].fillna("").astype(str).str.strip().str.lower() if "BRAND" in df else None
+    model = df["Model"].fillna("").astype(str).str.strip().str.lower() if "Model" in df else None
+
+    if brand is not None and brand_enhancer_lower and brand_enhancer_lower != "anybrand":
+        pinned |= brand == brand_enhancer_lower
+    if model is not None and model_enhancer_lower and model_enhancer_lower != "anymodel":
+        pinned |= model == model_enhancer_lower
+    season = (seasonal_performance or "").strip().lower()
+    if season in {"summer", "winter", "allseason"} and "SEASONAL_PERFORMANCE" in df:
+        pinned |= df["SEASONAL_PERFORMANCE"].fillna("").astype(str).str.strip().str.lower() == season
+
+    # Most popular tyres (top seller + the top-N rule), tie-break by TyreScore
+    tier = pd.to_numeric(_upper(df, "TyreScore").str.extract(r"^(\d)")[0], errors="coerce").fillna(9)
+    by_units = df.assign(_units=_num(df, "Units").fillna(0), _tier=tier).sort_values(
+        ["_units", "_tier"], ascending=[False, True], kind="stable"
+    )
+    pinned.loc[by_units.index[:max(1, keep_top_popular)]] = True
+
+    # Top-selling run-flat (RFShare rule) and top Michelin (Michelin rule)
+    runflats = by_units[_upper(by_units, "RunflatStatus") == "RUNFLAT"]
+    if len(runflats):
+        pinned.loc[runflats.index[0]] = True
+    if brand is not None:
+        michelin = by_units[brand.loc[by_units.index] == "michelin"]
+        if len(michelin):
+            pinned.loc[michelin.index[0]] = True
+    return pinned
+
+
+def prefilter_candidates(feedback_data, goldilocks_zone_pct=15, price_fluctuation_upper=1.1,
+                         price_fluctuation_lower=0.9, brand_enhancer_lower="anybrand",
+                         model_enhancer_lower="anymodel", seasonal_performance=None,
+                         token_budget=None, encoding="legacy", keep_top_popular=5):
+    """
+    Local pre-filter between fetch and construct_prompt.
+
+    1. Hard rules: drops rows that are not Active (never eligible for any slot)
+       and duplicate ProductIds (generic size tables repeat a product per vehicle).
+    2. Ranks the rest with the template's soft rules (TyreScore, popularity,
+       Goldilocks zone, price fluctuation, offers, grade and runflat shares).
+    3. Trims the ranked table to token_budget (chars / 4 of the encoded rows),
+       always keeping enhancer matches, the most popular tyres, the top-selling
+       run-flat and the top Michelin.
+
+    Returns (candidates, table_rows, stats): candidates are all eligible rows in
+    rank order (for backfill), table_rows the trimmed subset sent to the model.
+    """
+    stats = {"rows_in": len(feedback_data), "inactive_dropped": 0, "duplicates_dropped": 0,
+             "trimmed": 0, "pinned": 0, "rows_out": len(feedback_data), "table_tokens_est": None}
+    if not feedback_data:
+        return feedback_data, feedback_data, stats
+
+    df = pd.DataFrame(feedback_data)
+    df["_pos"] = np.arange(len(df))
+
+    active = _upper(df, "SalesStatus") == "ACTIVE"
+    if not active.any():
+        logger.warning("⚠️ Pre-filter: no Active rows, keeping the table unfiltered.")
+        active[:] = True
+    stats["inactive_dropped"] = int((~active).sum())
+    df = df[active]
+
+    df = df.assign(
+        _score=_score(df, goldilocks_zone_pct, price_fluctuation_upper, price_fluctuation_lower),
+        _pinned=_pinned(df, brand_enhancer_lower, model_enhancer_lower, seasonal_performance, keep_top_popular),
+    )
+    df = df.sort_values(["_pinned", "_score", "_pos"], ascending=[False, False, True], kind="stable")
+    if "ProductId" in df:
+        before = len(df)
+        # Pinned rows sort first, so a pinned duplicate is the one kept
+        df = df.drop_duplicates(subset="ProductId", keep="first")
+        stats["duplicates_dropped"] = before - len(df)
+    df = df.sort_values(["_score", "_pos"], ascending=[False, True], kind="stable")
+
+    candidates = [feedback_data[i] for i in df["_pos"]]
+    pinned = df["_pinned"].to_numpy()
+    stats["pinned"] = int(pinned.sum())
+
+    keep = np.ones(len(candidates), dtype=bool)
+    if token_budget and len(candidates) > 1:
+        _, table, preamble = build_tyre_table(candidates, encoding)
+        lines = table.split("\n")
+        fixed = (len(lines[0]) + len(preamble) + 2) // 4
+        row_tokens = np.array([(len(line) + 1) / 4 for line in lines[1:]])
+        # Pinned rows are paid for first; the rest fill the budget in rank order
+        remaining = token_budget - fixed - row_tokens[pinned].sum()
+        optional = np.cumsum(np.where(pinned, 0, row_tokens))
+        keep = pinned | (optional <= remaining)
+        stats["trimmed"] = int((~keep).sum())
+        stats["table_tokens_est"] = int(fixed + row_tokens[keep].sum())
+
+    table_rows = [row for row, k in zip(candidates, keep) if k]
+    stats["rows_out"] = len(table_rows)
+    return candidates, table_rows, stats
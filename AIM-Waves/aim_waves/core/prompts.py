@@ -1,6 +1,7 @@
 from aim_waves.core.utils import normalize_string_for_comparison
 from aim_waves.config import Config
 from jinja2 import Environment, FileSystemLoader
+import functools
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,18 +9,189 @@ logger = logging.getLogger(__name__)
 # Initialize Jinja2 Env
 jinja_env = Environment(loader=FileSystemLoader(Config.PROMPT_TEMPLATE_DIR))
 
+# Prompt table columns: (header shown to the model, feedback row key)
+TABLE_COLUMNS = [
+    ("TyreScore", "TyreScore"), ("ProdID", "ProductId"), ("WetGrade", "GRADE"), ("Brand", "BRAND"),
+    ("Model", "Model"), ("WetVal", "WET_GRIP"), ("FuelVal", "FUEL"), ("NoiseVal", "NOISE_REDUCTION"),
+    ("Season", "SEASONAL_PERFORMANCE"), ("IsOE", "OE"), ("AwardScore", "AWARD_SCORE"),
+    ("IsRunflat", "RunflatStatus"), ("Segment", "Segment"), ("PriceScore", "PRICE_pct"),
+    ("WetScore", "GRADE_pct"), ("FuelScore", "FUEL_pct"), ("WetScorePct", "WET_GRIP_pct"),
+    ("AwardScorePct", "AWARD_SCORE_pct"), ("Vehicle", "Vehicle"), ("Size", "SIZE"), ("PriceGBP", "PRICE"),
+    ("IsOffer", "OFFER"), ("PriceFluct", "PRICEFLUCTUATION"), ("Orders", "Orders"), ("Units", "Units"),
+    ("Goldilocks", "GoldilocksZone"), ("PremShare", "PremiumShare"), ("MidShare", "MidRangeShare"),
+    ("BudShare", "BudgetShare"), ("RFShare", "RunflatShare"), ("Status", "SalesStatus"),
+    ("Views", "PRODUCTLISTVIEWS"), ("ClickRate", "CLICKSTREAMRATE"),
+]
+
+# Compact encoding
+# Columns no rule in the template refers to
+COMPACT_DROP_COLUMNS = {"Views", "ClickRate"}
+# Long repeating strings that are replaced by short codes plus a legend
+COMPACT_CODED_COLUMNS = ["TyreScore", "Segment", "IsOE", "AwardScore", "IsRunflat", "IsOffer", "Status"]
+# Columns the rules compare against thresholds (price_fluctuation_upper/lower, BudShare 35%,
+# PremShare 25%, RFShare 20%): trailing zeros are stripped but values are never rounded
+COMPACT_EXACT_COLUMNS = {"PriceFluct", "PremShare", "MidShare", "BudShare", "RFShare"}
+
+TABLE_ENCODINGS = ("legacy", "compact")
+
+
+def row_alias(index):
+    """Alias for the row at 0-based index: r1, r2, ..."""
+    return f"r{index + 1}"
+
+
+def _format_cell(value, float_decimals=None, exact=False):
+    text = str(value)
+    if float_decimals is not None and text and not text.isdigit():
+        try:
+            number = float(text)
+        except ValueError:
+            pass
+        else:
+            # Round (exact: shortest repr) and strip trailing zeros ("0.0" -> "0", "1.10" -> "1.1")
+            text = repr(number) if exact else f"{round(number, float_decimals):.{float_decimals}f}"
+            if "." in text and "e" not in text:
+                text = text.rstrip("0").rstrip(".")
+            if text in ("-0", ""):
+                text = "0"
+    # Clean pipes from content to avoid breaking CSV
+    return text.replace("|", "/")
+
+
+def _column_codes(values):
+    """Short codes (A, B, ... Z, AA, AB ...) for the distinct values in first-seen order."""
+    codes = {}
+    for v in values:
+        if v not in codes:
+            n, code = len(codes), ""
+            while True:
+                code = chr(ord("A") + n % 26) + code
+                n = n // 26 - 1
+                if n < 0:
+                    break
+            codes[v] = code
+    return codes
+
+
+def build_tyre_table(feedback_data, encoding="legacy", float_decimals=2, row_aliases=False):
+    """
+    Formats feedback rows as the pipe-separated table sent to the model.
+    Returns (columns, tyre_data_str, preamble).
+
+    legacy:  every column on every row, values as fetched.
+    compact: columns with one value across all rows (fitment constants such as
+             GoldilocksZone, the grade shares, Vehicle and Size) move to a header
+             block, long categorical columns are dictionary-encoded with a legend,
+             floats are rounded (except the threshold columns in
+             COMPACT_EXACT_COLUMNS) and unreferenced columns are dropped.
+
+    With row_aliases the ProdID column holds r1..rN (row order) instead of the
+    Product ID; map answers back with utils.resolve_row_aliases.
+    """
+    if encoding not in TABLE_ENCODINGS:
+        logger.warning(f"⚠️ Unknown table encoding {encoding!r}, using legacy.")
+        encoding = "legacy"
+
+    if encoding == "legacy":
+        headers = [h for h, _ in TABLE_COLUMNS]
+        rows = ["|".join(headers)]
+        for i, item in enumerate(feedback_data):
+            cells = [_format_cell(item.get(key, "")) for _, key in TABLE_COLUMNS]
+            if row_aliases:
+                cells[headers.index("ProdID")] = row_alias(i)
+            rows.append("|".join(cells))
+        return "|".join(headers), "\n".join(rows), ""
+
+    columns = [(h, k) for h, k in TABLE_COLUMNS if h not in COMPACT_DROP_COLUMNS]
+    cells = {
+        h: [_format_cell(item.get(k, ""), float_decimals, exact=h in COMPACT_EXACT_COLUMNS) for item in feedback_data]
+        for h, k in columns
+    }
+
+    if row_aliases:
+        cells["ProdID"] = [row_alias(i) for i in range(len(feedback_data))]
+
+    # 1. Hoist constants (needs more than one row to tell a constant from a value)
+    constants = []
+    if len(feedback_data) > 1:
+        constants = [h for h, _ in columns if h != "ProdID" and len(set(cells[h])) == 1]
+    kept = [h for h, _ in columns if h not in constants]
+
+    # 2. Dictionary-encode categorical columns where it saves characters
+    legend = []
+    for h in COMPACT_CODED_COLUMNS:
+        if h not in kept:
+            continue
+        codes = _column_codes(cells[h])
+        entry = f"- {h}: " + "; ".join(f"{c}={v}" for v, c in codes.items())
+        saved = sum(len(v) - len(codes[v]) for v in cells[h])
+        if saved > len(entry):
+            cells[h] = [codes[v] for v in cells[h]]
+            legend.append(entry)
+
+    rows = ["|".join(kept)]
+    for i in range(len(feedback_data)):
+        rows.append("|".join(cells[h][i] for h in kept))
+
+    preamble = []
+    if constants:
+        preamble.append("**Fitment constants (apply to every row, not repeated as columns):**")
+        preamble.append(" | ".join(f"{h}={cells[h][0]}" for h in constants))
+    if legend:
+        preamble.append("**Legend (coded columns; decode before applying any rule):**")
+        preamble.extend(legend)
+    return "|".join(kept), "\n".join(rows), "\n".join(preamble)
+
+
 def get_error_output(vehicle, size, error_type="Error"):
     safe_vehicle = (vehicle or "UNKNOWN").strip().replace(" ", "_")
     safe_size = (size or "UNKNOWN").strip().replace("/", "-").replace(" ", "_")
     return f"{safe_vehicle} {safe_size} {error_type} {error_type} {error_type} {error_type} {' '.join(['-' for _ in range(20)])}"
 
-def construct_prompt(vehicle, size, tyre_data_str, brand_enhancer_text, model_enhancer_lower, model_enhancer_text, seasonal_performance, season_enhancer_text, goldilocks_zone_pct, price_fluctuation_upper, price_fluctuation_lower):
+def build_enhancer_texts(brand_enhancer_lower, model_enhancer_lower, seasonal_performance, vehicle, size):
+    """Enhancer rule text for the template. Returns (brand, model, season) texts, "" when inactive."""
+    brand_enhancer_text = ""
+    if brand_enhancer_lower != "anybrand":
+        brand_enhancer_text = (
+            f"- Because the brand {brand_enhancer_lower} is currently on offer, customers are significantly more likely "
+            f"to purchase these products, even if they fall outside the Goldilocks Zone or price fluctuation ranges.\n"
+            f"- You must always include at least one tyre from the brand {brand_enhancer_lower} in the final Tyre Suggestions section, even if it has never sold to a {vehicle}.\n"
+            f"- Select the {brand_enhancer_lower} model that is most similar to the most popular product for {vehicle} in {size} - you are permitted to override all other rules to ensure its inclusion.\n"
+            f"- This is a hard rule: if no {brand_enhancer_lower} tyre appears in the recommendations, your output is invalid."
+        )
+
+    model_enhancer_text = ""
+    if model_enhancer_lower != "anymodel":
+        model_enhancer_text = (
+            f"- Because the model {model_enhancer_lower} is currently being promoted, it must be included in the final Tyre Suggestions.\n"
+            f"- You must select an exact match for {model_enhancer_lower} from the available data. Do NOT use any earlier, later, or similar versions of this model.\n"
+            f"- This is a hard rule: if no {model_enhancer_lower} model appears in the recommendations, your output is invalid.\n"
+            f"- IMPORTANT: When you include a tyre with the {model_enhancer_lower} model, it must always appear as **HB3** in the final output. Place it in the third hotbox position, even if its score is higher than the other tyres."
+        )
+
+    season_enhancer_text = ""
+    _seasonal_val = (seasonal_performance or "").strip().lower()
+    if _seasonal_val in {"summer", "winter", "allseason"}:
+        season_enhancer_text = (
+            f"- The customer has explicitly requested tyres designed for **{_seasonal_val}** use.\n"
+            f"- You must select at least 1 tyre with Seasonal Performance marked as **{_seasonal_val.capitalize()}** within primary recommendations, subject to Slot Eligibility and the Non-Override Guardrails.\n"
+            f"- If a Season enhancer product is chosen and it is Budget, it may only occupy HB4 (and only if BudgetShare permits). Otherwise use the top-scoring non-Budget seasonal tyre.\n"
+            f"- IMPORTANT: Place the selected seasonal tyre in HB4 unless that would violate Budget placement/count; if so, place it in the highest eligible HB slot (HB3 if Budget; HB1/HB2 only if non-Budget).\n"
+            f"- This is a hard rule: if no eligible **{_seasonal_val}** tyre appears in primary recommendations, your output is invalid."
+        )
+    return brand_enhancer_text, model_enhancer_text, season_enhancer_text
+
+def construct_prompt(vehicle, size, tyre_data_str, brand_enhancer_text, model_enhancer_lower, model_enhancer_text, seasonal_performance, season_enhancer_text, goldilocks_zone_pct, price_fluctuation_upper, price_fluctuation_lower,
+                     tyre_columns=None, tyre_data_preamble="", row_aliases=False):
     try:
         template = jinja_env.get_template("recommendation_prompt.j2")
         return template.render(
             vehicle=vehicle,
             size=size,
             tyre_data_str=tyre_data_str,
+            tyre_columns=tyre_columns or "|".join(h for h, _ in TABLE_COLUMNS),
+            tyre_data_preamble=tyre_data_preamble,
+            row_aliases=row_aliases,
             brand_enhancer_text=brand_enhancer_text,
             model_enhancer_text=model_enhancer_text,
             season_enhancer_text=season_enhancer_text,
@@ -30,3 +202,73 @@ def construct_prompt(vehicle, size, tyre_data_str, brand_enhancer_text, model_en
     except Exception as e:
         logger.error(f"❌ Failed to render prompt template: {e}")
         return ""
+
+# Stand-ins for the fitment inside the system instruction, which is shared by every CAM
+SYSTEM_VEHICLE = "<Vehicle>"
+SYSTEM_SIZE = "<Size>"
+
+@functools.lru_cache(maxsize=256)
+def construct_system_instruction(brand_enhancer_lower, model_enhancer_lower, seasonal_performance, goldilocks_zone_pct, price_fluctuation_upper, price_fluctuation_lower, row_aliases=False):
+    """
+    Static rules for GenerateContentConfig.system_instruction.
+    Depends only on batch-level parameters, so every CAM of a batch gets the
+    same text (a cacheable prefix); the fitment is referred to as <Vehicle>/<Size>.
+    """
+    brand_enhancer_text, model_enhancer_text, season_enhancer_text = build_enhancer_texts(
+        brand_enhancer_lower, model_enhancer_lower, seasonal_performance, SYSTEM_VEHICLE, SYSTEM_SIZE
+    )
+    try:
+        template = jinja_env.get_template("system_instruction.j2")
+        return template.render(
+            vehicle=SYSTEM_VEHICLE,
+            size=SYSTEM_SIZE,
+            row_aliases=row_aliases,
+            brand_enhancer_text=brand_enhancer_text,
+            model_enhancer_text=model_enhancer_text,
+            season_enhancer_text=season_enhancer_text,
+            goldilocks_zone_pct=goldilocks_zone_pct,
+            price_fluctuation_upper=price_fluctuation_upper,
+            price_fluctuation_lower=price_fluctuation_lower
+        )
+    except Exception as e:
+        logger.error(f"❌ Failed to render system instruction template: {e}")
+        return ""
+
+def build_catalogue_notes(snippets):
+    """Compact catalogue block for local grounding: one "ProductId: snippet" line per hit."""
+    if not snippets:
+        return ""
+    lines = "\n".join(f"{pid}: {text}" for pid, text in snippets)
+    return f"### Catalogue Notes (reference only; the tyre table above is authoritative)\n{lines}"
+
+def construct_request(vehicle, size, tyre_data_str=None, tyre_columns=None, tyre_data_preamble=""):
+    """
+    Per-CAM user message that goes with construct_system_instruction.
+    Without tyre_data_str it points at the size table held in a context cache.
+    """
+    try:
+        template = jinja_env.get_template("recommendation_request.j2")
+        return template.render(
+            vehicle=vehicle,
+            size=size,
+            tyre_data_str=tyre_data_str,
+            tyre_columns=tyre_columns,
+            tyre_data_preamble=tyre_data_preamble
+        )
+    except Exception as e:
+        logger.error(f"❌ Failed to render request template: {e}")
+        return ""
+
+def construct_size_table(size, tyre_data_str, tyre_columns, tyre_data_preamble=""):
+    """Size table block stored in a context cache next to the system instruction."""
+    try:
+        template = jinja_env.get_template("size_table.j2")
+        return template.render(
+            size=size,
+            tyre_data_str=tyre_data_str,
+            tyre_columns=tyre_columns,
+            tyre_data_preamble=tyre_data_preamble
+        )
+    except Exception as e:
+        logger.error(f"❌ Failed to render size table template: {e}")
+        return ""
@@ -0,0 +1,291 @@
+import statistics
+
+import numpy as np
+
+from aim_waves.core.prefilter import RANK_WEIGHTS
+
+# Slot eligibility brand sets from the prompt (HB1-HB3: Set_A, HB4: Set_B)
+SET_A_BRANDS = frozenset({
+    "avon", "bfgoodrich", "bridgestone", "continental", "cooper", "dunlop", "falken", "firestone",
+    "general", "goodyear", "hankook", "kumho", "lassa", "maxxis", "metzeler", "michelin", "nankang",
+    "nokian", "pirelli", "sumitomo", "toyo", "uniroyal", "vredestein", "yokohama",
+})
+SET_B_BRANDS = SET_A_BRANDS | {"accelera", "dynamo", "tomket", "triangle", "zeetex"}
+
+BUDGET_SHARE_LIMIT = 35.0   # BudShare above this: exactly one Budget tyre, in HB4
+MICHELIN_PREM_SHARE = 25.0  # Michelin rule applies from this PremShare
+RUNFLAT_SHARE_MIN = 20.0    # RFShare from which the top-selling run-flat is required
+ENHANCER_BOOST = 1.0        # score added to enhancer matches ("apply enhancer influence to ranking")
+
+HOTBOXES = 4
+SKUS = 16
+
+
+def _text(rows, col):
+    return np.array([str(r.get(col) or "").strip().upper() for r in rows], dtype=object)
+
+
+def _float(rows, col, default=np.nan):
+    out = np.full(len(rows), default, dtype=float)
+    for i, r in enumerate(rows):
+        try:
+            out[i] = float(r.get(col))
+        except (TypeError, ValueError):
+            pass
+    return out
+
+
+def fitment_share(rows, col, default=0.0):
+    """
+    Fitment-level share (constant per fitment; median across vehicles on generic tables).
+    Shared with the validator so both apply the BudgetShare rule to the same value.
+    """
+    values = []
+    for r in rows or []:
+        try:
+            values.append(float(r.get(col)))
+        except (TypeError, ValueError):
+            pass
+    return statistics.median(values) if values else default
+
+
+def _tier(tyre_score):
+    """1..4 from "1.BEST TYRE SCORE" etc., 9 when missing."""
+    return np.array([int(t[0]) if t[:1].isdigit() else 9 for t in tyre_score], dtype=float)
+
+
+def _score(rows, tier, units, goldilocks_zone_pct, price_fluctuation_upper, price_fluctuation_lower):
+    """NumPy twin of prefilter._score (same RANK_WEIGHTS) on per-column arrays."""
+    n = len(rows)
+    tyre_score = np.clip((5 - tier) / 4, 0, 1)
+    # Percentile rank with ties at the max, as Series.rank(pct=True, method="max")
+    popularity = np.searchsorted(np.sort(units), units, side="right") / n if n > 1 else np.ones(n)
+
+    price, zone = _float(rows, "PRICE"), _float(rows, "GoldilocksZone")
+    goldilocks = (np.abs(price - zone) <= zone * goldilocks_zone_pct / 100).astype(float)
+
+    fluct = np.nan_to_num(_float(rows, "PRICEFLUCTUATION"), nan=1.0)
+    price_fluct = np.select([fluct > price_fluctuation_upper, fluct < price_fluctuation_lower], [-1.0, 1.0], 0.0)
+
+    offer = (_text(rows, "OFFER") == "ONOFFER").astype(float)
+
+    grade = _text(rows, "GRADE")
+    grade_share = np.select(
+        [grade == "PREMIUM", grade == "MIDRANGE", grade == "BUDGET"],
+        [_float(rows, "PremiumShare"), _float(rows, "MidRangeShare"), _float(rows, "BudgetShare")],
+        np.nan,
+    )
+    grade_share = np.nan_to_num(grade_share / 100, nan=0.0)
+
+    rf_share = np.nan_to_num(_float(rows, "RunflatShare"), nan=0.0) / 100
+    runflat_share = np.where(_text(rows, "RunflatStatus") == "RUNFLAT", rf_share, 1 - rf_share)
+
+    w = RANK_WEIGHTS
+    return (
+        w["tyre_score"] * tyre_score
+        + w["popularity"] * popularity
+        + w["goldilocks"] * goldilocks
+        + w["price_fluct"] * price_fluct
+        + w["offer"] * offer
+        + w["grade_share"] * grade_share
+        + w["runflat_share"] * runflat_share
+    )
+
+
+def _first(mask, exclude=()):
+    for i in np.flatnonzero(mask):
+        if i not in exclude:
+            return int(i)
+    return None
+
+
+def rank_locally(feedback_data, goldilocks_zone_pct=15, price_fluctuation_upper=1.1,
+                 price_fluctuation_lower=0.9, brand_enhancer_lower="anybrand",
+                 model_enhancer_lower="anymodel", seasonal_performance=None, keep_top_popular=5):
+    """
+    Deterministic, zero-LLM implementation of the prompt's hard rules.
+
+    Rows are ranked with the pre-filter's soft-rule weights (plus an enhancer
+    boost), then the Primary Filling Algorithm is applied on NumPy masks:
+    HB1-HB3 from Pool_A (Set_A brands, Premium/MidRange), HB4 from Pool_B with
+    the BudgetShare rule (0 Budget, or exactly 1 Budget in HB4 when BudShare >
+    35%), the enhanced model in HB3 and the enhanced brand/season in HB4 (as the
+    prompt and the validator require), the most popular tyre, the top-selling
+    run-flat when RFShare requires it and the Michelin rule. SKU5-SKU20 take the
+    displaced must-includes and the top keep_top_popular sellers first, then a
+    Premium/MidRange/Budget mix following the fitment's grade shares.
+
+    Works on plain arrays (no DataFrame) so a CAM takes well under a millisecond.
+    Returns (hotboxes, skus): 4 and 16 ProductId strings, padded with "-".
+    """
+    # Fitment shares over the whole table, as the validator reads them
+    bud_share = fitment_share(feedback_data, "BudgetShare")
+    prem_share = fitment_share(feedback_data, "PremiumShare")
+    mid_share = fitment_share(feedback_data, "MidRangeShare")
+    rf_share = fitment_share(feedback_data, "RunflatShare")
+
+    rows = [r for r in feedback_data if str(r.get("ProductId", "")).strip().isdigit()
+            and len(str(r.get("ProductId")).strip()) in (7, 8)]
+    active = [r for r in rows if str(r.get("SalesStatus") or "").strip().upper() == "ACTIVE"]
+    rows = active or rows
+    if not rows:
+        return ["-"] * HOTBOXES, ["-"] * SKUS
+
+    tier = _tier(_text(rows, "TyreScore"))
+    units = np.nan_to_num(_float(rows, "Units"), nan=0.0)
+    brands = np.array([str(r.get("BRAND") or "").strip().lower() for r in rows], dtype=object)
+    season = (seasonal_performance or "").strip().lower()
+    enh = np.zeros(len(rows), dtype=bool)
+    model_enh = np.zeros(len(rows), dtype=bool)
+    if brand_enhancer_lower and brand_enhancer_lower != "anybrand":
+        enh |= brands == brand_enhancer_lower
+    if model_enhancer_lower and model_enhancer_lower != "anymodel":
+        model_enh = np.array([str(r.get("Model") or "").strip().lower() == model_enhancer_lower for r in rows])
+    if season in {"summer", "winter", "allseason"}:
+        enh |= np.array([str(r.get("SEASONAL_PERFORMANCE") or "").strip().lower() == season for r in rows])
+    enhancer_active = (brand_enhancer_lower not in ("", "anybrand") or model_enhancer_lower not in ("", "anymodel")
+                       or season in {"summer", "winter", "allseason"})
+
+    rank = _score(rows, tier, units, goldilocks_zone_pct, price_fluctuation_upper, price_fluctuation_lower)
+    rank = rank + ENHANCER_BOOST * (enh | model_enh)
+
+    # Rank order (stable on input order), then keep each ProductId's best row
+    order = np.lexsort((np.arange(len(rows)), -rank))
+    seen, keep = set(), []
+    for i in order:
+        pid = str(rows[i]["ProductId"]).strip()
+        if pid not in seen:
+            seen.add(pid)
+            keep.append(i)
+    keep = np.array(keep)
+    rows = [rows[i] for i in keep]
+    pids = np.array([str(r["ProductId"]).strip() for r in rows], dtype=object)
+    tier, units, brands, enh, model_enh = tier[keep], units[keep], brands[keep], enh[keep], model_enh[keep]
+    grade = _text(rows, "GRADE")
+    grade[grade == "MID-RANGE"] = "MIDRANGE"
+    runflat = _text(rows, "RunflatStatus") == "RUNFLAT"
+
+    budget = grade == "BUDGET"
+    non_budget = (grade == "PREMIUM") | (grade == "MIDRANGE")
+    pool_a = np.array([b in SET_A_BRANDS for b in brands], dtype=bool) & non_budget
+    pool_b = np.array([b in SET_B_BRANDS for b in brands], dtype=bool) & (non_budget | budget)
+
+    budget_in_hb4 = bud_share > BUDGET_SHARE_LIMIT
+
+    # Best sellers: Units desc, tie-break by best TyreScore, then rank
+    by_units = np.lexsort((np.arange(len(pids)), tier, -units))
+
+    # RFShare ~0: keep run-flats out of HB1-HB3 while non-run-flats are available
+    pool_hb = pool_a
+    if rf_share < RUNFLAT_SHARE_MIN / 2 and (pool_a & ~runflat).sum() >= 3:
+        pool_hb = pool_a & ~runflat
+
+    # 3) HB1-HB3 from Pool_A in rank order
+    top3 = [int(i) for i in np.flatnonzero(pool_hb)[:3]]
+
+    # 4-5) HB4: enhanced brand/season product, else Pool_B under the BudgetShare rule
+    # (the enhanced model goes to HB3 below)
+    budget_filter = budget if budget_in_hb4 else ~budget
+    hb4_enhanced = None
+    if enhancer_active:
+        hb4_enhanced = _first(enh & pool_b & budget_filter, exclude=top3)
+    hb4 = hb4_enhanced
+    if hb4 is None:
+        hb4 = _first(pool_b & budget_filter, exclude=top3)
+    if hb4 is None:
+        hb4 = _first(pool_b & ~budget, exclude=top3)
+
+    must_sku = []
+
+    # 6) Most popular tyre
+    most_popular = int(by_units[0])
+    if most_popular not in top3 and most_popular != hb4:
+        if pool_a[most_popular]:
+            if len(top3) == 3:
+                top3[2] = most_popular  # replaces the lowest-ranked of HB1-HB3
+            else:
+                top3.append(most_popular)
+        elif budget[most_popular] and budget_in_hb4 and hb4_enhanced is None and pool_b[most_popular]:
+            hb4 = most_popular
+        else:
+            must_sku.append(most_popular)
+
+    # 7) Run-flat mix: the top-selling run-flat when RFShare requires one
+    if rf_share >= RUNFLAT_SHARE_MIN:
+        runflats = by_units[runflat[by_units]]
+        placed = top3 + ([hb4] if hb4 is not None else [])
+        if len(runflats) and not runflat[placed].any():
+            top_rf = int(runflats[0])
+            swappable = [j for j in range(len(top3)) if top3[j] != most_popular]
+            if pool_a[top_rf] and swappable:
+                top3[max(swappable, key=lambda j: top3[j])] = top_rf
+            else:
+                must_sku.append(top_rf)
+
+    # HB1-HB3 in descending rank order (HB4 may be the locked enhanced product,
+    # HB3 is set to the enhanced model below)
+    top3 = sorted(set(top3))
+    hb = top3 + ([hb4] if hb4 is not None and hb4 not in top3 else [])
+
+    # Michelin rule: PremShare >= 25% and Michelin among the top sellers
+    if prem_share >= MICHELIN_PREM_SHARE:
+        top_sellers = by_units[:max(1, keep_top_popular)]
+        michelin = top_sellers[brands[top_sellers] == "michelin"]
+        if len(michelin) and not (brands[hb] == "michelin").any():
+            must_sku.append(int(michelin[0]))
+
+    # Limited range: fill the hotboxes from any remaining eligible row (Budget last)
+    for i in np.concatenate([np.flatnonzero(pool_b & ~budget), np.flatnonzero(pool_b & budget)]):
+        if len(hb) >= HOTBOXES:
+            break
+        # Budget only ever lands in HB4, and at most once
+        if int(i) not in hb and not (budget[i] and (len(hb) < 3 or budget[hb].any())):
+            hb.append(int(i))
+
+    # Model enhancer: the best HB1-HB3 eligible match always sits in HB3
+    model_hb3 = _first(model_enh & pool_a)
+    if model_hb3 is not None and len(hb) >= 3 and hb[2] != model_hb3:
+        if model_hb3 in hb:
+            j = hb.index(model_hb3)
+            hb[2], hb[j] = hb[j], hb[2]
+        else:
+            must_sku.insert(0, hb[2])
+            hb[2] = model_hb3
+
+    # SKU5-SKU20: must-includes first, then the rest in rank order
+    used = set(hb)
+    pinned, ranked = [], []
+
+    def take(i, into):
+        i = int(i)
+        if i not in used and len(pinned) + len(ranked) < SKUS:
+            into.append(i)
+            used.add(i)
+
+    if enhancer_active and hb4_enhanced is None:
+        best_enh = _first(enh | model_enh, exclude=used)
+        if best_enh is not None:
+            take(best_enh, pinned)
+    for i in must_sku:
+        take(i, pinned)
+    for i in by_units[:max(1, keep_top_popular)]:
+        take(i, ranked)
+
+    # Grade mix aligned with the fitment's shares, each grade in rank order
+    shares = {"PREMIUM": prem_share, "MIDRANGE": mid_share, "BUDGET": bud_share}
+    total_share = sum(shares.values()) or 1.0
+    for g, share in shares.items():
+        quota = int(round(SKUS * share / total_share)) - sum(1 for i in pinned + ranked if grade[i] == g)
+        for i in np.flatnonzero(grade == g):
+            if quota <= 0:
+                break
+            if int(i) not in used:
+                take(i, ranked)
+                quota -= 1
+    for i in range(len(pids)):
+        take(i, ranked)
+    skus = pinned + sorted(ranked)
+
+    hotboxes = [str(pids[i]) for i in hb] + ["-"] * (HOTBOXES - len(hb))
+    sku_ids = [str(pids[i]) for i in skus] + ["-"] * (SKUS - len(skus))
+    return hotboxes, sku_ids
@@ -0,0 +1,136 @@
+import collections
+import concurrent.futures
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Priority hints accepted in batch payloads, mapped to fair-share weights
+PRIORITY_WEIGHTS = {
+    "low": 0.25,
+    "normal": 1.0,
+    "high": 4.0,
+}
+
+
+def priority_weight(priority):
+    """Maps a priority hint ("low"/"normal"/"high" or a positive number) to a weight."""
+    if priority is None or priority == "":
+        return PRIORITY_WEIGHTS["normal"]
+    if isinstance(priority, str) and priority.strip().lower() in PRIORITY_WEIGHTS:
+        return PRIORITY_WEIGHTS[priority.strip().lower()]
+    try:
+        weight = float(priority)
+    except (TypeError, ValueError):
+        logger.warning(f"⚠️ Unknown priority hint {priority!r}, using normal.")
+        return PRIORITY_WEIGHTS["normal"]
+    return min(max(weight, 0.01), 100.0)
+
+
+class FairScheduler:
+    """
+    Engine-wide worker pool shared by every request.
+    Work is queued per run_id and dispatched by weighted fair queuing
+    (stride scheduling): each run advances a virtual clock by 1/weight per
+    task, and the run with the lowest clock goes next. A large run therefore
+    cannot starve a small or higher-priority one.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._cond = threading.Condition()
+        self._queues = collections.OrderedDict()  # run_id -> deque[(future, fn, args)]
+        self._weights = {}
+        self._pass = {}      # run_id -> virtual time of its next task
+        self._running = collections.Counter()
+        self._vclock = 0.0   # virtual time of the last dispatched task
+        self._threads = []
+
+    def _ensure_workers(self):
+        while len(self._threads) < self.max_workers:
+            t = threading.Thread(target=self._worker, name=f"aim-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def submit(self, run_id, fn, *args, priority=None):
+        """Queues fn(*args) under run_id. Returns a concurrent.futures.Future."""
+        future = concurrent.futures.Future()
+        with self._cond:
+            self._ensure_workers()
+            queue = self._queues.get(run_id)
+            if queue is None:
+                queue = self._queues[run_id] = collections.deque()
+                # A newly active run starts at the current virtual time, so it
+                # neither jumps ahead of nor waits behind existing backlogs.
+                self._pass[run_id] = max(self._pass.get(run_id, 0.0), self._vclock)
+            if priority is not None or run_id not in self._weights:
+                self._weights[run_id] = priority_weight(priority)
+            queue.append((future, fn, args))
+            self._cond.notify()
+        return future
+
+    def _next_task(self):
+        """Pops the next task by lowest virtual time. Caller holds the lock."""
+        while self._queues:
+            run_id = min(self._queues, key=lambda r: self._pass[r])
+            queue = self._queues[run_id]
+            future, fn, args = queue.popleft()
+            if not queue:
+                del self._queues[run_id]
+            if not future.set_running_or_notify_cancel():
+                # Cancelled while queued (e.g. batch deadline or the consumer went away)
+                self._forget_if_idle(run_id)
+                continue
+            self._vclock = self._pass[run_id]
+            self._pass[run_id] += 1.0 / self._weights[run_id]
+            self._running[run_id] += 1
+            return run_id, future, fn, args
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    self._cond.wait()
+                    task = self._next_task()
+            run_id, future, fn, args = task
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running[run_id] -= 1
+                    if self._running[run_id] <= 0:
+                        del self._running[run_id]
+                    self._forget_if_idle(run_id)
+
+    def _forget_if_idle(self, run_id):
+        """Drops a run's weight and virtual time once nothing is queued or running. Caller holds the lock."""
+        if run_id not in self._queues and run_id not in self._running:
+            self._weights.pop(run_id, None)
+            self._pass.pop(run_id, None)
+
+    def snapshot(self):
+        """Per-run_id view of queued and running tasks."""
+        with self._cond:
+            run_ids = list(dict.fromkeys(list(self._queues) + list(self._running)))
+            runs = {}
+            for run_id in run_ids:
+                queued = sum(1 for f, _, _ in self._queues.get(run_id, ()) if not f.cancelled())
+                running = self._running.get(run_id, 0)
+                # Runs whose queued work was all cancelled are not reported
+                if queued or running:
+                    runs[run_id] = {
+                        "queued": queued,
+                        "running": running,
+                        "weight": self._weights.get(run_id, PRIORITY_WEIGHTS["normal"]),
+                    }
+            return {"workers": self.max_workers, "runs": runs}
+
+
+# API Limit / Concurrency Control: one pool for the whole engine process.
+# Default to 10 to be safe with Flash-Lite quotas, was 25
+scheduler = FairScheduler(int(os.environ.get("AIM_MAX_WORKERS", "10")))
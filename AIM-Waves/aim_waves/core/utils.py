@@ -84,3 +84,49 @@ def parse_recommendation_output(raw_text):
 
     logger.error(f"❌ Failed to parse output: {raw_text}")
     return "ERROR_VEHICLE", "ERROR_SIZE", "FormatError", "FormatError", "FormatError", "FormatError", ["FormatError"] * 20
+
+ROW_ALIAS_RE = re.compile(r"[rR](\d+)")
+
+def _vehicle_size_prefix_len(tokens, target):
+    """Number of leading tokens whose normalized text spells target, or None."""
+    acc = ""
+    for i, t in enumerate(tokens):
+        acc += normalize_string_for_comparison(t)
+        if acc == target:
+            return i + 1
+        if not target.startswith(acc):
+            return None
+    return None
+
+def resolve_row_aliases(raw_text, product_ids, vehicle, size):
+    """
+    Maps row aliases (r1..rN, see prompts.build_tyre_table) in the model output
+    back to Product IDs by row index. Only tokens after the echoed
+    <Vehicle> <Size> prefix are mapped, so size tokens like R16 are left alone.
+    Aliases outside the table become "-" and are counted as misses.
+    Returns (text, misses).
+    """
+    if not raw_text:
+        return raw_text, 0
+
+    target = normalize_string_for_comparison(vehicle) + normalize_string_for_comparison(size)
+    misses = 0
+    lines = []
+    for line in raw_text.splitlines():
+        tokens = line.strip().split()
+        start = _vehicle_size_prefix_len(tokens, target)
+        if start is None:
+            lines.append(line)
+            continue
+        for j in range(start, len(tokens)):
+            m = ROW_ALIAS_RE.fullmatch(tokens[j].strip("`*,.;:"))
+            if not m:
+                continue
+            idx = int(m.group(1)) - 1
+            if 0 <= idx < len(product_ids):
+                tokens[j] = str(product_ids[idx])
+            else:
+                tokens[j] = "-"
+                misses += 1
+        lines.append(" ".join(tokens))
+    return "\n".join(lines), misses
@@ -0,0 +1,251 @@
+import threading
+
+from aim_waves.core.ranker import BUDGET_SHARE_LIMIT, HOTBOXES, SET_A_BRANDS, SET_B_BRANDS, SKUS, fitment_share
+
+SEASONS = {"summer", "winter", "allseason"}
+
+
+def _is_pid(value):
+    value = str(value).strip()
+    return value.isdigit() and len(value) in (7, 8)
+
+
+def _rows_by_pid(feedback_data):
+    rows = {}
+    for r in feedback_data or []:
+        rows.setdefault(str(r.get("ProductId", "")).strip(), r)
+    return rows
+
+
+def _enhancer(value, any_value):
+    value = (value or "").strip().lower()
+    return value if value and value != any_value else None
+
+
+def _season(value):
+    value = (value or "").strip().lower()
+    return value if value in SEASONS else None
+
+
+class _Table:
+    """A fitment's table keyed by ProductId, in table (relevance) order, with slot eligibility."""
+
+    def __init__(self, feedback_data):
+        self.rows = _rows_by_pid(feedback_data)
+        self.order = [p for p in self.rows if _is_pid(p)]
+        share = fitment_share(feedback_data, "BudgetShare", default=None)
+        self.budget_allowed = share is None or share >= BUDGET_SHARE_LIMIT
+        self.budget_in_hb4 = share is not None and share > BUDGET_SHARE_LIMIT
+
+    def text(self, pid, col):
+        return str((self.rows.get(pid) or {}).get(col) or "").strip().lower()
+
+    def is_budget(self, pid):
+        return self.text(pid, "GRADE") == "budget"
+
+    def hb1_3_ok(self, pid):
+        brand = self.text(pid, "BRAND")
+        return pid in self.rows and not self.is_budget(pid) and (not brand or brand in SET_A_BRANDS)
+
+    def hb4_ok(self, pid):
+        brand = self.text(pid, "BRAND")
+        return (pid in self.rows and (not brand or brand in SET_B_BRANDS)
+                and (self.budget_allowed or not self.is_budget(pid)))
+
+    def matches(self, col, value):
+        return [p for p in self.order if self.text(p, col) == value]
+
+
+def _violations(hotboxes, skus, table, brand_enhancer, model_enhancer, season):
+    violations = []
+    if not all(_is_pid(h) for h in hotboxes):
+        violations.append("parse")
+    valid = [h for h in hotboxes if _is_pid(h)]
+    if len(set(valid)) < len(valid):
+        violations.append("hb_duplicate")
+    if not table.rows:
+        return violations
+    if any(h not in table.rows for h in valid):
+        violations.append("not_in_table")
+
+    grades = [table.text(h, "GRADE") for h in hotboxes]
+    brands = [table.text(h, "BRAND") for h in hotboxes]
+    if "budget" in grades[:3]:
+        violations.append("budget_hb1_3")
+    if grades.count("budget") > 1:
+        violations.append("budget_count")
+    if "budget" in grades and not table.budget_allowed:
+        violations.append("budget_share")
+    if any(b and b not in SET_A_BRANDS for b in brands[:3]) or (brands[3:] and brands[3] and brands[3] not in SET_B_BRANDS):
+        violations.append("brand_set")
+
+    answer = set(hotboxes) | set(skus or [])
+    if brand_enhancer:
+        matches = table.matches("BRAND", brand_enhancer)
+        if matches and not answer & set(matches):
+            violations.append("brand_enhancer")
+    if model_enhancer:
+        matches = table.matches("Model", model_enhancer)
+        hb3 = hotboxes[2] if len(hotboxes) > 2 else None
+        if (any(table.hb1_3_ok(p) for p in matches) and hb3 not in matches) or (matches and not answer & set(matches)):
+            violations.append("model_enhancer")
+    if season:
+        eligible = [p for p in table.matches("SEASONAL_PERFORMANCE", season) if table.hb1_3_ok(p) or table.hb4_ok(p)]
+        if eligible and not any(table.text(h, "SEASONAL_PERFORMANCE") == season for h in hotboxes):
+            violations.append("season")
+    return violations
+
+
+def validate_answer(hotboxes, feedback_data, skus=None, brand_enhancer=None, model_enhancer=None,
+                    seasonal_performance=None):
+    """
+    Hard-rule violations of a parsed answer against its fitment's table (empty list = valid).
+
+    parse           : a hotbox is not a 7/8 digit ProductId
+    hb_duplicate    : the same ProductId twice in HB1-HB4
+    not_in_table    : a hotbox is not a row of the fitment's table
+    budget_hb1_3    : Budget tyre in HB1-HB3
+    budget_count    : more than one Budget tyre in HB1-HB4
+    budget_share    : Budget tyre in the hotboxes while BudShare < 35%
+    brand_set       : HB1-HB3 brand outside Set_A, or HB4 brand outside Set_B
+    brand_enhancer  : no tyre of the enhanced brand in the answer although the table has one
+    model_enhancer  : HB3 is not the enhanced model although an HB3-eligible one exists
+                      (or the model is missing from the answer altogether)
+    season          : no tyre of the requested season in HB1-HB4 although an eligible one exists
+    """
+    hotboxes = [str(h).strip() for h in hotboxes]
+    skus = [str(s).strip() for s in skus or []]
+    return _violations(
+        hotboxes, skus, _Table(feedback_data),
+        _enhancer(brand_enhancer, "anybrand"), _enhancer(model_enhancer, "anymodel"),
+        _season(seasonal_performance),
+    )
+
+
+def repair_answer(hotboxes, skus, feedback_data, brand_enhancer=None, model_enhancer=None,
+                  seasonal_performance=None):
+    """
+    Fixes an answer's violations locally instead of asking the model again, following
+    the prompt's post-selection validator: ineligible, duplicate or unknown hotboxes
+    are demoted to the front of the SKUs and their slot takes the best eligible row
+    (table order), the enhanced model is moved into HB3, a seasonal tyre into HB4
+    (HB3/HB2 when only HB1-HB3 eligible ones exist) and missing enhancer matches go
+    to SKU5.
+
+    Returns (hotboxes, skus, violations, remaining): the violations of the answer as
+    given, and those left after repair. Re-prompt only when remaining is non-empty
+    (e.g. the table has no eligible row for a slot). An answer without a single
+    parseable hotbox is not repaired: that is a model failure, not a rule slip.
+    """
+    table = _Table(feedback_data)
+    brand_enhancer = _enhancer(brand_enhancer, "anybrand")
+    model_enhancer = _enhancer(model_enhancer, "anymodel")
+    season = _season(seasonal_performance)
+
+    hotboxes = ([str(h).strip() for h in hotboxes] + ["-"] * HOTBOXES)[:HOTBOXES]
+    skus = [str(s).strip() for s in skus or []]
+    violations = _violations(hotboxes, skus, table, brand_enhancer, model_enhancer, season)
+    if not violations or not table.order or not any(_is_pid(h) for h in hotboxes):
+        return hotboxes, skus, violations, violations
+
+    hb = list(hotboxes)
+    demoted = []
+
+    # Slot eligibility: free every slot holding an unparseable, duplicate, unknown or ineligible id
+    seen = set()
+    for i, h in enumerate(hb):
+        if h in seen or not (table.hb1_3_ok(h) if i < 3 else table.hb4_ok(h)):
+            if h in table.rows and h not in seen:
+                demoted.append(h)
+            hb[i] = None
+        else:
+            seen.add(h)
+
+    def place(i, pid):
+        if pid in hb:
+            j = hb.index(pid)
+            hb[i], hb[j] = pid, hb[i]
+        else:
+            if hb[i]:
+                demoted.append(hb[i])
+            hb[i] = pid
+
+    # Model enhancer: the enhanced model always sits in HB3
+    hb3_locked = False
+    if model_enhancer:
+        matches = [p for p in table.matches("Model", model_enhancer) if table.hb1_3_ok(p)]
+        if matches:
+            hb3_locked = True
+            if hb[2] not in matches:
+                place(2, next((h for h in hb if h in matches), matches[0]))
+
+    # Season enhancer: one tyre of the season in HB4, else in the highest free HB1-HB3 slot
+    if season and not any(h and table.text(h, "SEASONAL_PERFORMANCE") == season for h in hb):
+        seasonal = [p for p in table.matches("SEASONAL_PERFORMANCE", season) if p not in hb]
+        for_hb4 = [p for p in seasonal if table.hb4_ok(p)]
+        for_hb1_3 = [p for p in seasonal if table.hb1_3_ok(p)]
+        if for_hb4:
+            place(3, for_hb4[0])
+        elif for_hb1_3:
+            place(1 if hb3_locked else 2, for_hb1_3[0])
+
+    # Fill the freed slots with the best eligible rows (HB4 prefers Budget when BudShare > 35%)
+    for i in range(HOTBOXES):
+        if hb[i] is None:
+            candidates = [p for p in table.order if p not in hb and (table.hb1_3_ok(p) if i < 3 else table.hb4_ok(p))]
+            if i == 3 and table.budget_in_hb4:
+                candidates.sort(key=lambda p: not table.is_budget(p))
+            hb[i] = candidates[0] if candidates else "-"
+
+    # SKUs: missing enhancer matches first (SKU5), then demoted hotboxes, then the model's SKUs
+    pinned = []
+    answer = set(hb) | set(skus)
+    for col, value in (("BRAND", brand_enhancer), ("Model", model_enhancer)):
+        matches = table.matches(col, value) if value else []
+        if matches and not answer & set(matches):
+            pinned.append(matches[0])
+    new_skus, used = [], set(hb)
+    for s in pinned + demoted + skus:
+        if s not in used or not _is_pid(s):
+            new_skus.append(s)
+            used.add(s)
+    new_skus = new_skus[:max(len(skus), SKUS)]
+
+    remaining = _violations(hb, new_skus, table, brand_enhancer, model_enhancer, season)
+    return hb, new_skus, violations, remaining
+
+
+class ValidationStats:
+    """Violations found, repaired locally and left to a re-prompt over a batch's results."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.repaired = 0
+        self.reprompted = 0
+        self.violations = {}
+
+    def add(self, result):
+        report = result.get("validation")
+        if not report:
+            return
+        with self._lock:
+            self.checked += 1
+            if report.get("repaired"):
+                self.repaired += 1
+            if report.get("reprompted"):
+                self.reprompted += 1
+            for v in report.get("violations") or []:
+                self.violations[v] = self.violations.get(v, 0) + 1
+
+    def __bool__(self):
+        return bool(self.checked)
+
+    def report(self):
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "repaired": self.repaired,
+                "reprompted": self.reprompted,
+                "violations": dict(self.violations),
+            }
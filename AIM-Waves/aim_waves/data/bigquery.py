@@ -1,11 +1,12 @@
 from __future__ import annotations
 
+import concurrent.futures
 import hashlib
 import json
 import logging
 import os
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import pandas as pd
 from google.cloud import bigquery
@@ -18,6 +19,11 @@ logger = logging.getLogger(__name__)
 BQ_TABLE = "bqsqltesting.nexus_tyrescore.TyreScore_algorithm_output"
 BQ_LIMIT = 100
 
+# Pipelined prefetch: sizes per BigQuery query and concurrent queries in flight.
+# A group size of 0 disables splitting (one query for every size in the batch).
+PREFETCH_GROUP_SIZE = int(os.environ.get("AIM_PREFETCH_GROUP_SIZE", "8"))
+PREFETCH_WORKERS = int(os.environ.get("AIM_PREFETCH_WORKERS", "4"))
+
 CSV_CANDIDATES = (
     "benchmark_final_balanced.csv",
     "aim_waves/benchmark_final_balanced.csv",
@@ -281,3 +287,39 @@ def fetch_feedback_batch(sizes: List[str]) -> Dict[str, List[Dict[str, Any]]]:
     except Exception as e:
         logger.error(f"❌ Bulk BulkQuery Error: {e}")
         return {}
+
+
+def iter_feedback_batches(
+    sizes: List[str],
+    group_size: Optional[int] = None,
+    max_workers: Optional[int] = None,
+) -> Iterator[Tuple[List[str], Dict[str, List[Dict[str, Any]]]]]:
+    """
+    Pipelined variant of fetch_feedback_batch.
+    Splits the sizes into groups, queries the groups concurrently and yields
+    (normalised_sizes, results_map) for each group as soon as its rows land.
+    A failed group yields an empty map so callers can fall back per CAM.
+    """
+    group_size = PREFETCH_GROUP_SIZE if group_size is None else group_size
+    max_workers = PREFETCH_WORKERS if max_workers is None else max_workers
+
+    # Keep first-seen order so the sizes of the earliest CAMs are queried first.
+    unique_norms = list(dict.fromkeys(n for n in (_normalise_size(s) for s in sizes) if n))
+    if not unique_norms:
+        return
+
+    if group_size <= 0 or group_size >= len(unique_norms):
+        groups = [unique_norms]
+    else:
+        groups = [unique_norms[i:i + group_size] for i in range(0, len(unique_norms), group_size)]
+
+    workers = max(1, min(max_workers, len(groups)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        future_to_group = {executor.submit(fetch_feedback_batch, g): g for g in groups}
+        for future in concurrent.futures.as_completed(future_to_group):
+            group = future_to_group[future]
+            try:
+                yield group, future.result()
+            except Exception as e:
+                logger.error(f"❌ Prefetch group failed ({len(group)} sizes): {e}")
+                yield group, {}
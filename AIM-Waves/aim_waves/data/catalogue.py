@@ -0,0 +1,131 @@
+import functools
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from aim_waves.config import Config
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+BM25_K1 = 1.2
+BM25_B = 0.75
+QUERY_ROWS = 20  # table rows whose brand/model go into the query
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+class CatalogueIndex:
+    """
+    In-memory BM25 index over catalogue documents ({"id": ProductId, "text": ...}),
+    the local stand-in for the bc_catalogue Vertex AI Search datastore.
+    Postings are NumPy arrays, so a query is a handful of vectorized adds.
+    """
+
+    def __init__(self, documents):
+        self.ids = [str(d.get("id", "")).strip() for d in documents]
+        self.texts = [" ".join(str(d.get("text") or "").split()) for d in documents]
+        self.by_id = {}
+        for i, pid in enumerate(self.ids):
+            self.by_id.setdefault(pid, i)
+
+        postings = defaultdict(lambda: ([], []))
+        lengths = np.zeros(len(self.texts))
+        for i, text in enumerate(self.texts):
+            tf = Counter(tokenize(text))
+            lengths[i] = sum(tf.values())
+            for token, n in tf.items():
+                postings[token][0].append(i)
+                postings[token][1].append(n)
+
+        n_docs = len(self.texts)
+        self._postings = {t: (np.array(d), np.array(f, dtype=float)) for t, (d, f) in postings.items()}
+        self._idf = {t: math.log(1 + (n_docs - len(d) + 0.5) / (len(d) + 0.5)) for t, (d, _) in postings.items()}
+        avg_length = lengths.mean() if n_docs else 1.0
+        self._norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (avg_length or 1.0))
+
+    @classmethod
+    def load(cls, path):
+        documents = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    documents.append(json.loads(line))
+        return cls(documents)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k=5, restrict=None):
+        """Top k (id, text, score) for a query; restrict limits hits to those ProductIds."""
+        scores = np.zeros(len(self.ids))
+        for token in set(tokenize(query)):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            docs, tf = posting
+            scores[docs] += self._idf[token] * tf * (BM25_K1 + 1) / (tf + self._norm[docs])
+        if restrict is not None:
+            mask = np.zeros(len(self.ids), dtype=bool)
+            mask[[self.by_id[p] for p in restrict if p in self.by_id]] = True
+            scores[~mask] = 0.0
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(self.ids[i], self.texts[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    @functools.lru_cache(maxsize=4096)
+    def snippets(self, size, pids, brands, models, k=5, max_chars=240):
+        """
+        Grounding snippets for a fitment: BM25 on the size and the table's brands and
+        models, restricted to the table's ProductIds when the catalogue has any of them.
+        Arguments are tuples so results are cached across CAMs sharing a size table.
+        """
+        query = " ".join((size, size.replace("/", "").replace(" ", "")) + brands + models)
+        restrict = [p for p in pids if p in self.by_id] or None
+        return tuple((pid, text[:max_chars]) for pid, text, _ in self.search(query, k, restrict))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_catalogue_index(path=None):
+    """The process-wide catalogue index (loaded on first use), or None when no index file exists."""
+    global _index
+    path = path or Config.CATALOGUE_INDEX_PATH
+    with _index_lock:
+        if _index is None or _index[0] != path:
+            index = None
+            if os.path.exists(path):
+                try:
+                    index = CatalogueIndex.load(path)
+                    logger.info(f"📚 Loaded catalogue index: {len(index):,} documents from {path}")
+                except Exception as e:
+                    logger.error(f"❌ Failed to load catalogue index {path}: {e}")
+            else:
+                logger.warning(f"⚠️ Catalogue index not found at {path}. Local grounding disabled.")
+            _index = (path, index)
+        return _index[1]
+
+
+def grounding_snippets(size, rows, k=5, max_chars=240, path=None):
+    """Catalogue snippets [(ProductId, text)] for a CAM's table rows, [] without an index."""
+    index = get_catalogue_index(path)
+    if index is None:
+        return []
+    pids = tuple(str(r.get("ProductId", "")).strip() for r in rows)
+    brands, models = [], []
+    for r in rows[:QUERY_ROWS]:
+        brand, model = str(r.get("BRAND") or "").strip(), str(r.get("Model") or "").strip()
+        if brand and brand not in brands:
+            brands.append(brand)
+        if model and model not in models:
+            models.append(model)
+    return list(index.snippets(str(size), pids, tuple(brands), tuple(models), k, max_chars))
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from aim_waves.config import Config
+
+logger = logging.getLogger(__name__)
+
+# CAM states inside a job
+CAM_PENDING = "pending"
+CAM_DONE = "done"
+CAM_FAILED = "failed"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobStore(ABC):
+    """
+    Persistence for asynchronous batch jobs.
+    Every CAM keeps its own state and result, so a job can be polled by cursor
+    and resumed without redoing finished CAMs.
+    """
+
+    @abstractmethod
+    def create_job(self, run_id: str, cams: List[dict], params: dict) -> str:
+        """Stores the job and all of its CAMs as pending. Returns the job id."""
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job record with per-state CAM counts and summed usage, or None."""
+
+    @abstractmethod
+    def set_job_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        pass
+
+    @abstractmethod
+    def pending_cams(self, job_id: str) -> List[Tuple[int, dict]]:
+        """(index, cam) for every CAM that still has to run, in input order."""
+
+    @abstractmethod
+    def save_result(self, job_id: str, index: int, result: dict) -> None:
+        """Records a CAM result and marks it done/failed from result['success']."""
+
+    @abstractmethod
+    def get_results(self, job_id: str, cursor: int = 0, limit: int = 500) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Results recorded after `cursor`, in completion order.
+        Returns ([{"index", "result"}], next_cursor).
+        """
+
+    @abstractmethod
+    def requeue_failed(self, job_id: str) -> List[int]:
+        """Marks failed CAMs pending again. Returns their indices."""
+
+    @abstractmethod
+    def fail_orphaned_jobs(self, error: str) -> List[str]:
+        """
+        Marks queued/running jobs failed (their worker threads died with the
+        previous process) so clients resume them. Returns their job ids.
+        """
+
+
+class SQLiteJobStore(JobStore):
+    """Local stand-in for the job store (single instance, file-backed)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    run_id TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS job_cams (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    cam TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    result TEXT,
+                    seq INTEGER,
+                    PRIMARY KEY (job_id, idx)
+                );
+                CREATE INDEX IF NOT EXISTS job_cams_seq ON job_cams (job_id, seq);
+                CREATE TABLE IF NOT EXISTS job_seq (
+                    job_id TEXT PRIMARY KEY,
+                    last_seq INTEGER NOT NULL
+                );
+                """
+            )
+
+    def create_job(self, run_id: str, cams: List[dict], params: dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = _now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, run_id, params, total, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, run_id, json.dumps(params), len(cams), now, now),
+            )
+            self._conn.executemany(
+                "INSERT INTO job_cams (job_id, idx, cam, state) VALUES (?, ?, ?, ?)",
+                [(job_id, i, json.dumps(cam), CAM_PENDING) for i, cam in enumerate(cams)],
+            )
+            self._conn.execute("INSERT INTO job_seq (job_id, last_seq) VALUES (?, 0)", (job_id,))
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            counts = dict(self._conn.execute(
+                "SELECT state, COUNT(*) FROM job_cams WHERE job_id = ? GROUP BY state", (job_id,)
+            ).fetchall())
+            results = self._conn.execute(
+                "SELECT result FROM job_cams WHERE job_id = ? AND result IS NOT NULL", (job_id,)
+            ).fetchall()
+
+        usage = {"prompt_token_count": 0, "candidates_token_count": 0, "total_token_count": 0,
+                 "cached_content_token_count": 0}
+        for (raw,) in results:
+            cam_usage = json.loads(raw).get("usage") or {}
+            for k in usage:
+                usage[k] += cam_usage.get(k, 0) or 0
+
+        return {
+            "job_id": row["job_id"],
+            "run_id": row["run_id"],
+            "params": json.loads(row["params"]),
+            "status": row["status"],
+            "error": row["error"],
+            "total": row["total"],
+            "pending": counts.get(CAM_PENDING, 0),
+            "succeeded": counts.get(CAM_DONE, 0),
+            "failed": counts.get(CAM_FAILED, 0),
+            "usage": usage,
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def set_job_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, _now(), job_id),
+            )
+
+    def pending_cams(self, job_id: str) -> List[Tuple[int, dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, cam FROM job_cams WHERE job_id = ? AND state = ? ORDER BY idx",
+                (job_id, CAM_PENDING),
+            ).fetchall()
+        return [(r["idx"], json.loads(r["cam"])) for r in rows]
+
+    def save_result(self, job_id: str, index: int, result: dict) -> None:
+        state = CAM_DONE if result.get("success") else CAM_FAILED
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE job_seq SET last_seq = last_seq + 1 WHERE job_id = ?", (job_id,))
+            (seq,) = self._conn.execute("SELECT last_seq FROM job_seq WHERE job_id = ?", (job_id,)).fetchone()
+            self._conn.execute(
+                "UPDATE job_cams SET state = ?, result = ?, seq = ? WHERE job_id = ? AND idx = ?",
+                (state, json.dumps(result, default=str), seq, job_id, index),
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (_now(), job_id))
+
+    def get_results(self, job_id: str, cursor: int = 0, limit: int = 500) -> Tuple[List[Dict[str, Any]], int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, result, seq FROM job_cams WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, cursor, limit),
+            ).fetchall()
+        items = [{"index": r["idx"], "result": json.loads(r["result"])} for r in rows]
+        next_cursor = rows[-1]["seq"] if rows else cursor
+        return items, next_cursor
+
+    def requeue_failed(self, job_id: str) -> List[int]:
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT idx FROM job_cams WHERE job_id = ? AND state = ? ORDER BY idx", (job_id, CAM_FAILED)
+            ).fetchall()
+            self._conn.execute(
+                "UPDATE job_cams SET state = ? WHERE job_id = ? AND state = ?", (CAM_PENDING, job_id, CAM_FAILED)
+            )
+        return [r["idx"] for r in rows]
+
+    def fail_orphaned_jobs(self, error: str) -> List[str]:
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE status IN ('queued', 'running')",
+                (error, _now()),
+            )
+        return [r["job_id"] for r in rows]
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Process-wide job store selected by Config.JOB_STORE_BACKEND."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = Config.JOB_STORE_BACKEND
+            if backend != "sqlite":
+                raise ValueError(f"Unsupported job store backend: {backend}")
+            logger.info(f"🗄️ Using SQLite job store at {Config.JOB_STORE_PATH}")
+            _store = SQLiteJobStore(Config.JOB_STORE_PATH)
+            # Job workers are threads of this process: anything still queued/running is orphaned
+            orphaned = _store.fail_orphaned_jobs("Engine restarted before the job finished; resume it")
+            if orphaned:
+                logger.warning(f"⚠️ Marked {len(orphaned)} orphaned job(s) failed: {', '.join(orphaned)}")
+        return _store
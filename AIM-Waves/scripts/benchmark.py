@@ -46,7 +46,7 @@ def calculate_cost(model_name, input_tokens, output_tokens):
     return cost
 
 def execute_single_run(args):
-    vehicle, size, model, search_enabled, thinking_budget, run_id = args
+    vehicle, size, model, search_enabled, thinking_budget, row_aliases, grounding, run_id = args
     retries = 0
     while retries <= MAX_RETRIES:
         try:
@@ -56,7 +56,7 @@ def execute_single_run(args):
                 vehicle=vehicle, size=size,
                 override_model=model, disable_search=(not search_enabled),
                 thinking_budget=thinking_budget, benchmark_mode=True,
-                stream=False, return_metadata=True
+                stream=False, return_metadata=True, row_aliases=row_aliases, grounding=grounding
             )
             if result.get("success") is False and result.get("error_type") in ["APIError", "StreamError"]:
                  raise Exception(f"Transient Error: {result.get('error_type')}")
@@ -68,7 +68,33 @@ def execute_single_run(args):
             delay = (BASE_DELAY * (2 ** (retries - 1))) + random.uniform(0, 1)
             time.sleep(delay)
 
-def run_benchmark(limit=None, repeats=REPEATS, max_concurrent=MAX_CONCURRENT, output_file=None):
+def print_alias_summary(rows):
+    """Output tokens and retry rate (first attempt not usable) per row-alias mode."""
+    print("\n📊 Row alias comparison")
+    for mode in sorted({r["Row_Aliases"] for r in rows}):
+        subset = [r for r in rows if r["Row_Aliases"] == mode]
+        ok = [r for r in subset if r["Success"]]
+        out_tokens = statistics.mean(r["Output_Tokens"] or 0 for r in ok) if ok else 0
+        retry_rate = 1 - len(ok) / len(subset)
+        misses = sum(r["Alias_Misses"] for r in subset)
+        print(f"   row_aliases={mode!s:<5} runs={len(subset):>4}  avg output tokens={out_tokens:7.1f}  "
+              f"retry rate={retry_rate:6.1%}  alias misses={misses}")
+
+def print_grounding_summary(rows):
+    """Latency and input tokens per grounding mode (search-enabled runs only)."""
+    print("\n📊 Grounding comparison (search enabled)")
+    for mode in sorted({r["Grounding_Mode"] for r in rows if r["Search_Enabled"]}):
+        subset = [r for r in rows if r["Search_Enabled"] and r["Grounding_Mode"] == mode]
+        ok = [r for r in subset if r["Success"]]
+        model_ms = statistics.median(r["Model_Latency_ms"] for r in ok) if ok else 0
+        e2e_ms = statistics.median(r["E2E_Latency_ms"] for r in ok) if ok else 0
+        local_ms = statistics.mean(r["Grounding_ms"] for r in ok) if ok else 0
+        in_tokens = statistics.mean(r["Input_Tokens"] or 0 for r in ok) if ok else 0
+        print(f"   grounding={mode:<6} runs={len(subset):>4}  p50 model={model_ms:7.0f} ms  p50 e2e={e2e_ms:7.0f} ms  "
+              f"local lookup={local_ms:5.1f} ms  avg input tokens={in_tokens:8.1f}  success={len(ok) / len(subset):6.1%}")
+
+def run_benchmark(limit=None, repeats=REPEATS, max_concurrent=MAX_CONCURRENT, output_file=None, alias_modes=(False,),
+                  grounding_modes=("remote",)):
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     report_filename = output_file if output_file else f"benchmark_report_{timestamp}.csv"
     
@@ -76,7 +102,8 @@ def run_benchmark(limit=None, repeats=REPEATS, max_concurrent=MAX_CONCURRENT, ou
         "Model", "Search_Enabled", "Thinking_Budget", "Vehicle", "Size",
         "Run_ID", "Success", "Model_Latency_ms", "E2E_Latency_ms",
         "Input_Tokens", "Output_Tokens", "Total_Tokens", "Cost_USD", "Error_Type",
-        "Generated_SKUs", "Raw_Output"
+        "Generated_SKUs", "Raw_Output", "Row_Aliases", "Alias_Misses",
+        "Grounding_Mode", "Grounding", "Grounding_ms"
     ]
     
     jobs = []
@@ -88,13 +115,18 @@ def run_benchmark(limit=None, repeats=REPEATS, max_concurrent=MAX_CONCURRENT, ou
             for search_enabled in SEARCH_SETTINGS:
                 for thinking_budget in THINKING_BUDGETS:
                     if count >= limit_cutoff: break
-                    for i in range(repeats):
-                        jobs.append((vehicle, size, model, search_enabled, thinking_budget, i))
+                    # Grounding only matters with search enabled
+                    for grounding in (grounding_modes if search_enabled else ("none",)):
+                        for row_aliases in alias_modes:
+                            for i in range(repeats):
+                                jobs.append((vehicle, size, model, search_enabled, thinking_budget, row_aliases,
+                                             grounding, i))
                     count += repeats
         if count >= limit_cutoff: break
 
     print(f"🚀 Starting Benchmark (ROBUST PARSER ACTIVE) using {max_concurrent} threads.")
     print(f"📋 Total Jobs: {len(jobs)}")
+    completed_rows = []
     
     with open(report_filename, mode='w', newline='') as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
@@ -103,7 +135,7 @@ def run_benchmark(limit=None, repeats=REPEATS, max_concurrent=MAX_CONCURRENT, ou
             future_to_job = {executor.submit(execute_single_run, job): job for job in jobs}
             completed_count = 0
             for future in concurrent.futures.as_completed(future_to_job):
-                vehicle, size, model, search_enabled, thinking_budget, run_id = future_to_job[future]
+                vehicle, size, model, search_enabled, thinking_budget, row_aliases, grounding, run_id = future_to_job[future]
                 completed_count += 1
                 try:
                     result, error_msg = future.result()
@@ -123,15 +155,25 @@ def run_benchmark(limit=None, repeats=REPEATS, max_concurrent=MAX_CONCURRENT, ou
                         "Cost_USD": f"{cost:.6f}",
                         "Error_Type": result.get("error_type", "") or (error_msg if error_msg else ""),
                         "Generated_SKUs": result.get("output", "") if result.get("success") else "",
-                        "Raw_Output": result.get("output", "") # Raw output for failures, sanitized for success
+                        "Raw_Output": result.get("output", ""), # Raw output for failures, sanitized for success
+                        "Row_Aliases": row_aliases,
+                        "Alias_Misses": result.get("alias_misses", 0),
+                        "Grounding_Mode": grounding,
+                        "Grounding": result.get("grounding") or "",
+                        "Grounding_ms": result.get("grounding_ms", 0)
                     }
                     writer.writerow(row)
+                    completed_rows.append(row)
                     csvfile.flush()
                     if completed_count % 10 == 0: print(f"   ✅ Progress: {completed_count}/{len(jobs)} jobs completed.")
                 except Exception as exc:
                     print(f"   ❌ Job exception: {exc}")
 
     print(f"\n🏁 Benchmark Complete. Results saved to {report_filename}")
+    if len(alias_modes) > 1:
+        print_alias_summary(completed_rows)
+    if len(grounding_modes) > 1:
+        print_grounding_summary(completed_rows)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Benchmark Gemini 2.5 Models with Robust Parser")
@@ -139,5 +181,11 @@ if __name__ == "__main__":
     parser.add_argument("--repeats", type=int, default=REPEATS, help="Number of repeats per test")
     parser.add_argument("--concurrent", type=int, default=MAX_CONCURRENT, help="Max concurrent requests")
     parser.add_argument("--output_file", type=str, help="Custom output filename")
+    parser.add_argument("--row-aliases", choices=["off", "on", "both"], default="off",
+                        help="Send r1..rN row aliases instead of ProductIds ('both' runs an A/B comparison)")
+    parser.add_argument("--grounding", nargs="+", choices=["remote", "local", "none"], default=["remote"],
+                        help="Grounding modes for search-enabled runs (several modes print a latency comparison)")
     args = parser.parse_args()
-    run_benchmark(limit=args.limit, repeats=args.repeats, max_concurrent=args.concurrent, output_file=args.output_file)
+    alias_modes = {"off": (False,), "on": (True,), "both": (False, True)}[args.row_aliases]
+    run_benchmark(limit=args.limit, repeats=args.repeats, max_concurrent=args.concurrent, output_file=args.output_file,
+                  alias_modes=alias_modes, grounding_modes=tuple(args.grounding))
@@ -0,0 +1,118 @@
+"""
+Agreement and speed of the local ranker (core/ranker.py) against recorded LLM outputs.
+
+Reads benchmark reports written by scripts/benchmark.py (CSV with Vehicle, Size,
+Success and Generated_SKUs columns; benchmark_*.csv in the current directory by
+default), ranks each fitment locally from its feedback data (cache -> BQ -> CSV,
+as the engine does) and compares with every successful LLM answer:
+
+    HB1     : same HB1
+    HB set  : |local HB1-HB4 ∩ LLM HB1-HB4| / 4
+    Top 20  : |local 20 ∩ LLM 20| / 20
+
+The same metrics between repeated LLM runs of a fitment are printed as a
+baseline: the model does not fully agree with itself either.
+
+Usage:
+    python scripts/benchmark_local_ranker.py
+    python scripts/benchmark_local_ranker.py --reports benchmark_final_optimized.csv --verbose
+"""
+import argparse
+import csv
+import glob
+import itertools
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+sys.path.append(os.getcwd())
+
+from aim_waves.config import Config
+from aim_waves.core.ranker import rank_locally
+from aim_waves.data.bigquery import fetch_feedback_from_bigquery
+
+
+def load_llm_answers(paths):
+    """{(vehicle, size): [[20 ProductIds], ...]} from successful benchmark rows."""
+    answers = defaultdict(list)
+    for path in paths:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.DictReader(f)
+            if "Generated_SKUs" not in (reader.fieldnames or []):
+                continue
+            for row in reader:
+                if row.get("Success") != "True":
+                    continue
+                ids = row["Generated_SKUs"].split()[2:22]
+                if len(ids) >= 4:
+                    answers[(row["Vehicle"], row["Size"])].append(ids)
+    return answers
+
+
+def agreement(a, b):
+    return {
+        "hb1": float(a[0] == b[0]),
+        "hb_set": len(set(a[:4]) & set(b[:4])) / 4,
+        "top20": len(set(a[:20]) & set(b[:20])) / 20,
+    }
+
+
+def mean_metrics(pairs):
+    if not pairs:
+        return None
+    return {k: statistics.mean(p[k] for p in pairs) for k in pairs[0]}
+
+
+def fmt(m):
+    if not m:
+        return "n/a"
+    return f"HB1 {m['hb1']:6.1%}  HB set {m['hb_set']:6.1%}  Top 20 {m['top20']:6.1%}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local ranker vs recorded LLM outputs")
+    parser.add_argument("--reports", nargs="*", help="benchmark.py CSV reports")
+    parser.add_argument("--goldilocks", type=int, default=Config.DEFAULT_GOLDILOCKS_PCT)
+    parser.add_argument("--verbose", action="store_true", help="Print one line per fitment")
+    args = parser.parse_args()
+
+    paths = args.reports or sorted(glob.glob("benchmark_*.csv"))
+    answers = load_llm_answers(paths)
+    if not answers:
+        print(f"❌ No successful LLM answers found in {paths}.")
+        sys.exit(1)
+
+    local_pairs, llm_pairs, timings = [], [], []
+    for (vehicle, size), llm_runs in answers.items():
+        rows = fetch_feedback_from_bigquery(size, vehicle)
+        if not rows:
+            print(f"   ⚠️ No feedback data for {vehicle} {size}, skipped.")
+            continue
+
+        t0 = time.perf_counter()
+        hotboxes, skus = rank_locally(
+            rows, goldilocks_zone_pct=args.goldilocks,
+            price_fluctuation_upper=Config.DEFAULT_PRICE_FLUCTUATION_UPPER,
+            price_fluctuation_lower=Config.DEFAULT_PRICE_FLUCTUATION_LOWER,
+        )
+        timings.append(time.perf_counter() - t0)
+        local = hotboxes + skus
+
+        fitment_pairs = [agreement(local, run) for run in llm_runs]
+        local_pairs.extend(fitment_pairs)
+        llm_pairs.extend(agreement(a, b) for a, b in itertools.combinations(llm_runs, 2))
+        if args.verbose:
+            print(f"   {vehicle[:25]:<25} {size:<12} runs={len(llm_runs):>3}  {fmt(mean_metrics(fitment_pairs))}")
+
+    print(f"\n📊 {len(answers)} fitment(s), {len(local_pairs)} LLM answer(s) from {len(paths)} report(s)")
+    print(f"   Local vs LLM : {fmt(mean_metrics(local_pairs))}")
+    print(f"   LLM vs LLM   : {fmt(mean_metrics(llm_pairs))}  (baseline)")
+    if timings:
+        print(f"   Local ranker : {statistics.mean(timings) * 1e6:,.0f} µs/CAM "
+              f"(max {max(timings) * 1e6:,.0f} µs)")
+
+
+if __name__ == "__main__":
+    main()
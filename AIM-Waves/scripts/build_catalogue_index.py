@@ -0,0 +1,92 @@
+"""
+Builds the local catalogue index used by vertex_ai_search.grounding: local.
+
+Input is a document export of the bc_catalogue datastore: JSONL where each line
+is a Discovery Engine document ({"id", "structData": {...}} or {"id", "jsonData": "..."}),
+or a CSV with one product per row. Each product becomes one {"id", "text"} line:
+id is the ProductId, text its descriptive fields joined in a compact form.
+The engine builds the BM25 postings from this file when it first needs them.
+
+Usage:
+    python scripts/build_catalogue_index.py bc_catalogue_export.jsonl
+    python scripts/build_catalogue_index.py products.csv --id-field ProductId --out aim_waves/data/resources/catalogue.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from aim_waves.config import Config
+from aim_waves.data.catalogue import CatalogueIndex
+
+ID_FIELDS = ("ProductId", "product_id", "productId", "ProdID", "sku", "id")
+# Descriptive fields first; anything else textual follows
+TEXT_FIELDS = ("title", "name", "BRAND", "brand", "Model", "model", "description", "summary")
+
+
+def read_documents(path):
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            yield from csv.DictReader(f)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            doc = json.loads(line)
+            data = doc.get("structData") or {}
+            if not data and doc.get("jsonData"):
+                data = json.loads(doc["jsonData"])
+            yield dict(data, id=data.get("id") or doc.get("id"))
+
+
+def to_entry(doc, id_field=None, max_chars=1000):
+    fields = [id_field] if id_field else ID_FIELDS
+    pid = next((str(doc[f]).strip() for f in fields if doc.get(f)), "")
+    if not pid:
+        return None
+    keys = [k for k in TEXT_FIELDS if k in doc] + [k for k in doc if k not in TEXT_FIELDS]
+    parts = []
+    for k in keys:
+        v = doc.get(k)
+        if k in fields or v in (None, "") or isinstance(v, (dict, list)):
+            continue
+        v = " ".join(str(v).split())
+        if v not in parts:
+            parts.append(v)
+    return {"id": pid, "text": " | ".join(parts)[:max_chars]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the local catalogue index (JSONL) from a datastore export")
+    parser.add_argument("export", help="Datastore document export (JSONL) or product CSV")
+    parser.add_argument("--out", default=Config.CATALOGUE_INDEX_PATH)
+    parser.add_argument("--id-field", help="Field holding the ProductId (default: first of %s)" % ", ".join(ID_FIELDS))
+    parser.add_argument("--max-chars", type=int, default=1000, help="Max text length per document")
+    args = parser.parse_args()
+
+    entries, skipped = [], 0
+    for doc in read_documents(args.export):
+        entry = to_entry(doc, args.id_field, args.max_chars)
+        if entry:
+            entries.append(entry)
+        else:
+            skipped += 1
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    t0 = time.perf_counter()
+    index = CatalogueIndex(entries)
+    print(f"✅ {len(entries):,} documents written to {args.out} ({skipped} without a ProductId skipped)")
+    print(f"   BM25 build: {(time.perf_counter() - t0) * 1000:,.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Token-count comparison of the legacy and compact tyre table encodings.
+
+Replays recorded feedback data (the BigQuery cache files in
+aim_waves/data/cache by default) the way the engine slices it per CAM: one
+table per Vehicle + Size fitment, plus the generic all-vehicles table per size
+that is used when a vehicle has no rows. Each table is rendered into the full
+prompt in both encodings, and the table and prompt sizes are reported.
+
+Tokens are estimated as chars / 4 (as in debug_token_count.py) unless
+--count-api is given, in which case Gemini's count_tokens endpoint is used
+(needs GOOGLE_CLOUD_PROJECT / ADC).
+
+--prefilter-budget N first runs the local pre-filter (core/prefilter.py) with
+a table budget of N tokens, to show the combined effect.
+
+Usage:
+    python scripts/compare_table_encoding.py
+    python scripts/compare_table_encoding.py --prefilter-budget 2000
+    python scripts/compare_table_encoding.py --files path/to/rows.json --count-api
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from collections import defaultdict
+
+sys.path.append(os.getcwd())
+
+from aim_waves.config import Config
+from aim_waves.core.prefilter import prefilter_candidates
+from aim_waves.core.prompts import build_tyre_table, construct_prompt
+from aim_waves.data.bigquery import _normalise_size, _normalise_vehicle
+
+DEFAULT_GLOB = os.path.join(Config.BASE_DIR, "data", "cache", "*.json")
+
+
+def estimate_tokens(text):
+    return len(text) // 4
+
+
+def make_api_counter():
+    from google import genai
+
+    model_cfg = Config.MODEL_CONFIG.get("model", {})
+    project = model_cfg.get("project") or os.environ.get("GOOGLE_CLOUD_PROJECT")
+    client = genai.Client(vertexai=True, project=project, location=model_cfg.get("location", "europe-west1"))
+    model = model_cfg.get("name", "gemini-2.5-flash-lite")
+
+    def count(text):
+        return client.models.count_tokens(model=model, contents=text).total_tokens
+
+    return count
+
+
+def fitment_tables(rows):
+    """(label, rows) per Vehicle + Size fitment, plus one generic table per size."""
+    by_size = defaultdict(list)
+    by_fitment = defaultdict(list)
+    for r in rows:
+        n_size = _normalise_size(r.get("SIZE"))
+        by_size[n_size].append(r)
+        by_fitment[(n_size, _normalise_vehicle(r.get("Vehicle")))].append(r)
+    for (n_size, n_veh), fit_rows in by_fitment.items():
+        yield "fitment", f"{n_veh} {n_size}", fit_rows
+    for n_size, size_rows in by_size.items():
+        yield "generic", n_size, size_rows
+
+
+def render(rows, encoding, float_decimals, prefilter_budget=None):
+    if prefilter_budget:
+        _, rows, _ = prefilter_candidates(rows, token_budget=prefilter_budget, encoding=encoding)
+    columns, table, preamble = build_tyre_table(rows, encoding, float_decimals=float_decimals)
+    first = rows[0]
+    prompt = construct_prompt(
+        first.get("Vehicle"), first.get("SIZE"), table,
+        "", "anymodel", "", None, "",
+        Config.DEFAULT_GOLDILOCKS_PCT, Config.DEFAULT_PRICE_FLUCTUATION_UPPER, Config.DEFAULT_PRICE_FLUCTUATION_LOWER,
+        tyre_columns=columns, tyre_data_preamble=preamble,
+    )
+    return "\n".join(filter(None, [preamble, table])), prompt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare legacy vs compact tyre table token counts")
+    parser.add_argument("--files", nargs="*", help="JSON files holding lists of feedback rows")
+    parser.add_argument("--float-decimals", type=int,
+                        default=Config.MODEL_CONFIG.get("prompt", {}).get("float_decimals", 2))
+    parser.add_argument("--prefilter-budget", type=int, help="Apply the local pre-filter with this token budget")
+    parser.add_argument("--count-api", action="store_true", help="Count tokens with Gemini count_tokens")
+    parser.add_argument("--verbose", action="store_true", help="Print one line per table")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(DEFAULT_GLOB))
+    if not files:
+        print(f"❌ No feedback files found (looked in {DEFAULT_GLOB}).")
+        sys.exit(1)
+
+    count = make_api_counter() if args.count_api else estimate_tokens
+    totals = defaultdict(lambda: defaultdict(int))
+
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        if not isinstance(rows, list) or not rows:
+            continue
+        for kind, label, table_rows in fitment_tables(rows):
+            t = totals[kind]
+            t["tables"] += 1
+            t["rows"] += len(table_rows)
+            line = []
+            for encoding in ("legacy", "compact"):
+                table, prompt = render(table_rows, encoding, args.float_decimals, args.prefilter_budget)
+                table_tokens, prompt_tokens = count(table), count(prompt)
+                t[f"{encoding}_table"] += table_tokens
+                t[f"{encoding}_prompt"] += prompt_tokens
+                line.append(f"{encoding} {table_tokens:>6,}/{prompt_tokens:>6,}")
+            if args.verbose:
+                print(f"   {kind:<7} {label[:40]:<40} rows={len(table_rows):>4}  " + "  ".join(line))
+
+    unit = "tokens (count_tokens)" if args.count_api else "tokens (est. chars/4)"
+    print(f"\n📊 {len(files)} file(s), {unit}"
+          + (f", pre-filter budget {args.prefilter_budget:,}" if args.prefilter_budget else ""))
+    for kind, t in totals.items():
+        table_saving = 1 - t["compact_table"] / t["legacy_table"] if t["legacy_table"] else 0
+        prompt_saving = 1 - t["compact_prompt"] / t["legacy_prompt"] if t["legacy_prompt"] else 0
+        print(f"\n{kind} tables: {t['tables']:,} ({t['rows']:,} rows)")
+        print(f"   Table  legacy {t['legacy_table']:>10,}  compact {t['compact_table']:>10,}  saving {table_saving:6.1%}")
+        print(f"   Prompt legacy {t['legacy_prompt']:>10,}  compact {t['compact_prompt']:>10,}  saving {prompt_saving:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
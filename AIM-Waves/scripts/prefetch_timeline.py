@@ -0,0 +1,94 @@
+"""
+Before/after timeline for the pipelined BigQuery prefetch.
+
+Runs generate_recommendations_batch_push over a synthetic 500-CAM batch with
+simulated BigQuery and Gemini latencies, once with a single all-sizes query
+(before) and once with per-size-group queries (after), and prints when the
+first model call started, total wall time and an ASCII timeline.
+
+Usage:
+    python scripts/prefetch_timeline.py --cams 500 --sizes 60
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.getcwd())
+
+import aim_waves.core.engine as engine
+import aim_waves.data.bigquery as bigquery_data
+
+# Simulated latencies (seconds)
+BQ_BASE_S = 1.5        # fixed cost of a BigQuery job
+BQ_PER_SIZE_S = 0.05   # scan/transfer per size in the query
+MODEL_CALL_S = 0.4     # one Gemini call
+
+
+def install_fakes(events, lock, t0):
+    def fake_fetch_feedback_batch(sizes):
+        time.sleep(BQ_BASE_S + BQ_PER_SIZE_S * len(sizes))
+        with lock:
+            events.append(("bq", time.time() - t0[0]))
+        return {bigquery_data._normalise_size(s): [] for s in sizes}
+
+    def fake_process_single_cam(cam, params, prefetched_data=None):
+        start = time.time() - t0[0]
+        time.sleep(MODEL_CALL_S)
+        with lock:
+            events.append(("model", start))
+        return {"Vehicle": cam["Vehicle"], "Size": cam["Size"], "success": True, "usage": {}}
+
+    bigquery_data.fetch_feedback_batch = fake_fetch_feedback_batch
+    engine.process_single_cam = fake_process_single_cam
+
+
+def run(label, group_size, cams):
+    events, lock, t0 = [], threading.Lock(), [0.0]
+    install_fakes(events, lock, t0)
+    bigquery_data.PREFETCH_GROUP_SIZE = group_size
+
+    t0[0] = time.time()
+    engine.generate_recommendations_batch_push(f"timeline_{label}", cams, {})
+    total = time.time() - t0[0]
+
+    model_starts = sorted(t for kind, t in events if kind == "model")
+    bq_done = sorted(t for kind, t in events if kind == "bq")
+    print(f"\n{label}: group_size={group_size or 'all'}")
+    print(f"   BigQuery queries:      {len(bq_done)} (last landed at {bq_done[-1]:.2f}s)")
+    print(f"   First model call:      {model_starts[0]:.2f}s")
+    print(f"   Batch wall time:       {total:.2f}s")
+
+    # ASCII timeline: one column per 0.25s, B = BigQuery result landed, digits = model calls started
+    width = int(total / 0.25) + 1
+    bq_line = [" "] * width
+    model_line = [0] * width
+    for t in bq_done:
+        bq_line[min(width - 1, int(t / 0.25))] = "B"
+    for t in model_starts:
+        model_line[min(width - 1, int(t / 0.25))] += 1
+    print("   bq    |" + "".join(bq_line))
+    print("   model |" + "".join(" " if n == 0 else ("+" if n > 9 else str(n)) for n in model_line))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefetch pipelining timeline")
+    parser.add_argument("--cams", type=int, default=500)
+    parser.add_argument("--sizes", type=int, default=60)
+    parser.add_argument("--group-size", type=int, default=8)
+    args = parser.parse_args()
+
+    cams = [
+        {"Vehicle": f"VEHICLE {i}", "Size": f"{185 + (i % args.sizes)}/55 R16"}
+        for i in range(args.cams)
+    ]
+
+    before = run("Before (single query)", 0, cams)
+    after = run("After (pipelined)", args.group_size, cams)
+    print(f"\nSpeed-up: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
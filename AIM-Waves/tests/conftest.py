@@ -0,0 +1,14 @@
+import pytest
+
+from aim_waves.main import create_app
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.test_client() as c:
+        with c.session_transaction() as sess:
+            sess["is_authed"] = True
+        yield c
+
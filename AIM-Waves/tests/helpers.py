@@ -0,0 +1,15 @@
+"""Builders shared by the engine tests."""
+
+
+def tyre_row(pid, **overrides):
+    """A candidate tyre row as served for one fitment; keyword arguments override columns by name."""
+    row = {
+        "ProductId": pid, "BRAND": "Goodyear", "Model": "Model", "GRADE": "Premium", "TyreScore": "2.BETTER TYRE SCORE",
+        "Units": 1, "SalesStatus": "Active", "PRICE": 100.0, "GoldilocksZone": 100.0, "PRICEFLUCTUATION": 1.0,
+        "OFFER": "NORMAL", "PremiumShare": 60.0, "BudgetShare": 10.0, "RunflatShare": 0.0,
+        "RunflatStatus": "Non-Runflat", "SEASONAL_PERFORMANCE": "Summer", "Vehicle": "FORD FOCUS",
+        "SIZE": "205/55 R16", "Segment": "City Car", "PRODUCTLISTVIEWS": 0, "CLICKSTREAMRATE": 0.0,
+    }
+    row.update(overrides)
+    row.setdefault("MidRangeShare", 100 - row["PremiumShare"] - row["BudgetShare"])
+    return row
@@ -0,0 +1,61 @@
+from aim_waves.core.admission import AdmissionController
+import aim_waves.api.routes as routes
+
+
+def test_budget_admits_until_saturated():
+    ac = AdmissionController(budget=10)
+    assert ac.try_acquire(6)
+    assert not ac.try_acquire(5)
+    ac.release(6, elapsed_s=3.0)
+    assert ac.try_acquire(5)
+
+
+def test_oversized_batch_admitted_when_idle():
+    ac = AdmissionController(budget=10)
+    assert ac.try_acquire(50)
+    assert not ac.try_acquire(1)
+
+
+def test_estimate_wait_uses_observed_throughput():
+    ac = AdmissionController(budget=10)
+    ac.try_acquire(10)
+    ac.release(10, elapsed_s=5.0)  # 2 CAMs/s
+    ac.try_acquire(10)
+    assert ac.estimate_wait(10) == 5
+
+
+def test_batch_returns_429_with_retry_after(client, monkeypatch):
+    ac = AdmissionController(budget=10)
+    ac.try_acquire(10)
+    monkeypatch.setattr(routes, "admission", ac)
+
+    resp = client.post("/api/recommendations/batch", json={"run_id": "r", "cams": [{"Vehicle": "A", "Size": "205/55 R16"}]})
+
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert resp.get_json()["in_flight"] == 10
+
+
+def test_stream_closed_before_first_chunk_releases_budget(client, monkeypatch):
+    ac = AdmissionController(budget=10)
+    monkeypatch.setattr(routes, "admission", ac)
+    started = []
+
+    def never_read(run_id, cams, params, cache_report=None):
+        started.append(run_id)
+        yield 0, {"success": True}
+
+    monkeypatch.setattr(routes, "iter_recommendations_batch_push", never_read)
+
+    payload = {"run_id": "r", "cams": [{"Vehicle": "A", "Size": "205/55 R16"}] * 4}
+    with client.application.test_request_context("/api/recommendations/batch", method="POST", json=payload,
+                                                 headers={"Accept": "application/x-ndjson"}):
+        resp = routes.api_recommendations_batch()
+    assert ac.in_flight == 4
+
+    # Client went away: the server closes a body it never iterated, the budget still comes back (once)
+    resp.close()
+    resp.close()
+    assert started == []
+    assert ac.in_flight == 0
+    assert ac.try_acquire(10)
@@ -0,0 +1,30 @@
+import aim_waves.data.bigquery as bq
+
+
+def test_iter_feedback_batches_groups_sizes(monkeypatch):
+    calls = []
+
+    def fake_fetch(sizes):
+        calls.append(list(sizes))
+        return {s: [{"SIZE": s}] for s in sizes}
+
+    monkeypatch.setattr(bq, "fetch_feedback_batch", fake_fetch)
+    sizes = ["205/55 R16", "205/55R16", "225/40 R18", "195/65 R15", "215/55 R17"]
+
+    groups = list(bq.iter_feedback_batches(sizes, group_size=2, max_workers=2))
+
+    seen = sorted(n for group, _ in groups for n in group)
+    assert seen == sorted(["205/55r16", "225/40r18", "195/65r15", "215/55r17"])
+    assert all(len(c) <= 2 for c in calls)
+    for group, data in groups:
+        assert set(data.keys()) == set(group)
+
+
+def test_iter_feedback_batches_single_query_when_disabled(monkeypatch):
+    calls = []
+    monkeypatch.setattr(bq, "fetch_feedback_batch", lambda sizes: calls.append(sizes) or {})
+
+    groups = list(bq.iter_feedback_batches(["205/55 R16", "225/40 R18"], group_size=0))
+
+    assert len(calls) == 1
+    assert len(groups) == 1
@@ -0,0 +1,73 @@
+import aim_waves.core.engine as engine
+from aim_waves.core.cascade import TierStats, cascade_tiers
+from aim_waves.core.validator import validate_answer
+
+from tests.helpers import tyre_row
+
+TIERS = [{"name": "lite", "model": "lite-model", "thinking_budget": 0},
+         {"name": "flash", "model": "flash-model", "thinking_budget": 0}]
+
+
+ROWS = [tyre_row(str(1000000 + i)) for i in range(6)] + [tyre_row("2000001", BRAND="Triangle", GRADE="Budget")]
+
+
+def test_validator_accepts_a_clean_answer():
+    assert validate_answer(["1000000", "1000001", "1000002", "1000003"], ROWS) == []
+
+
+def test_validator_reports_hard_rule_violations():
+    assert validate_answer(["1000000", "-", "1000002", "1000003"], ROWS) == ["parse"]
+    assert validate_answer(["1000000", "1000000", "1000002", "9999999"], ROWS) == ["hb_duplicate", "not_in_table"]
+    assert validate_answer(["2000001", "1000001", "1000002", "1000003"], ROWS) == \
+        ["budget_hb1_3", "budget_share", "brand_set"]
+    high_share = [dict(r, BudgetShare=40.0) for r in ROWS]
+    assert validate_answer(["1000000", "1000001", "1000002", "2000001"], high_share) == []
+
+
+def test_cascade_escalates_only_invalid_answers(monkeypatch):
+    calls = []
+
+    def fake_generate(**kw):
+        calls.append((kw["override_model"], kw["thinking_budget"], kw["disable_search"]))
+        # The cheap tier puts a Budget tyre in HB1, the next tier answers cleanly
+        hb = "2000001 1000001 1000002 1000003" if kw["override_model"] == "lite-model" else "1000000 1000001 1000002 1000003"
+        return {"output": f"KNOWN_CAR 20555R16 {hb}", "success": True, "model": kw["override_model"],
+                "feedback_data": ROWS, "usage": {"prompt_token_count": 100, "total_token_count": 110}}
+
+    monkeypatch.setattr(engine, "generate_recommendation", fake_generate)
+    cam = {"Vehicle": "FORD FOCUS", "Size": "205/55 R16"}
+    params = {"cascade": True, "cascade_tiers": TIERS}
+    assert [t["name"] for t in cascade_tiers(params)] == ["lite", "flash"]
+
+    res = engine.process_single_cam(cam, params)
+    assert res["success"] and res["tier"] == "flash"
+    assert calls == [("lite-model", 0, True), ("flash-model", 0, True)]
+    assert [s["violations"] for s in res["cascade"]] == [["budget_hb1_3", "budget_share", "brand_set"], []]
+    assert res["usage"]["prompt_token_count"] == 200
+    assert len(res["SKUs"]) == 20
+
+    stats = TierStats()
+    stats.add(res)
+    report = stats.report()
+    assert report["lite"]["escalated"] == 1 and report["lite"]["final"] == 0
+    assert report["flash"]["final"] == 1 and report["flash"]["prompt_token_count"] == 100
+    assert report["lite"]["violations"]["budget_hb1_3"] == 1
+
+
+def test_cascade_off_by_default():
+    assert cascade_tiers({}) is None
+
+
+def test_unparseable_cheap_answer_escalates_with_repair_on(monkeypatch):
+    def fake_generate(**kw):
+        out = "I cannot answer this" if kw["override_model"] == "lite-model" else \
+            "KNOWN_CAR 20555R16 1000000 1000001 1000002 1000003"
+        return {"output": out, "success": True, "model": kw["override_model"], "feedback_data": ROWS, "usage": {}}
+
+    monkeypatch.setattr(engine, "generate_recommendation", fake_generate)
+    res = engine.process_single_cam({"Vehicle": "FORD FOCUS", "Size": "205/55 R16"},
+                                    {"cascade": True, "cascade_tiers": TIERS, "repair": True})
+
+    assert res["success"] and res["tier"] == "flash"
+    assert "parse" in res["cascade"][0]["violations"] and not res["cascade"][0]["repaired"]
+    assert [res["HB1"], res["HB2"], res["HB3"], res["HB4"]] == ["1000000", "1000001", "1000002", "1000003"]
@@ -0,0 +1,43 @@
+import json
+
+from aim_waves.core.prompts import build_catalogue_notes
+from aim_waves.data import catalogue
+from aim_waves.data.catalogue import CatalogueIndex, grounding_snippets
+
+DOCS = [
+    {"id": "1000001", "text": "Michelin Primacy 4 205/55 R16 91V summer tyre, low rolling resistance"},
+    {"id": "1000002", "text": "Goodyear EfficientGrip Performance 205/55 R16 wet grip A"},
+    {"id": "1000003", "text": "Michelin Pilot Sport 5 225/40 R18 92Y XL"},
+    {"id": "1000004", "text": "Triangle TE301 195/55 R16 budget summer tyre"},
+]
+
+
+def test_bm25_ranks_matching_documents_first():
+    index = CatalogueIndex(DOCS)
+    hits = index.search("michelin primacy", k=2)
+    assert [pid for pid, _, _ in hits] == ["1000001", "1000003"]
+    assert index.search("unknown words") == []
+
+
+def test_search_can_be_restricted_to_table_products():
+    index = CatalogueIndex(DOCS)
+    hits = index.search("michelin", k=5, restrict=["1000002", "1000003"])
+    assert [pid for pid, _, _ in hits] == ["1000003"]
+
+
+def test_grounding_snippets_from_index_file(tmp_path, monkeypatch):
+    path = tmp_path / "catalogue.jsonl"
+    path.write_text("\n".join(json.dumps(d) for d in DOCS))
+    monkeypatch.setattr(catalogue, "_index", None)
+    rows = [{"ProductId": "1000001", "BRAND": "Michelin", "Model": "Primacy 4"},
+            {"ProductId": "1000002", "BRAND": "Goodyear", "Model": "EfficientGrip Performance"}]
+
+    snippets = grounding_snippets("205/55 R16", rows, k=5, max_chars=20, path=str(path))
+    assert sorted(pid for pid, _ in snippets) == ["1000001", "1000002"]
+    assert all(len(text) <= 20 for _, text in snippets)
+    assert build_catalogue_notes(snippets[:1]).splitlines()[1] == f"{snippets[0][0]}: {snippets[0][1]}"
+    assert build_catalogue_notes([]) == ""
+
+    # No index file: local grounding is a no-op
+    monkeypatch.setattr(catalogue, "_index", None)
+    assert grounding_snippets("205/55 R16", rows, path=str(tmp_path / "missing.jsonl")) == []
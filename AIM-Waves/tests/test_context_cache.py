@@ -0,0 +1,110 @@
+import itertools
+import threading
+import types as pytypes
+
+import aim_waves.core.engine as engine
+import aim_waves.data.bigquery as bq
+from aim_waves.config import Config
+from aim_waves.core.context_cache import ContextCacheManager
+
+
+class FakeCaches:
+    """Local stand-in for client.caches (create/delete)."""
+
+    def __init__(self):
+        self.created = []
+        self.deleted = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(self, model, config):
+        with self._lock:
+            name = f"cachedContents/{next(self._ids)}"
+            self.created.append({"name": name, "model": model, "config": config})
+        return pytypes.SimpleNamespace(name=name, usage_metadata=pytypes.SimpleNamespace(total_token_count=4000))
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+
+class FakeModels:
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, model, contents, config):
+        with self._lock:
+            self.calls.append({"contents": contents, "config": config})
+        text = contents[0].parts[0].text
+        vehicle, size = text.split("\n")[0][9:], text.split("\n")[1][6:]
+        cached = 3800 if config.cached_content else 0
+        return pytypes.SimpleNamespace(
+            candidates=[pytypes.SimpleNamespace(content=pytypes.SimpleNamespace(
+                parts=[pytypes.SimpleNamespace(text=f"{vehicle} {size} 1000001 1000002 1000003 1000004")]))],
+            usage_metadata=pytypes.SimpleNamespace(prompt_token_count=4100, candidates_token_count=40,
+                                                   total_token_count=4140, cached_content_token_count=cached),
+        )
+
+    def generate_content_stream(self, model, contents, config):
+        yield self.generate_content(model, contents, config)
+
+
+def test_manager_creates_once_per_size_and_cleans_up():
+    caches = FakeCaches()
+    manager = ContextCacheManager(pytypes.SimpleNamespace(caches=caches), "gemini-test", min_cams=3)
+    manager.plan({"20555r16": 5, "22540r18": 2})
+
+    names = []
+    threads = [threading.Thread(target=lambda: names.append(manager.get("20555r16", "rules", "table")))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(caches.created) == 1
+    assert set(names) == {"cachedContents/1"}
+    assert manager.get("22540r18", "rules", "table") is None  # below min_cams
+
+    manager.record_usage({"cached_content_token_count": 1000})
+    report = manager.close()
+    assert caches.deleted == ["cachedContents/1"]
+    assert report["cams_served"] == 5
+    assert report["cached_tokens"] == 1000
+    assert report["billable_tokens_saved"] == 750
+    assert report["caches_deleted"] == 1
+
+
+def test_manager_falls_back_when_create_fails():
+    class Failing(FakeCaches):
+        def create(self, model, config):
+            raise RuntimeError("quota")
+
+    manager = ContextCacheManager(pytypes.SimpleNamespace(caches=Failing()), "gemini-test", min_cams=1)
+    manager.plan({"20555r16": 1})
+    assert manager.get("20555r16", "rules", "table") is None
+    assert manager.close()["create_failures"] == 1
+
+
+def test_batch_uses_cache_for_generic_size_cams(monkeypatch):
+    models, caches = FakeModels(), FakeCaches()
+    monkeypatch.setattr(engine.genai, "Client", lambda **kw: pytypes.SimpleNamespace(models=models, caches=caches))
+    monkeypatch.setitem(Config.MODEL_CONFIG, "context_cache", {"enabled": True, "min_cams": 3})
+
+    rows = [{"ProductId": 1000000 + i, "Vehicle": "KNOWN CAR", "SIZE": "205/55 R16", "SalesStatus": "Active",
+             "Units": 10 - i} for i in range(1, 6)]
+    monkeypatch.setattr(bq, "fetch_feedback_batch", lambda sizes: {bq._normalise_size("205/55 R16"): rows})
+
+    cams = [{"Vehicle": f"NEW CAR {i}", "Size": "205/55 R16"} for i in range(4)]
+    cams.append({"Vehicle": "KNOWN CAR", "Size": "205/55 R16"})
+
+    resp = engine.generate_recommendations_batch_push("run-cache", cams, {"disable_search": True})
+
+    assert all(r["success"] for r in resp["results"])
+    assert len(caches.created) == 1 and caches.deleted == ["cachedContents/1"]
+    cached_calls = [c for c in models.calls if c["config"].cached_content]
+    # The 4 generic CAMs reference the cache; the vehicle with its own rows sends its full table
+    assert len(cached_calls) == 4
+    assert all("**Data:**" not in c["contents"][0].parts[0].text for c in cached_calls)
+    assert resp["context_cache"]["cams_served"] == 4
+    assert resp["usage"]["cached_content_token_count"] == 4 * 3800
@@ -0,0 +1,46 @@
+import aim_waves.core.engine as engine
+from aim_waves.core.fingerprint import input_fingerprint
+
+ROWS = [{"Vehicle": "Ford Focus", "SIZE": "205/55 R16", "ProductId": "1000001", "Units": 12},
+        {"Vehicle": "Ford Focus", "SIZE": "205/55 R16", "ProductId": "1000002", "Units": 7},
+        {"Vehicle": "VW Golf", "SIZE": "205/55 R16", "ProductId": "1000003", "Units": 3}]
+CAM = {"Vehicle": "Ford Focus", "Size": "205/55 R16"}
+PARAMS = {"goldilocks_zone_pct": 15, "season": "summer"}
+
+
+def test_fingerprint_tracks_rows_and_answer_params_only():
+    base = input_fingerprint(CAM, ROWS[:2], PARAMS)
+    assert input_fingerprint(CAM, list(reversed(ROWS[:2])), PARAMS) == base
+    assert input_fingerprint(CAM, ROWS[:2], {**PARAMS, "priority": "high", "fingerprint": True}) == base
+    assert input_fingerprint(CAM, ROWS[:2], {**PARAMS, "season": "winter"}) != base
+    assert input_fingerprint(CAM, [ROWS[0], dict(ROWS[1], Units=8)], PARAMS) != base
+    assert input_fingerprint(CAM, [], PARAMS) is None
+
+
+def test_precomputed_fingerprints_match_batch_results(monkeypatch):
+    monkeypatch.setattr(engine, "iter_feedback_batches",
+                        lambda sizes: iter([(["205/55r16"], {"205/55r16": ROWS})]))
+    monkeypatch.setattr(engine, "process_single_cam", lambda cam, params, prefetched_data=None, context_cache=None: {
+        "Vehicle": cam["Vehicle"], "Size": cam["Size"], "success": True, "usage": {}})
+    cams = [CAM, {"Vehicle": "VW Golf", "Size": "205/55 R16"}, {"Vehicle": "Kia Rio", "Size": ""}]
+
+    fingerprints = engine.compute_fingerprints(cams, PARAMS)
+    results = dict(engine.iter_recommendations_batch_push("r1", cams[:2], {**PARAMS, "fingerprint": True}))
+
+    assert fingerprints[0] and fingerprints[0] != fingerprints[1]
+    assert fingerprints[2] is None
+    assert [results[i]["input_fingerprint"] for i in range(2)] == fingerprints[:2]
+
+
+def test_fallbacks_and_reuses_are_not_fingerprinted(monkeypatch):
+    monkeypatch.setattr(engine, "iter_feedback_batches",
+                        lambda sizes: iter([(["205/55r16"], {"205/55r16": ROWS})]))
+    answers = {"Ford Focus": {"fallback_for": "UPSTREAM_ERROR", "ranker": "local"},
+               "VW Golf": {"ranker": "neighbour", "reused_from": {"Vehicle": "Ford Focus"}}}
+    monkeypatch.setattr(engine, "process_single_cam", lambda cam, params, prefetched_data=None, context_cache=None: {
+        "Vehicle": cam["Vehicle"], "Size": cam["Size"], "success": True, "usage": {}, **answers[cam["Vehicle"]]})
+    cams = [CAM, {"Vehicle": "VW Golf", "Size": "205/55 R16"}]
+
+    results = dict(engine.iter_recommendations_batch_push("r1", cams, {**PARAMS, "fingerprint": True}))
+
+    assert all(r["success"] and "input_fingerprint" not in r for r in results.values())
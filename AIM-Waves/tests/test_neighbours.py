@@ -0,0 +1,108 @@
+import numpy as np
+
+import aim_waves.core.engine as engine
+from aim_waves.config import Config
+from aim_waves.core.neighbours import FitmentIndex, fitment_features, fitment_index
+from aim_waves.data.bigquery import _normalise_size
+
+from tests.helpers import tyre_row
+
+
+def test_nearest_excludes_self_and_respects_cutoff():
+    index = FitmentIndex()
+    index.add("CAR A", "205/55 R16", np.array([1.0, 0.0, 0.0]), {"HB1": "a"})
+    index.add("CAR B", "205/55 R16", np.array([0.9, 0.1, 0.0]), {"HB1": "b"})
+    index.add("CAR C", "225/45 R17", np.array([1.0, 0.0, 0.0]), {"HB1": "c"})
+
+    neighbour, sim, answer = index.nearest("CAR A", "205/55 R16", np.array([1.0, 0.0, 0.0]), 0.9)
+    assert neighbour == "CAR B" and answer == {"HB1": "b"} and sim > 0.99
+    assert index.nearest("CAR Z", "205/55 R16", np.array([0.0, 0.0, 1.0]), 0.9) is None
+    assert index.nearest("CAR Z", "195/65 R15", np.array([1.0, 0.0, 0.0]), 0.0) is None
+    assert index.stats() == {"sizes": 2, "param_sets": 1, "fitments": 3, "hits": 1, "misses": 2}
+
+
+def test_index_evicts_oldest_per_size():
+    index = FitmentIndex(max_per_size=2)
+    for i in range(3):
+        index.add(f"CAR {i}", "205/55 R16", np.array([1.0, float(i)]), {"HB1": str(i)})
+    assert index.stats()["fitments"] == 2
+    assert index.nearest("X", "205/55 R16", np.array([1.0, 0.0]), 0.0)[0] != "CAR 0"
+
+
+def test_features_separate_segments_and_grade_mix():
+    premium = fitment_features([tyre_row(1, Vehicle="A"), tyre_row(2, Vehicle="A", Units=5)], "City Car")
+    same = fitment_features([tyre_row(3, Vehicle="B"), tyre_row(4, Vehicle="B", Units=5)], "City Car")
+    other = fitment_features([tyre_row(5, Vehicle="C", GRADE="Budget", PremiumShare=20.0, BudgetShare=60.0)], "Van")
+
+    def cos(a, b):
+        return a @ b / np.linalg.norm(a) / np.linalg.norm(b)
+
+    assert cos(premium, same) > 0.999
+    assert cos(premium, other) < 0.8
+
+
+def test_sparse_cam_reuses_neighbour_answer(monkeypatch):
+    rows = [tyre_row(1000000 + i, Vehicle="KNOWN CAR", Units=10 - i) for i in range(5)]
+    prefetched = {_normalise_size("205/55 R16"): rows}
+    answer = "KNOWN_CAR 20555R16 " + " ".join(str(1000000 + i) for i in range(5))
+    calls = []
+
+    def fake_generate(**kw):
+        calls.append(kw["vehicle"])
+        return {"output": answer, "success": True, "usage": {}, "feedback_data": rows}
+
+    monkeypatch.setattr(engine, "generate_recommendation", fake_generate)
+    monkeypatch.setitem(Config.MODEL_CONFIG, "neighbours", {"enabled": True, "min_similarity": 0.9})
+    monkeypatch.setattr(fitment_index, "_blocks", {})
+
+    first = engine.process_single_cam({"Vehicle": "KNOWN CAR", "Size": "205/55 R16"}, {}, prefetched)
+    assert first["success"] and "ranker" not in first
+
+    # No rows of its own: the generic table looks like KNOWN CAR's, so its answer is reused
+    res = engine.process_single_cam({"Vehicle": "RARE CAR", "Size": "205/55 R16"}, {}, prefetched)
+    assert calls == ["KNOWN CAR"]
+    assert res["ranker"] == "neighbour" and res["reused_from"]["Vehicle"] == "KNOWN CAR"
+    assert [res[h] for h in ("HB1", "HB2", "HB3", "HB4")] == [first[h] for h in ("HB1", "HB2", "HB3", "HB4")]
+    assert res["usage"] == {}
+
+
+def test_answers_expire_after_max_age(monkeypatch):
+    import aim_waves.core.neighbours as neighbours
+
+    now = [1000.0]
+    monkeypatch.setattr(neighbours.time, "monotonic", lambda: now[0])
+    index = FitmentIndex(max_age_s=60)
+    index.add("CAR A", "205/55 R16", np.array([1.0, 0.0]), {"HB1": "a"})
+    assert index.nearest("CAR Z", "205/55 R16", np.array([1.0, 0.0]), 0.9) is not None
+
+    now[0] += 61
+    assert index.nearest("CAR Z", "205/55 R16", np.array([1.0, 0.0]), 0.9) is None
+    assert index.stats()["fitments"] == 0
+
+
+def test_batches_with_different_enhancers_do_not_share_answers(monkeypatch):
+    rows = [tyre_row(1000000 + i, Vehicle="KNOWN CAR", Units=10 - i) for i in range(5)]
+    prefetched = {_normalise_size("205/55 R16"): rows}
+    answer = "KNOWN_CAR 20555R16 " + " ".join(str(1000000 + i) for i in range(5))
+    calls = []
+
+    def fake_generate(**kw):
+        calls.append(kw["vehicle"])
+        return {"output": answer, "success": True, "usage": {}, "feedback_data": rows}
+
+    monkeypatch.setattr(engine, "generate_recommendation", fake_generate)
+    monkeypatch.setitem(Config.MODEL_CONFIG, "neighbours", {"enabled": True, "min_similarity": 0.9})
+    monkeypatch.setattr(fitment_index, "_blocks", {})
+
+    kumho = {"brand_enhancer": "Kumho", "priority": "high"}
+    engine.process_single_cam({"Vehicle": "KNOWN CAR", "Size": "205/55 R16"}, kumho, prefetched)
+
+    # Another batch under a different enhancer computes its own answer
+    res = engine.process_single_cam({"Vehicle": "RARE CAR", "Size": "205/55 R16"}, {"brand_enhancer": "Avon"}, prefetched)
+    assert "ranker" not in res
+    assert calls == ["KNOWN CAR", "RARE CAR"]
+
+    # Same answer params (priority is operational): reused
+    res = engine.process_single_cam({"Vehicle": "OTHER CAR", "Size": "205/55 R16"}, {"brand_enhancer": "Kumho"}, prefetched)
+    assert res["ranker"] == "neighbour" and res["reused_from"]["Vehicle"] == "KNOWN CAR"
+
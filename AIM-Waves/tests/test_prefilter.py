@@ -0,0 +1,45 @@
+from aim_waves.core.prefilter import prefilter_candidates
+
+from tests.helpers import tyre_row
+
+
+def test_drops_inactive_and_duplicates():
+    rows = [tyre_row(1000001), tyre_row(1000002, SalesStatus="Inactive"), tyre_row(1000001, Units=3), tyre_row(1000003)]
+    candidates, table_rows, stats = prefilter_candidates(rows)
+
+    pids = [r["ProductId"] for r in candidates]
+    assert sorted(pids) == [1000001, 1000003]
+    assert stats["inactive_dropped"] == 1
+    assert stats["duplicates_dropped"] == 1
+    assert table_rows == candidates
+
+
+def test_ranks_by_popularity_and_score():
+    rows = [tyre_row(1000001, Units=1, TyreScore="4.FAIR TYRE SCORE", PRICE=300.0),
+            tyre_row(1000002, Units=50, TyreScore="1.BEST TYRE SCORE")]
+    candidates, _, _ = prefilter_candidates(rows, keep_top_popular=1)
+    assert [r["ProductId"] for r in candidates] == [1000002, 1000001]
+
+
+def test_budget_trims_but_keeps_pinned_rows():
+    rows = [tyre_row(1000000 + i, Units=100 - i) for i in range(60)]
+    # Low-ranked rows that must survive: brand enhancer match and the only run-flat
+    rows.append(tyre_row(2000001, BRAND="Kumho", Units=0, TyreScore="4.FAIR TYRE SCORE", PRICE=500.0))
+    rows.append(tyre_row(2000002, Units=0, RunflatStatus="Runflat", TyreScore="4.FAIR TYRE SCORE", PRICE=500.0))
+
+    candidates, table_rows, stats = prefilter_candidates(rows, token_budget=600, brand_enhancer_lower="kumho")
+
+    kept = {r["ProductId"] for r in table_rows}
+    assert len(candidates) == 62
+    assert stats["trimmed"] > 0 and len(table_rows) < 62
+    assert stats["table_tokens_est"] <= 600
+    # Best seller, top-N popular and pinned rows are always kept
+    assert {1000000, 1000001, 1000002, 1000003, 1000004} <= kept
+    assert {2000001, 2000002} <= kept
+
+
+def test_all_inactive_is_left_unfiltered():
+    rows = [tyre_row(1000001, SalesStatus="Discontinued"), tyre_row(1000002, SalesStatus="Discontinued")]
+    candidates, _, stats = prefilter_candidates(rows)
+    assert len(candidates) == 2
+    assert stats["inactive_dropped"] == 0
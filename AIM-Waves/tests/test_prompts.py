@@ -0,0 +1,95 @@
+from aim_waves.core.prompts import TABLE_COLUMNS, build_tyre_table, construct_prompt
+
+from tests.helpers import tyre_row
+
+
+# Values the table assertions below look for
+BEST = {"TyreScore": "1.BEST TYRE SCORE", "GoldilocksZone": 95.123}
+
+
+def test_legacy_table_keeps_every_column():
+    rows = [tyre_row(1001, **BEST), tyre_row(1002, **BEST)]
+    columns, table, preamble = build_tyre_table(rows, "legacy")
+
+    lines = table.split("\n")
+    assert columns == lines[0] == "|".join(h for h, _ in TABLE_COLUMNS)
+    assert len(lines[1].split("|")) == len(TABLE_COLUMNS)
+    assert "1.BEST TYRE SCORE" in lines[1]
+    assert preamble == ""
+
+
+def test_compact_table_hoists_encodes_and_drops():
+    rows = [tyre_row(1000 + i, GoldilocksZone=95.123, TyreScore=s, OFFER=o) for i, (s, o) in enumerate(
+        [("1.BEST TYRE SCORE", "ONOFFER"), ("2.BETTER TYRE SCORE", "NORMAL")] * 5
+    )]
+    columns, table, preamble = build_tyre_table(rows, "compact")
+    header = columns.split("|")
+
+    # Fitment constants move to the header block, rounded
+    for h in ("Vehicle", "Size", "Goldilocks", "PremShare", "RFShare", "Status"):
+        assert h not in header
+    assert "Goldilocks=95.12" in preamble
+    assert "RFShare=0" in preamble
+    # Unreferenced columns are gone entirely
+    assert "Views" not in header and "Views=" not in preamble
+    # Long categoricals are coded with a legend
+    assert "- TyreScore: A=1.BEST TYRE SCORE; B=2.BETTER TYRE SCORE" in preamble
+    tyre_score = [line.split("|")[header.index("TyreScore")] for line in table.split("\n")[1:]]
+    assert tyre_score[:2] == ["A", "B"]
+    # Product IDs are never hoisted or coded
+    assert [line.split("|")[header.index("ProdID")] for line in table.split("\n")[1:3]] == ["1000", "1001"]
+
+
+def test_compact_single_row_keeps_values_inline():
+    columns, table, preamble = build_tyre_table([tyre_row(1001, **BEST)], "compact")
+    assert "Vehicle" in columns.split("|")
+    assert "FORD FOCUS" in table
+
+
+def test_prompt_lists_columns_and_preamble():
+    rows = [tyre_row(1001, **BEST), tyre_row(1002, **BEST)]
+    columns, table, preamble = build_tyre_table(rows, "compact")
+    prompt = construct_prompt("FORD FOCUS", "205/55 R16", table, "", "anymodel", "", None, "", 15, 1.1, 0.9,
+                              tyre_columns=columns, tyre_data_preamble=preamble)
+    assert f"`{columns}`" in prompt
+    assert preamble in prompt
+
+
+def test_row_aliases_replace_product_ids():
+    rows = [tyre_row(1001, **BEST), tyre_row(1002, **BEST), tyre_row(1003, **BEST)]
+    for encoding in ("legacy", "compact"):
+        columns, table, _ = build_tyre_table(rows, encoding, row_aliases=True)
+        pid_col = columns.split("|").index("ProdID")
+        assert [line.split("|")[pid_col] for line in table.split("\n")[1:]] == ["r1", "r2", "r3"]
+        assert "1001" not in table
+
+
+def test_system_instruction_is_shared_across_cams():
+    from aim_waves.core.prompts import construct_request, construct_system_instruction
+
+    args = ("kumho", "anymodel", "winter", 15, 1.1, 0.9, False)
+    system = construct_system_instruction(*args)
+    assert system == construct_system_instruction(*args)
+    # No fitment-specific text leaks into the shared prefix
+    assert "FORD FOCUS" not in system and "{{" not in system
+    assert "<Vehicle>" in system and "kumho" in system
+
+    columns, table, preamble = build_tyre_table([tyre_row(1001, **BEST), tyre_row(1002, **BEST)], "compact")
+    request = construct_request("FORD FOCUS", "205/55 R16", table, columns, preamble)
+    assert request.startswith("Vehicle: FORD FOCUS\nSize: 205/55 R16")
+    assert table in request and preamble in request
+    assert len(request) < len(system)
+
+
+def test_compact_keeps_threshold_columns_exact():
+    rows = [tyre_row(1001, **BEST, PRICEFLUCTUATION=1.104, PRICE=99.999),
+            tyre_row(1002, **BEST, PRICEFLUCTUATION=1.1, PRICE=120.0, BudgetShare=35.004)]
+    columns, table, preamble = build_tyre_table(rows, "compact")
+    header = columns.split("|")
+    lines = [line.split("|") for line in table.split("\n")[1:]]
+
+    # 1.104 must stay above price_fluctuation_upper=1.1, and 35.004 above the 35% BudShare rule
+    assert [line[header.index("PriceFluct")] for line in lines] == ["1.104", "1.1"]
+    assert [line[header.index("BudShare")] for line in lines] == ["10", "35.004"]
+    # Display columns are still rounded
+    assert lines[0][header.index("PriceGBP")] == "100"
@@ -0,0 +1,123 @@
+import aim_waves.core.engine as engine
+from aim_waves.config import Config
+from aim_waves.core.ranker import rank_locally
+from aim_waves.core.validator import validate_answer
+
+from tests.helpers import tyre_row
+
+
+def _by_pid(rows):
+    return {str(r["ProductId"]): r for r in rows}
+
+
+def test_full_answer_respects_slot_rules():
+    rows = [tyre_row(1000000 + i, Units=30 - i) for i in range(10)]
+    rows += [tyre_row(2000000 + i, BRAND="Triangle", GRADE="Budget", Units=50) for i in range(6)]
+    rows += [tyre_row(3000000 + i, GRADE="MidRange", Units=5) for i in range(6)]
+    hotboxes, skus = rank_locally(rows)
+    info = _by_pid(rows)
+
+    assert len(hotboxes) == 4 and len(skus) == 16 and "-" not in hotboxes + skus
+    assert len(set(hotboxes + skus)) == 20
+    # BudShare < 35%: no Budget in the hotboxes, and HB1-HB3 come from Set_A brands
+    assert all(info[p]["GRADE"] != "Budget" for p in hotboxes)
+    assert all(info[p]["BRAND"] != "Triangle" for p in hotboxes[:3])
+    # The top sellers (Budget here) are still offered in SKU5-SKU20
+    assert {str(2000000 + i) for i in range(5)} <= set(skus)
+
+
+def test_high_budget_share_puts_one_budget_in_hb4():
+    rows = [tyre_row(1000000 + i, Units=20 - i, BudgetShare=40.0) for i in range(6)]
+    rows += [tyre_row(2000001, BRAND="Triangle", GRADE="Budget", Units=1, BudgetShare=40.0)]
+    hotboxes, _ = rank_locally(rows)
+    info = _by_pid(rows)
+
+    assert [info[p]["GRADE"] for p in hotboxes] == ["Premium", "Premium", "Premium", "Budget"]
+
+
+def test_most_popular_and_top_runflat_are_in_hotboxes():
+    rows = [tyre_row(1000000 + i, Units=5, TyreScore="1.BEST TYRE SCORE", RunflatShare=30.0) for i in range(6)]
+    rows.append(tyre_row(2000001, Units=500, TyreScore="4.FAIR TYRE SCORE", RunflatShare=30.0))
+    rows.append(tyre_row(2000002, Units=50, TyreScore="4.FAIR TYRE SCORE", RunflatStatus="Runflat", RunflatShare=30.0))
+    hotboxes, _ = rank_locally(rows)
+
+    assert "2000001" in hotboxes[:3]
+    assert "2000002" in hotboxes[:3]
+
+
+def test_brand_enhancer_takes_hb4():
+    rows = [tyre_row(1000000 + i, Units=20 - i) for i in range(6)]
+    rows.append(tyre_row(2000001, BRAND="Kumho", GRADE="MidRange", Units=0, TyreScore="4.FAIR TYRE SCORE"))
+    hotboxes, _ = rank_locally(rows, brand_enhancer_lower="kumho")
+    assert hotboxes[3] == "2000001"
+
+
+def test_ranker_and_validator_read_the_same_budget_share():
+    # Generic table: the first row's BudgetShare is not the fitment's (median) share
+    rows = [tyre_row(1000000, Units=30, BudgetShare=10.0)]
+    rows += [tyre_row(1000001 + i, Units=20 - i, BudgetShare=40.0) for i in range(6)]
+    rows += [tyre_row(2000001, BRAND="Triangle", GRADE="Budget", Units=1, BudgetShare=40.0)]
+    hotboxes, skus = rank_locally(rows)
+    assert hotboxes[3] == "2000001"
+    assert validate_answer(hotboxes, rows, skus) == []
+
+
+def test_model_enhancer_takes_hb3_and_passes_the_validator():
+    rows = [tyre_row(1000000 + i, Units=20 - i) for i in range(6)]
+    # Best seller and a weak row of the enhanced model: both land in HB3, never HB4
+    for units in (50, 0):
+        model_rows = rows + [tyre_row(2000001, Model="EfficientGrip", Units=units, TyreScore="4.FAIR TYRE SCORE")]
+        hotboxes, skus = rank_locally(model_rows, model_enhancer_lower="efficientgrip")
+        assert hotboxes[2] == "2000001"
+        assert validate_answer(hotboxes, model_rows, skus, model_enhancer="efficientgrip") == []
+
+
+def test_limited_range_pads_with_dashes():
+    hotboxes, skus = rank_locally([tyre_row(1000001), tyre_row(1000002, SalesStatus="Inactive")])
+    assert hotboxes == ["1000001", "-", "-", "-"]
+    assert skus == ["-"] * 16
+
+
+def test_engine_falls_back_to_local_ranker_on_upstream_error(monkeypatch):
+    rows = [tyre_row(1000000 + i, Units=10 - i) for i in range(8)]
+    monkeypatch.setattr(engine, "generate_recommendation",
+                        lambda **kw: {"output": "", "success": False, "error_type": "APIError", "usage": {}})
+    monkeypatch.setattr(engine, "fetch_feedback_from_bigquery", lambda size, vehicle: rows)
+    cam = {"Vehicle": "FORD FOCUS", "Size": "205/55 R16"}
+
+    monkeypatch.setitem(Config.MODEL_CONFIG, "local_ranker", {"fallback": False})
+    assert engine.process_single_cam(cam, {})["success"] is False
+
+    res = engine.process_single_cam(cam, {"local_fallback": True})
+    assert res["success"] is True
+    assert res["ranker"] == "local" and res["fallback_for"] == "UPSTREAM_ERROR"
+    assert len(res["SKUs"]) == 20
+
+
+def test_local_mode_skips_the_model(monkeypatch):
+    rows = [tyre_row(1000000 + i, Units=10 - i) for i in range(8)]
+
+    def fail(**kw):
+        raise AssertionError("model must not be called")
+
+    monkeypatch.setattr(engine, "generate_recommendation", fail)
+    monkeypatch.setattr(engine, "fetch_feedback_from_bigquery", lambda size, vehicle: rows)
+    monkeypatch.setitem(Config.MODEL_CONFIG, "local_ranker", {"priorities": ["low"]})
+
+    res = engine.process_single_cam({"Vehicle": "FORD FOCUS", "Size": "205/55 R16", "ranker": "local"}, {})
+    assert res["success"] and res["ranker"] == "local" and res["usage"] == {}
+    res = engine.process_single_cam({"Vehicle": "FORD FOCUS", "Size": "205/55 R16"}, {"priority": "low"})
+    assert res["ranker"] == "local"
+
+
+def test_local_answer_has_the_model_answer_shape(monkeypatch):
+    # 26 rows: rank_locally fills HB1-HB4 + 16 SKUs, the backfill tops up SKU17-SKU20
+    rows = [tyre_row(1000000 + i, Units=30 - i) for i in range(26)]
+    monkeypatch.setattr(engine, "fetch_feedback_from_bigquery", lambda size, vehicle: rows)
+
+    res = engine.rank_cam_locally({"Vehicle": "FORD FOCUS", "Size": "205/55 R16"}, {})
+
+    ids = [res[f"HB{i}"] for i in range(1, 5)] + res["SKUs"]
+    assert res["success"] and len(res["SKUs"]) == 20
+    assert "-" not in ids and len(set(ids)) == 24
+
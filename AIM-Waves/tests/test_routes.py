@@ -0,0 +1,100 @@
+import json
+
+import aim_waves.api.routes as routes
+
+
+def fake_iter(run_id, cams, params, cache_report=None):
+    for i in reversed(range(len(cams))):
+        yield i, {"Vehicle": cams[i]["Vehicle"], "Size": cams[i]["Size"], "success": True,
+                  "usage": {"prompt_token_count": 3}}
+
+
+def test_batch_streams_ndjson(client, monkeypatch):
+    monkeypatch.setattr(routes, "iter_recommendations_batch_push", fake_iter)
+    payload = {"run_id": "r1", "cams": [{"Vehicle": "A", "Size": "205/55 R16"}, {"Vehicle": "B", "Size": "205/55 R16"}]}
+
+    resp = client.post("/api/recommendations/batch", json=payload, headers={"Accept": "application/x-ndjson"})
+
+    assert resp.mimetype == "application/x-ndjson"
+    lines = [json.loads(l) for l in resp.get_data(as_text=True).splitlines()]
+    assert [l["index"] for l in lines[:-1]] == [1, 0]
+    assert lines[-1]["type"] == "summary"
+    assert lines[-1]["succeeded"] == 2
+    assert lines[-1]["usage"]["prompt_token_count"] == 6
+
+
+def test_job_submit_poll_and_resume(client, monkeypatch, tmp_path):
+    import time
+    from aim_waves.core import engine
+    import aim_waves.data.job_store as job_store
+
+    monkeypatch.setattr(job_store, "_store", job_store.SQLiteJobStore(str(tmp_path / "jobs.db")))
+    calls = []
+
+    def flaky_iter(run_id, cams, params):
+        calls.append([c["Vehicle"] for c in cams])
+        for i, cam in enumerate(cams):
+            ok = cam["Vehicle"] != "B" or len(calls) > 1
+            yield i, {"Vehicle": cam["Vehicle"], "Size": cam["Size"], "success": ok}
+
+    monkeypatch.setattr(engine, "iter_recommendations_batch_push", flaky_iter)
+
+    def wait_for(job_id, status):
+        for _ in range(100):
+            job = client.get(f"/api/recommendations/jobs/{job_id}").get_json()
+            if job["status"] == status and job["pending"] == 0:
+                return job
+            time.sleep(0.02)
+        raise AssertionError(job)
+
+    cams = [{"Vehicle": v, "Size": "205/55 R16"} for v in "ABC"]
+    resp = client.post("/api/recommendations/jobs", json={"run_id": "r1", "cams": cams})
+    assert resp.status_code == 202
+    job_id = resp.get_json()["job_id"]
+
+    job = wait_for(job_id, "completed")
+    assert (job["succeeded"], job["failed"]) == (2, 1)
+
+    page = client.get(f"/api/recommendations/jobs/{job_id}/results?cursor=0").get_json()
+    assert sorted(r["index"] for r in page["results"]) == [0, 1, 2]
+
+    resumed = client.post(f"/api/recommendations/jobs/{job_id}/resume").get_json()
+    assert resumed["requeued"] == [1]
+    job = wait_for(job_id, "completed")
+    assert job["succeeded"] == 3
+    assert calls[1] == ["B"]
+
+    later = client.get(f"/api/recommendations/jobs/{job_id}/results?cursor={page['next_cursor']}").get_json()
+    assert [r["index"] for r in later["results"]] == [1]
+
+
+def test_orphaned_job_is_failed_on_restart_and_resumable(client, monkeypatch, tmp_path):
+    import time
+    from aim_waves.config import Config
+    from aim_waves.core import engine
+    import aim_waves.data.job_store as job_store
+
+    path = str(tmp_path / "jobs.db")
+    before = job_store.SQLiteJobStore(path)
+    job_id = before.create_job("r1", [{"Vehicle": v, "Size": "205/55 R16"} for v in "AB"], {})
+    before.set_job_status(job_id, "running")
+
+    # New process: the store is reopened and the job's worker thread is gone
+    monkeypatch.setattr(Config, "JOB_STORE_PATH", path)
+    monkeypatch.setattr(job_store, "_store", None)
+    job = client.get(f"/api/recommendations/jobs/{job_id}").get_json()
+    assert (job["status"], job["pending"]) == ("failed", 2)
+
+    monkeypatch.setattr(engine, "iter_recommendations_batch_push",
+                        lambda run_id, cams, params: ((i, {**c, "success": True}) for i, c in enumerate(cams)))
+    client.post(f"/api/recommendations/jobs/{job_id}/resume")
+    for _ in range(100):
+        job = client.get(f"/api/recommendations/jobs/{job_id}").get_json()
+        if job["status"] == "completed":
+            break
+        time.sleep(0.02)
+    assert job["succeeded"] == 2
+
+    # limit is clamped to at least 1 (SQLite treats LIMIT -1 as unlimited)
+    page = client.get(f"/api/recommendations/jobs/{job_id}/results?cursor=0&limit=-1").get_json()
+    assert len(page["results"]) == 1 and page["has_more"]
@@ -0,0 +1,77 @@
+import threading
+
+from aim_waves.core.scheduler import FairScheduler, priority_weight
+
+
+def run_in_order(scheduler, submissions):
+    """Blocks the single worker, queues everything, then records dispatch order."""
+    gate = threading.Event()
+    order = []
+    blocker = scheduler.submit("blocker", gate.wait)
+    futures = [scheduler.submit(run_id, order.append, f"{run_id}{i}", priority=prio)
+               for run_id, i, prio in submissions]
+    gate.set()
+    blocker.result(timeout=5)
+    for f in futures:
+        f.result(timeout=5)
+    return order
+
+
+def test_small_run_not_starved_by_large_run():
+    scheduler = FairScheduler(max_workers=1)
+    subs = [("big", i, None) for i in range(20)] + [("small", i, None) for i in range(2)]
+
+    order = run_in_order(scheduler, subs)
+
+    # Round-robin between the two runs: both small tasks go out in the first four
+    assert {"small0", "small1"} <= set(order[:4])
+
+
+def test_priority_weights_share():
+    scheduler = FairScheduler(max_workers=1)
+    subs = [("low", i, "low") for i in range(10)] + [("high", i, "high") for i in range(10)]
+
+    order = run_in_order(scheduler, subs)
+
+    assert sum(1 for o in order[:10] if o.startswith("high")) >= 8
+
+
+def test_queue_snapshot_and_cancel():
+    scheduler = FairScheduler(max_workers=1)
+    gate = threading.Event()
+    scheduler.submit("a", gate.wait)
+    queued = [scheduler.submit("b", lambda: None) for _ in range(3)]
+    queued[0].cancel()
+
+    snap = scheduler.snapshot()["runs"]
+    assert snap["b"]["queued"] == 2
+    gate.set()
+    for f in queued[1:]:
+        f.result(timeout=5)
+
+
+def test_priority_weight_parsing():
+    assert priority_weight(None) == 1.0
+    assert priority_weight("HIGH") == 4.0
+    assert priority_weight("2") == 2.0
+    assert priority_weight("bogus") == 1.0
+
+
+def test_cancelled_run_is_forgotten():
+    scheduler = FairScheduler(max_workers=1)
+    gate = threading.Event()
+    blocker = scheduler.submit("a", gate.wait)
+    queued = [scheduler.submit("gone", lambda: None, priority="high") for _ in range(3)]
+    for f in queued:
+        f.cancel()
+
+    # All of the run's work was cancelled: it no longer shows up while queued...
+    assert "gone" not in scheduler.snapshot()["runs"]
+    gate.set()
+    blocker.result(timeout=5)
+    done = scheduler.submit("a", lambda: None)
+    done.result(timeout=5)
+
+    # ...and its fair-share state is dropped once the cancelled tasks are popped
+    assert "gone" not in scheduler._weights
+    assert "gone" not in scheduler._pass
@@ -23,3 +23,18 @@ def test_parse_output_invalid():
     veh, size, hb1, hb2, hb3, hb4, skus = parse_recommendation_output(raw)
     assert veh == "ERROR_VEHICLE"
     assert skus[0] == "FormatError"
+
+def test_resolve_row_aliases_maps_ids_and_counts_misses():
+    from aim_waves.core.utils import resolve_row_aliases
+    ids = [38047380, 42160886, 44675723]
+    text = "FORD_FOCUS 205/55 R16 r2 R1 r3 r9 - -"
+    resolved, misses = resolve_row_aliases(text, ids, "Ford Focus", "205/55 R16")
+    # The size token R16 is never treated as an alias
+    assert resolved == "FORD_FOCUS 205/55 R16 42160886 38047380 44675723 - - -"
+    assert misses == 1
+
+def test_resolve_row_aliases_leaves_unrelated_lines():
+    from aim_waves.core.utils import resolve_row_aliases
+    resolved, misses = resolve_row_aliases("Here you go r1", [1234567], "Ford Focus", "205/55 R16")
+    assert resolved == "Here you go r1"
+    assert misses == 0
@@ -0,0 +1,88 @@
+import aim_waves.core.engine as engine
+from aim_waves.core.validator import ValidationStats, repair_answer, validate_answer
+
+from tests.helpers import tyre_row
+
+
+ROWS = [tyre_row(str(1000000 + i)) for i in range(6)]
+ROWS += [tyre_row("2000001", BRAND="Triangle", GRADE="Budget"),
+         tyre_row("3000001", Model="EfficientGrip"),
+         tyre_row("4000001", SEASONAL_PERFORMANCE="Winter")]
+
+
+def test_budget_in_hb1_is_swapped_for_best_eligible_row():
+    hb, skus, violations, remaining = repair_answer(
+        ["2000001", "1000001", "1000002", "1000003"], ["1000004"], ROWS)
+    assert "budget_hb1_3" in violations and remaining == []
+    assert hb == ["1000000", "1000001", "1000002", "1000003"]
+    # The demoted Budget tyre stays in the answer, at SKU5
+    assert skus == ["2000001", "1000004"]
+
+
+def test_unknown_and_duplicate_ids_are_replaced():
+    hb, _, violations, remaining = repair_answer(["1000000", "1000000", "9999999", "-"], [], ROWS)
+    assert set(violations) == {"parse", "hb_duplicate", "not_in_table"}
+    assert remaining == [] and len(set(hb)) == 4
+
+
+def test_enhancers_are_placed():
+    hb, skus, violations, remaining = repair_answer(
+        ["3000001", "1000001", "1000002", "1000003"], [], ROWS,
+        model_enhancer="EfficientGrip", seasonal_performance="winter", brand_enhancer="triangle")
+    assert set(violations) == {"model_enhancer", "season", "brand_enhancer"}
+    assert remaining == []
+    assert hb[2] == "3000001" and hb[3] == "4000001"
+    # BudShare < 35%: the Triangle Budget tyre cannot be a hotbox, so it goes to SKU5
+    assert skus[0] == "2000001"
+    assert validate_answer(hb, ROWS, skus, brand_enhancer="triangle", model_enhancer="efficientgrip",
+                           seasonal_performance="Winter") == []
+
+
+def test_unrepairable_answer_is_left_for_a_reprompt():
+    rows = [tyre_row("1000000"), tyre_row("1000001")]
+    _, _, violations, remaining = repair_answer(["1000000", "-", "-", "-"], [], rows)
+    assert violations == remaining == ["parse"]
+
+
+def test_answer_without_a_parseable_hotbox_is_not_repaired():
+    hb, _, violations, remaining = repair_answer(["-", "-", "-", "-"], [], ROWS)
+    assert violations == remaining == ["parse"]
+    assert hb == ["-", "-", "-", "-"]
+
+
+def test_engine_repairs_instead_of_reprompting(monkeypatch):
+    calls = []
+
+    def fake_generate(**kw):
+        calls.append(kw)
+        return {"output": "KNOWN_CAR 20555R16 2000001 1000001 1000002 1000003", "success": True,
+                "feedback_data": ROWS, "usage": {"prompt_token_count": 100}}
+
+    monkeypatch.setattr(engine, "generate_recommendation", fake_generate)
+    res = engine.process_single_cam({"Vehicle": "FORD FOCUS", "Size": "205/55 R16"}, {"repair": True})
+    assert len(calls) == 1
+    assert res["success"] and res["HB1"] == "1000000"
+    assert res["validation"]["repaired"] and not res["validation"]["reprompted"]
+
+    stats = ValidationStats()
+    stats.add(res)
+    assert stats.report() == {"checked": 1, "repaired": 1, "reprompted": 0,
+                              "violations": {"budget_hb1_3": 1, "budget_share": 1, "brand_set": 1}}
+
+
+def test_reprompt_reuses_the_first_call_arguments(monkeypatch):
+    calls = []
+
+    def fake_generate(**kw):
+        calls.append(kw)
+        return {"output": "I cannot answer this", "success": True, "feedback_data": ROWS, "usage": {}}
+
+    monkeypatch.setattr(engine, "generate_recommendation", fake_generate)
+    prefetched, cache = {"205/55r16": ROWS}, object()
+    engine.process_single_cam({"Vehicle": "FORD FOCUS", "Size": "205/55 R16"},
+                              {"repair": True, "pod": "A", "segment": "SUV", "disable_search": False},
+                              prefetched_data=prefetched, context_cache=cache)
+
+    assert len(calls) == 2 and calls[1] == calls[0]
+    assert calls[1]["prefetched_data"] is prefetched and calls[1]["context_cache"] is cache
+    assert calls[1]["pod_filter"] == "A" and calls[1]["segment_filter"] == "SUV" and not calls[1]["disable_search"]
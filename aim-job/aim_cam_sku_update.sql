@@ -1,83 +1,82 @@
-MERGE `{cam_table_id}` T
-USING (
-  WITH Map AS (
-    SELECT
-      REGEXP_REPLACE(LOWER(TRIM(vehicle)), r'[^a-z0-9]', '') AS vehicle_key,
-      CarMake,
-      CarModel
-    FROM `bqsqltesting.AIM.aim-vehiclemapping`
-  ),
+-- Staged rows the MERGE accepts: mapped vehicle, cleanly parsed size
+-- (delta runs load only new or changed rows into staging, so every staged row is merged)
+CREATE TEMP TABLE Stage AS
+WITH Map AS (
+  SELECT
+    REGEXP_REPLACE(LOWER(TRIM(vehicle)), r'[^a-z0-9]', '') AS vehicle_key,
+    CarMake,
+    CarModel
+  FROM `bqsqltesting.AIM.aim-vehiclemapping`
+)
+SELECT
+  -- Staged "Vehicle|Size" key, returned below for the CAM_SKU row hashes
+  CONCAT(TRIM(S.Vehicle), '|', TRIM(S.Size)) AS stage_key,
 
-  Stage AS (
-    SELECT
-      -- Vehicle mapping key
-      REGEXP_REPLACE(LOWER(TRIM(S.Vehicle)), r'[^a-z0-9]', '') AS vehicle_key,
+  -- Vehicle mapping key
+  REGEXP_REPLACE(LOWER(TRIM(S.Vehicle)), r'[^a-z0-9]', '') AS vehicle_key,
 
-      -- Parse W/P/R from Size (e.g. "225/40 R18", "225/40ZR18")
-      trim(REGEXP_EXTRACT(UPPER(S.Size), r'^\s*(\d{3})')) AS Width,
-      trim(REGEXP_EXTRACT(UPPER(S.Size), r'^\s*\d{3}\s*/\s*(\d{2})')) AS Profile,
-      trim(REGEXP_EXTRACT(UPPER(S.Size), r'R\s*(\d{2})\s*$')) AS Rim,
+  -- Parse W/P/R from Size (e.g. "225/40 R18", "225/40ZR18")
+  trim(REGEXP_EXTRACT(UPPER(S.Size), r'^\s*(\d{3})')) AS Width,
+  trim(REGEXP_EXTRACT(UPPER(S.Size), r'^\s*\d{3}\s*/\s*(\d{2})')) AS Profile,
+  trim(REGEXP_EXTRACT(UPPER(S.Size), r'R\s*(\d{2})\s*$')) AS Rim,
 
-      -- Canonical make/model from mapping
-      m.CarMake AS Make,
-      m.CarModel AS Model,
+  -- Canonical make/model from mapping
+  m.CarMake AS Make,
+  m.CarModel AS Model,
 
-      -- HB1–HB4 → SKU1–SKU4
-      NULLIF(TRIM(SAFE_CAST(S.HB1 AS STRING)), '') AS SKU1,
-      NULLIF(TRIM(SAFE_CAST(S.HB2 AS STRING)), '') AS SKU2,
-      NULLIF(TRIM(SAFE_CAST(S.HB3 AS STRING)), '') AS SKU3,
-      NULLIF(TRIM(SAFE_CAST(S.HB4 AS STRING)), '') AS SKU4,
+  -- HB1–HB4 → SKU1–SKU4
+  NULLIF(TRIM(SAFE_CAST(S.HB1 AS STRING)), '') AS SKU1,
+  NULLIF(TRIM(SAFE_CAST(S.HB2 AS STRING)), '') AS SKU2,
+  NULLIF(TRIM(SAFE_CAST(S.HB3 AS STRING)), '') AS SKU3,
+  NULLIF(TRIM(SAFE_CAST(S.HB4 AS STRING)), '') AS SKU4,
 
-      -- SKU1–20 → SKU5–24
-      NULLIF(TRIM(SAFE_CAST(S.SKU1  AS STRING)), '') AS SKU5,
-      NULLIF(TRIM(SAFE_CAST(S.SKU2  AS STRING)), '') AS SKU6,
-      NULLIF(TRIM(SAFE_CAST(S.SKU3  AS STRING)), '') AS SKU7,
-      NULLIF(TRIM(SAFE_CAST(S.SKU4  AS STRING)), '') AS SKU8,
-      NULLIF(TRIM(SAFE_CAST(S.SKU5  AS STRING)), '') AS SKU9,
-      NULLIF(TRIM(SAFE_CAST(S.SKU6  AS STRING)), '') AS SKU10,
-      NULLIF(TRIM(SAFE_CAST(S.SKU7  AS STRING)), '') AS SKU11,
-      NULLIF(TRIM(SAFE_CAST(S.SKU8  AS STRING)), '') AS SKU12,
-      NULLIF(TRIM(SAFE_CAST(S.SKU9  AS STRING)), '') AS SKU13,
-      NULLIF(TRIM(SAFE_CAST(S.SKU10 AS STRING)), '') AS SKU14,
-      NULLIF(TRIM(SAFE_CAST(S.SKU11 AS STRING)), '') AS SKU15,
-      NULLIF(TRIM(SAFE_CAST(S.SKU12 AS STRING)), '') AS SKU16,
-      NULLIF(TRIM(SAFE_CAST(S.SKU13 AS STRING)), '') AS SKU17,
-      NULLIF(TRIM(SAFE_CAST(S.SKU14 AS STRING)), '') AS SKU18,
-      NULLIF(TRIM(SAFE_CAST(S.SKU15 AS STRING)), '') AS SKU19,
-      NULLIF(TRIM(SAFE_CAST(S.SKU16 AS STRING)), '') AS SKU20,
-      NULLIF(TRIM(SAFE_CAST(S.SKU17 AS STRING)), '') AS SKU21,
-      NULLIF(TRIM(SAFE_CAST(S.SKU18 AS STRING)), '') AS SKU22,
-      NULLIF(TRIM(SAFE_CAST(S.SKU19 AS STRING)), '') AS SKU23,
-      NULLIF(TRIM(SAFE_CAST(S.SKU20 AS STRING)), '') AS SKU24,
+  -- SKU1–20 → SKU5–24
+  NULLIF(TRIM(SAFE_CAST(S.SKU1  AS STRING)), '') AS SKU5,
+  NULLIF(TRIM(SAFE_CAST(S.SKU2  AS STRING)), '') AS SKU6,
+  NULLIF(TRIM(SAFE_CAST(S.SKU3  AS STRING)), '') AS SKU7,
+  NULLIF(TRIM(SAFE_CAST(S.SKU4  AS STRING)), '') AS SKU8,
+  NULLIF(TRIM(SAFE_CAST(S.SKU5  AS STRING)), '') AS SKU9,
+  NULLIF(TRIM(SAFE_CAST(S.SKU6  AS STRING)), '') AS SKU10,
+  NULLIF(TRIM(SAFE_CAST(S.SKU7  AS STRING)), '') AS SKU11,
+  NULLIF(TRIM(SAFE_CAST(S.SKU8  AS STRING)), '') AS SKU12,
+  NULLIF(TRIM(SAFE_CAST(S.SKU9  AS STRING)), '') AS SKU13,
+  NULLIF(TRIM(SAFE_CAST(S.SKU10 AS STRING)), '') AS SKU14,
+  NULLIF(TRIM(SAFE_CAST(S.SKU11 AS STRING)), '') AS SKU15,
+  NULLIF(TRIM(SAFE_CAST(S.SKU12 AS STRING)), '') AS SKU16,
+  NULLIF(TRIM(SAFE_CAST(S.SKU13 AS STRING)), '') AS SKU17,
+  NULLIF(TRIM(SAFE_CAST(S.SKU14 AS STRING)), '') AS SKU18,
+  NULLIF(TRIM(SAFE_CAST(S.SKU15 AS STRING)), '') AS SKU19,
+  NULLIF(TRIM(SAFE_CAST(S.SKU16 AS STRING)), '') AS SKU20,
+  NULLIF(TRIM(SAFE_CAST(S.SKU17 AS STRING)), '') AS SKU21,
+  NULLIF(TRIM(SAFE_CAST(S.SKU18 AS STRING)), '') AS SKU22,
+  NULLIF(TRIM(SAFE_CAST(S.SKU19 AS STRING)), '') AS SKU23,
+  NULLIF(TRIM(SAFE_CAST(S.SKU20 AS STRING)), '') AS SKU24,
 
 
-      SAFE_CAST(S.last_modified AS TIMESTAMP) AS last_modified
-    FROM `{staging_table_id}` S
-    LEFT JOIN Map m
-      ON REGEXP_REPLACE(LOWER(TRIM(S.Vehicle)), r'[^a-z0-9]', '') = m.vehicle_key
-    WHERE
-      m.CarMake IS NOT NULL
-      AND m.CarModel IS NOT NULL
-      -- only accept rows where Size parses cleanly
-      AND REGEXP_CONTAINS(UPPER(S.Size), r'^\s*\d{3}\s*/\s*\d{2}\s*[A-Z]*\s*R\s*\d{2}\s*$')
-  ),
+  SAFE_CAST(S.last_modified AS TIMESTAMP) AS last_modified
+FROM `{staging_table_id}` S
+LEFT JOIN Map m
+  ON REGEXP_REPLACE(LOWER(TRIM(S.Vehicle)), r'[^a-z0-9]', '') = m.vehicle_key
+WHERE
+  m.CarMake IS NOT NULL
+  AND m.CarModel IS NOT NULL
+  -- only accept rows where Size parses cleanly
+  AND REGEXP_CONTAINS(UPPER(S.Size), r'^\s*\d{3}\s*/\s*\d{2}\s*[A-Z]*\s*R\s*\d{2}\s*$');
 
+MERGE `{cam_table_id}` T
+USING (
   -- one row per unique key from staging (newest wins)
-  StageDeduped AS (
-    SELECT * EXCEPT(rn)
-    FROM (
-      SELECT
-        *,
-        ROW_NUMBER() OVER (
-          PARTITION BY UPPER(TRIM(Make)), UPPER(TRIM(Model)), Width, Profile, Rim
-          ORDER BY last_modified DESC
-        ) AS rn
-      FROM Stage
-    )
-    WHERE rn = 1
+  SELECT * EXCEPT(rn, stage_key)
+  FROM (
+    SELECT
+      *,
+      ROW_NUMBER() OVER (
+        PARTITION BY UPPER(TRIM(Make)), UPPER(TRIM(Model)), Width, Profile, Rim
+        ORDER BY last_modified DESC
+      ) AS rn
+    FROM Stage
   )
-
-  SELECT * FROM StageDeduped
+  WHERE rn = 1
 ) S
 
 ON
@@ -140,3 +139,6 @@ WHEN NOT MATCHED THEN
     NULLIF(S.SKU21, '-'), NULLIF(S.SKU22, '-'), NULLIF(S.SKU23, '-'), NULLIF(S.SKU24, '-'),
     S.last_modified
   );
+
+-- Keys that reached the MERGE; rows dropped by the filters above are staged again next run
+SELECT DISTINCT stage_key FROM Stage;
@@ -11,13 +11,18 @@ def get_bq_client(config: AimConfig) -> bigquery.Client:
     # We will stick to that safe pattern.
     return bigquery.Client(project=config.project_id)
 
-def execute_query(client: bigquery.Client, query: str, dry_run: bool):
-    """Executes a raw SQL string."""
+def execute_query(client: bigquery.Client, query: str, dry_run: bool, query_parameters=None):
+    """
+    Executes a raw SQL string (optionally with named @query parameters).
+    Returns the rows of the query (for a script, of its last statement); None on a dry run.
+    """
     try:
         if not dry_run:
-            query_job = client.query(query)
-            query_job.result()
+            job_config = bigquery.QueryJobConfig(query_parameters=query_parameters) if query_parameters else None
+            query_job = client.query(query, job_config=job_config)
+            rows = query_job.result()
             logging.info("✅ Query executed successfully.")
+            return rows
         else:
             logging.info("🚧 DRY RUN: Would execute query.")
     except Exception as e:
@@ -52,3 +57,11 @@ def load_table_from_uri(client, uri, table_ref, job_config, dry_run):
         logging.info(f"✅ Loaded {uri} into {table_ref}")
     else:
         logging.info(f"🚧 DRY RUN: Would load {uri} into {table_ref}")
+
+def load_table_from_file(client, file_obj, table_ref, job_config, dry_run):
+    if not dry_run:
+        load_job = client.load_table_from_file(file_obj, table_ref, job_config=job_config)
+        load_job.result()
+        logging.info(f"✅ Loaded file into {table_ref}")
+    else:
+        logging.info(f"🚧 DRY RUN: Would load file into {table_ref}")
@@ -3,7 +3,7 @@ import asyncio
 import logging
 import json
 import os
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
 from dataclasses import dataclass
 import google.auth.transport.requests
 import google.oauth2.id_token
@@ -19,6 +19,18 @@ class SegmentResult:
     attempts: int = 1
     usage: Optional[Dict] = None
 
+class PartialBatchError(Exception):
+    """
+    A streamed batch ended early (dropped connection / missing summary).
+    Carries the results that did arrive, keyed by input index, so the caller
+    only has to re-send the rest.
+    """
+    def __init__(self, results: Dict[int, dict], usage: Dict[str, int], cause: Optional[Exception] = None):
+        super().__init__(f"Batch stream interrupted after {len(results)} results: {cause}")
+        self.results = results
+        self.usage = usage
+        self.cause = cause
+
 @dataclass
 class BatchSummary:
     results: List[Any] # Raw results from API
@@ -58,25 +70,21 @@ class WavesClient:
             raise RuntimeError("Login did not set any cookies.")
         logging.info("✅ Login successful and session cookie set.")
 
-    async def fetch_batch(self, client: httpx.AsyncClient, run_id: str, cams: List[dict], log_file_backend: IOBackend = None) -> Dict:
+    async def fetch_batch(self, client: httpx.AsyncClient, run_id: str, cams: List[dict], log_file_backend: IOBackend = None,
+                          on_result: Optional[Callable[[int, dict], None]] = None) -> Dict:
         """
         Executes a batch request. NO RETRIES here (except generic transient transport errors if httpx supports).
         Retries are managed by the Orchestrator.
+        on_result(index, result) is called for every CAM result; with stream_results
+        enabled it fires as each CAM completes on the engine.
         """
-        params = {
-            "goldilocks_zone_pct": self.config.goldilocks_zone_pct,
-            "price_fluctuation_upper": self.config.price_fluct_upper,
-            "price_fluctuation_lower": self.config.price_fluct_lower,
-            "brand_enhancer": self.config.brand_enhancer or None,
-            "model_enhancer": self.config.model_enhancer or None,
-            "season": self.config.season or None,
-            "disable_search": self.config.disable_search,
-        }
         payload = {
             "run_id": run_id,
             "cams": cams,
-            "params": {k: v for k, v in params.items() if v is not None}
+            "params": self._batch_params()
         }
+        if self.config.run_priority:
+            payload["priority"] = self.config.run_priority
         
         # Local Logging (if backend provided)
         if self.config.aim_mode == "local" and log_file_backend:
@@ -91,6 +99,9 @@ class WavesClient:
             except Exception as e:
                 logging.warning(f"⚠️ Failed to log local request: {e}")
 
+        if self.config.stream_results:
+            return await self._fetch_batch_stream(client, run_id, cams, payload, on_result)
+
         # The actual request
         resp = await client.post(
             f"{self.waves_url}/api/recommendations/batch",
@@ -98,8 +109,120 @@ class WavesClient:
             timeout=self.config.request_timeout_s
         )
         resp.raise_for_status()
+        data = resp.json()
+        if on_result:
+            for i, res in enumerate(data.get("results", [])):
+                on_result(i, res)
+        return data
+
+    async def _fetch_batch_stream(self, client: httpx.AsyncClient, run_id: str, cams: List[dict], payload: dict,
+                                  on_result: Optional[Callable[[int, dict], None]]) -> Dict:
+        """Consumes the engine's NDJSON stream incrementally."""
+        received: Dict[int, dict] = {}
+        usage = {"prompt_token_count": 0, "candidates_token_count": 0, "total_token_count": 0,
+                 "cached_content_token_count": 0}
+        summary = None
+
+        try:
+            async with client.stream(
+                "POST",
+                f"{self.waves_url}/api/recommendations/batch",
+                json=payload,
+                headers={"Accept": "application/x-ndjson"},
+                timeout=self.config.request_timeout_s
+            ) as resp:
+                if resp.is_error:
+                    await resp.aread()
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if record.get("type") == "result":
+                        idx, res = record["index"], record["result"]
+                        received[idx] = res
+                        for k in usage:
+                            usage[k] += (res.get("usage") or {}).get(k, 0) or 0
+                        if on_result:
+                            on_result(idx, res)
+                    elif record.get("type") == "summary":
+                        summary = record
+        except httpx.HTTPStatusError:
+            raise
+        except (httpx.TransportError, json.JSONDecodeError) as e:
+            raise PartialBatchError(received, usage, e) from e
+
+        if summary is None:
+            raise PartialBatchError(received, usage, RuntimeError("stream ended without summary"))
+
+        return {
+            "run_id": summary.get("run_id", run_id),
+            "results": [received.get(i) for i in range(len(cams))],
+            "usage": summary.get("usage", usage)
+        }
+
+    def _batch_params(self) -> Dict[str, Any]:
+        params = {
+            "goldilocks_zone_pct": self.config.goldilocks_zone_pct,
+            "price_fluctuation_upper": self.config.price_fluct_upper,
+            "price_fluctuation_lower": self.config.price_fluct_lower,
+            "brand_enhancer": self.config.brand_enhancer or None,
+            "model_enhancer": self.config.model_enhancer or None,
+            "season": self.config.season or None,
+            "disable_search": self.config.disable_search,
+        }
+        params = {k: v for k, v in params.items() if v is not None}
+        if self.config.incremental:
+            # Successful results carry the input fingerprint stored for the next run
+            params["fingerprint"] = True
+        return params
+
+    async def fetch_fingerprints(self, client: httpx.AsyncClient, cams: List[dict]) -> List[Optional[str]]:
+        """Input fingerprints of CAMs (engine-side prefetch only, no model calls), in CAM order."""
+        resp = await client.post(
+            f"{self.waves_url}/api/recommendations/fingerprints",
+            json={"cams": cams, "params": self._batch_params()},
+            timeout=self.config.request_timeout_s
+        )
+        resp.raise_for_status()
+        return resp.json().get("fingerprints", [])
+
+    # --- Async job API (/api/recommendations/jobs) ---
+
+    async def submit_job(self, client: httpx.AsyncClient, run_id: str, cams: List[dict]) -> str:
+        """Submits CAMs as an engine-side job. Returns the job id."""
+        payload = {"run_id": run_id, "cams": cams, "params": self._batch_params()}
+        if self.config.run_priority:
+            payload["priority"] = self.config.run_priority
+        resp = await client.post(
+            f"{self.waves_url}/api/recommendations/jobs",
+            json=payload,
+            timeout=60
+        )
+        resp.raise_for_status()
+        return resp.json()["job_id"]
+
+    async def get_job(self, client: httpx.AsyncClient, job_id: str) -> Dict:
+        resp = await client.get(f"{self.waves_url}/api/recommendations/jobs/{job_id}", timeout=60)
+        resp.raise_for_status()
         return resp.json()
 
+    async def fetch_job_results(self, client: httpx.AsyncClient, job_id: str, cursor: int = 0, limit: int = 500) -> Dict:
+        """One page of completed results after `cursor` ({"results", "next_cursor", "has_more"})."""
+        resp = await client.get(
+            f"{self.waves_url}/api/recommendations/jobs/{job_id}/results",
+            params={"cursor": cursor, "limit": limit},
+            timeout=60
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    async def resume_job(self, client: httpx.AsyncClient, job_id: str) -> List[int]:
+        """Asks the engine to re-run only the failed CAMs. Returns the requeued indices."""
+        resp = await client.post(f"{self.waves_url}/api/recommendations/jobs/{job_id}/resume", timeout=60)
+        resp.raise_for_status()
+        return resp.json().get("requeued", [])
+
     async def fetch_segments(self, client: httpx.AsyncClient) -> List[str]:
         # Implementation of fetching segment list from /app
         from bs4 import BeautifulSoup
@@ -32,6 +32,10 @@ class AimConfig:
     aim_table_id: str = os.getenv("AIM_TABLE_ID", "AIMData")
     cam_table_id: str = os.getenv("CAM_TABLE_ID", "bqsqltesting.CAM_files.CAM_SKU")
     bq_write_disposition: str = os.getenv("AIM_BQ_WRITE_DISPOSITION", "WRITE_TRUNCATE")
+    # "csv" or "parquet": format of the AIMData / CAM_SKU output files and their BigQuery loads
+    output_format: str = os.getenv("AIM_OUTPUT_FORMAT", "csv").lower()
+    # Stage/MERGE only CAM_SKU rows that changed since the last merged run (False: full restage)
+    cam_sku_delta: bool = os.getenv("AIM_CAM_SKU_DELTA", "True").lower() in ("true", "1", "t")
 
     # AIM Service
     aim_base_url: str = os.getenv("AIM_BASE_URL", "https://aim-engine-829092209663.europe-west1.run.app")
@@ -42,6 +46,15 @@ class AimConfig:
     run_mode: str = os.getenv("AIM_RUN_MODE", "PER_SEGMENT").upper()
     total_overall: int = int(os.getenv("AIM_TOTAL_OVERALL", "10000"))
     batch_size: int = int(os.getenv("AIM_BATCH_SIZE", "500"))
+    # GLOBAL mode: batches sent to the engine concurrently
+    max_inflight_batches: int = int(os.getenv("AIM_MAX_INFLIGHT_BATCHES", "4"))
+    # GLOBAL mode: group CAMs by size within windows of this many batches (0 = plain priority slicing)
+    size_affinity_window: int = int(os.getenv("AIM_SIZE_AFFINITY_WINDOW", "4"))
+    # GLOBAL mode: per-batch result checkpoints through the IO backend, resumed by the next run
+    checkpoints: bool = os.getenv("AIM_CHECKPOINTS", "True").lower() in ("true", "1", "t")
+    checkpoint_max_age_h: float = float(os.getenv("AIM_CHECKPOINT_MAX_AGE_H", "24"))
+    # GLOBAL mode: CAMs whose input fingerprint is unchanged since the last output are carried forward
+    incremental: bool = os.getenv("AIM_INCREMENTAL", "False").lower() in ("true", "1", "t")
     
     # Tuning Parameters (Overrides possible via GCS)
     page_size: int = int(os.getenv("AIM_PAGE_SIZE", "45"))
@@ -49,6 +62,17 @@ class AimConfig:
     parallel_segments: int = int(os.getenv("AIM_PARALLEL_SEGMENTS", "7"))
     requests_per_segment: int = int(os.getenv("AIM_REQUESTS_PER_SEGMENT", "4"))
     request_timeout_s: int = int(os.getenv("AIM_REQUEST_TIMEOUT_S", "900"))
+    stream_results: bool = os.getenv("AIM_STREAM_RESULTS", "False").lower() in ("true", "1", "t")
+    use_job_api: bool = os.getenv("AIM_USE_JOB_API", "False").lower() in ("true", "1", "t")
+    job_poll_interval_s: float = float(os.getenv("AIM_JOB_POLL_INTERVAL_S", "5"))
+    # Overall wait per job, and polls without new results before the job counts as stalled
+    job_max_wait_s: float = float(os.getenv("AIM_JOB_MAX_WAIT_S", "3600"))
+    job_stall_polls: int = int(os.getenv("AIM_JOB_STALL_POLLS", "60"))
+    run_priority: str = os.getenv("AIM_RUN_PRIORITY", "").strip()
+    max_overload_waits: int = int(os.getenv("AIM_MAX_OVERLOAD_WAITS", "20"))
+    max_retry_after_s: int = int(os.getenv("AIM_MAX_RETRY_AFTER_S", "300"))
+    # Runlist positions from this index on are ranked by the engine's local ranker (0 = off)
+    local_ranker_from: int = int(os.getenv("AIM_LOCAL_RANKER_FROM", "0"))
     
     goldilocks_zone_pct: int = int(os.getenv("AIM_GOLDILOCKS_ZONE_PCT", "15"))
     price_fluct_upper: float = float(os.getenv("AIM_PRICE_FLUCT_UPPER", "1.1"))
@@ -146,6 +170,19 @@ def _apply_overrides(conf: AimConfig, overrides: dict):
     set_if("RUN_MODE", "run_mode", lambda x: str(x).upper())
     set_if("TOTAL_OVERALL", "total_overall", int)
     set_if("BATCH_SIZE", "batch_size", int)
+    set_if("MAX_INFLIGHT_BATCHES", "max_inflight_batches", int)
+    set_if("SIZE_AFFINITY_WINDOW", "size_affinity_window", int)
+    set_if("CHECKPOINTS", "checkpoints", lambda x: str(x).lower() in ("true", "1", "t"))
+    set_if("CHECKPOINT_MAX_AGE_H", "checkpoint_max_age_h", float)
+    set_if("INCREMENTAL", "incremental", lambda x: str(x).lower() in ("true", "1", "t"))
+    set_if("OUTPUT_FORMAT", "output_format", lambda x: str(x).lower())
+    set_if("CAM_SKU_DELTA", "cam_sku_delta", lambda x: str(x).lower() in ("true", "1", "t"))
+    set_if("STREAM_RESULTS", "stream_results", lambda x: str(x).lower() in ("true", "1", "t"))
+    set_if("RUN_PRIORITY", "run_priority", lambda x: str(x).strip())
+    set_if("USE_JOB_API", "use_job_api", lambda x: str(x).lower() in ("true", "1", "t"))
+    set_if("JOB_MAX_WAIT_S", "job_max_wait_s", float)
+    set_if("JOB_STALL_POLLS", "job_stall_polls", int)
+    set_if("LOCAL_RANKER_FROM", "local_ranker_from", int)
     set_if("PRIORITY_RUNLIST_GCS_URI", "priority_runlist_gcs_uri", str)
     
     if "LIMIT_TO_SEGMENTS" in overrides:
@@ -11,6 +11,7 @@ class Context:
     io: Any       # IOBackend
     bq: Any       # BigQuery Client Wrapper
     waves: Any    # Waves Client
+    checkpoint: Any = None  # Stage 4 RunCheckpoint (GLOBAL mode)
     
     # helper to facilitate typing later if needed, 
     # but for now we keep it loose to avoid circular imports during setup
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import BinaryIO, List, Optional
 import os
 
 class IOBackend(ABC):
@@ -24,6 +24,13 @@ class IOBackend(ABC):
     def read_bytes(self, path: str) -> bytes:
         pass
 
+    @abstractmethod
+    def open_read(self, path: str) -> BinaryIO:
+        """
+        Opens 'path' for streamed binary reads (use as a context manager).
+        """
+        pass
+
     @abstractmethod
     def write_text(self, path: str, content: str):
         pass
@@ -32,6 +39,14 @@ class IOBackend(ABC):
     def write_bytes(self, path: str, content: bytes):
         pass
 
+    @abstractmethod
+    def open_write(self, path: str) -> BinaryIO:
+        """
+        Opens 'path' for streamed binary writes (use as a context manager).
+        The object is complete once the stream is closed.
+        """
+        pass
+
     @abstractmethod
     def exists(self, path: str) -> bool:
         pass
@@ -41,6 +41,11 @@ class GCSBackend(IOBackend):
         blob = self._get_blob(path)
         return blob.download_as_bytes()
 
+    def open_read(self, path: str):
+        # Ranged downloads in chunks as the stream is read
+        blob = self._get_blob(path)
+        return blob.open("rb")
+
     def write_text(self, path: str, content: str):
         blob = self._get_blob(path)
         blob.upload_from_string(content)
@@ -49,6 +54,11 @@ class GCSBackend(IOBackend):
         blob = self._get_blob(path)
         blob.upload_from_string(content)
 
+    def open_write(self, path: str):
+        # Resumable upload in chunks as the stream is written
+        blob = self._get_blob(path)
+        return blob.open("wb")
+
     def exists(self, path: str) -> bool:
         blob = self._get_blob(path)
         return blob.exists()
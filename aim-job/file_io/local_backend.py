@@ -35,6 +35,10 @@ class LocalBackend(IOBackend):
         with open(full, "rb") as f:
             return f.read()
 
+    def open_read(self, path: str):
+        full = self.resolve_path(path)
+        return open(full, "rb")
+
     def write_text(self, path: str, content: str):
         full = self.resolve_path(path)
         self.ensure_parent_dir(path)
@@ -47,6 +51,11 @@ class LocalBackend(IOBackend):
         with open(full, "wb") as f:
             f.write(content)
 
+    def open_write(self, path: str):
+        full = self.resolve_path(path)
+        self.ensure_parent_dir(path)
+        return open(full, "wb")
+
     def exists(self, path: str) -> bool:
         full = self.resolve_path(path)
         return os.path.exists(full)
@@ -0,0 +1,110 @@
+"""
+Compares the CSV and Parquet AIMData output paths: write/upload time, peak
+memory (resident memory above the pre-write level) and file size for
+synthetic AIMData frames. Each format runs in its own subprocess.
+
+BigQuery load times are logged by write_aim_data / write_cam_sku in cloud runs
+("⏱️ AIMData load (...)"); compare them with AIM_OUTPUT_FORMAT=csv vs parquet.
+
+Usage (from aim-job/):
+    python scripts/benchmark_outputs.py
+    python scripts/benchmark_outputs.py --rows 100000 1000000 --gcs-bucket my-bucket --gcs-prefix tmp/bench
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def synthetic_aim_df(n):
+    import pandas as pd
+    data = {"Vehicle": [f"FORD FOCUS {i % 5000}" for i in range(n)], "Size": ["205/55 R16"] * n}
+    for k in range(1, 5):
+        data[f"HB{k}"] = [str(10000000 + (i * 7 + k) % 40000) for i in range(n)]
+    for k in range(1, 21):
+        data[f"SKU{k}"] = [str(10000000 + (i * 13 + k) % 40000) if k < 18 else "" for i in range(n)]
+    return pd.DataFrame(data)
+
+
+class RssSampler(threading.Thread):
+    """Peak resident memory above the starting point, sampled every few ms (Linux /proc)."""
+
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.page = os.sysconf("SC_PAGE_SIZE")
+        self.base = self.peak = self.rss()
+        self.stopped = threading.Event()
+
+    def rss(self):
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * self.page
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, self.rss())
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return (max(self.peak, self.rss()) - self.base) / 2**20
+
+
+def run_one(fmt, n, args):
+    from file_io.gcs_backend import GCSBackend
+    from file_io.local_backend import LocalBackend
+    from stages.outputs import AIM_DATA_SCHEMA, write_parquet
+
+    df = synthetic_aim_df(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        io = GCSBackend(args.gcs_project, args.gcs_bucket, args.gcs_prefix) if args.gcs_bucket else LocalBackend(tmp)
+        path = f"output/benchmark_{n}.{fmt}"
+        sampler = RssSampler()
+        sampler.start()
+        t0 = time.perf_counter()
+        if fmt == "parquet":
+            write_parquet(io, path, df, AIM_DATA_SCHEMA)
+        else:
+            io.write_text(path, df.to_csv(index=False))
+        seconds = time.perf_counter() - t0
+        peak_mb = sampler.stop()
+        size = len(io.read_bytes(path)) if args.gcs_bucket else os.path.getsize(io.resolve_path(path))
+    return {
+        "seconds": seconds,
+        "peak_mb": peak_mb,
+        "file_mb": size / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CSV vs Parquet AIMData output")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--gcs-bucket", help="Upload through GCSBackend to this bucket instead of a temp dir")
+    parser.add_argument("--gcs-prefix", default="tmp/output-benchmark")
+    parser.add_argument("--gcs-project", default=os.getenv("GOOGLE_CLOUD_PROJECT", "bqsqltesting"))
+    parser.add_argument("--child", nargs=2, metavar=("FORMAT", "ROWS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_one(args.child[0], int(args.child[1]), args)))
+        return
+
+    print(f"{'rows':>10} {'format':>8} {'write s':>8} {'peak +MB':>9} {'file MB':>8}")
+    for n in args.rows:
+        for fmt in ("csv", "parquet"):
+            cmd = [sys.executable, __file__, "--child", fmt, str(n)]
+            if args.gcs_bucket:
+                cmd += ["--gcs-bucket", args.gcs_bucket, "--gcs-prefix", args.gcs_prefix, "--gcs-project", args.gcs_project]
+            r = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout.splitlines()[-1])
+            print(f"{n:>10,} {fmt:>8} {r['seconds']:>8.2f} {r['peak_mb']:>9.1f} {r['file_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
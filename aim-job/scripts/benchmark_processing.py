@@ -0,0 +1,298 @@
+"""
+Benchmarks process_stage4_results against the previous row-wise implementation
+(kept below as the golden reference) on synthetic Stage 4 results, and checks
+that both produce the same aim_df and cam_df (last_modified excluded).
+
+Usage (from aim-job/):
+    python scripts/benchmark_processing.py
+    python scripts/benchmark_processing.py --rows 10000 100000 1000000 --skip-legacy-above 1000000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+import re
+
+import pandas as pd
+import datetime as dt
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from stages.processing import process_stage4_results
+
+KNOWN_MAKES = {"FORD", "VAUXHALL", "LAND ROVER", "ROVER", "MERCEDES-BENZ", "MERCEDES", "VOLKSWAGEN", "KIA", "BMW", "MINI"}
+MODELS = ["FOCUS", "GRANDLAND X", "RANGE ROVER SPORT", "90", "C CLASS", "GOLF GTI", "RIO", "3 SERIES", "COOPER S"]
+SIZES = ["205/55 R16", "205/55R16", "225/40ZR18", "195/65 R15", "31x10.50 R15", "7.50 R16", "245/45 R19"]
+
+
+def synthetic_results(n, seed=7):
+    """n CAM results with the messiness seen in production: glued names, sizes in the vehicle,
+    duplicate and float-artefact SKUs, FormatError rows and repeated CAMs."""
+    rng = random.Random(seed)
+    items = []
+    for i in range(n):
+        make = rng.choice(sorted(KNOWN_MAKES))
+        vehicle = f"{make} {rng.choice(MODELS)}"
+        size = rng.choice(SIZES)
+        r = rng.random()
+        if r < 0.05:
+            vehicle = vehicle.replace(" ", "", 1)  # "ROVER90"
+        elif r < 0.08:
+            vehicle, size = f"{vehicle} {size}", ""  # size inside the vehicle
+        elif r < 0.10:
+            size = f"{rng.choice(MODELS)} {size}"  # model text inside the size
+        if rng.random() < 0.5:
+            vehicle = f"{vehicle} {i % (n // 3 + 1)}"  # mostly distinct CAMs, some repeats
+
+        pool = [str(10000000 + rng.randrange(4000)) for _ in range(30)]
+        skus = [rng.choice(pool) for _ in range(rng.randrange(16, 25))]
+        if rng.random() < 0.1:
+            skus[rng.randrange(len(skus))] = "-"
+        if rng.random() < 0.05:
+            skus[rng.randrange(len(skus))] += ".0"
+        if rng.random() < 0.02:
+            skus[rng.randrange(len(skus))] = "nan"
+        hbs = [rng.choice(pool) for _ in range(4)]
+        if rng.random() < 0.02:
+            hbs[rng.randrange(4)] = "FormatError"
+        if rng.random() < 0.01:
+            hbs[0] = None
+        items.append({"Vehicle": vehicle, "Size": size, "HB1": hbs[0], "HB2": hbs[1], "HB3": hbs[2],
+                      "HB4": hbs[3], "SKUs": skus, "success": True})
+    half = n // 2
+    return [("GLOBAL", items[:half]), ("GLOBAL", items[half:])]
+
+
+def assert_same_output(new, old):
+    (aim_new, cam_new), (aim_old, cam_old) = new, old
+    pd.testing.assert_frame_equal(aim_new, aim_old)
+    pd.testing.assert_frame_equal(cam_new.drop(columns=["last_modified"]), cam_old.drop(columns=["last_modified"]))
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and golden-check process_stage4_results")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--skip-legacy-above", type=int, default=100_000,
+                        help="Only time the new implementation above this many rows")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{'rows':>10} {'legacy s':>10} {'vectorized s':>13} {'speed-up':>9}  golden")
+    for n in args.rows:
+        results = synthetic_results(n)
+        new, t_new = timed(process_stage4_results, results, KNOWN_MAKES)
+        if args.skip_legacy_above is not None and n > args.skip_legacy_above:
+            print(f"{n:>10,} {'-':>10} {t_new:>13.2f} {'-':>9}  skipped")
+            continue
+        old, t_old = timed(legacy_process_stage4_results, results, KNOWN_MAKES)
+        assert_same_output(new, old)
+        print(f"{n:>10,} {t_old:>10.2f} {t_new:>13.2f} {t_old / t_new:>8.1f}x  identical")
+
+
+# --- Golden reference: the row-wise implementation and the helpers it used, verbatim ---
+
+def legacy_normalize_size(s: str) -> str:
+    s = str(s or "")
+    # ensure a space before R / ZR / VR, etc.
+    s = re.sub(r'(?i)(?<=\d)([A-Z]{0,2})R(?=\d)', r' \1R', s)
+    return re.sub(r'\s+', ' ', s).strip()
+
+def legacy_repair_vehicle_size(row):
+    SIZE_CORE_RE = re.compile(
+        r'''(?ix)
+        \b(
+            \d{3}/\d{2}\s*[A-Z]{0,2}R\d{2}            # 205/70R15, 225/40 ZR18
+          | \d{2}/\d{3,4}(?:\.\d{2})?\s*[A-Z]{0,2}R\d{2}  # 31/1050 R15, 31/10.50 R15
+          | \d{1,2}\.\d{2}\s*[A-Z]{0,2}R\d{2}         # 7.50 R16, 10.50 R15
+          | \d{1,2}x\d{2}\.\d{2}\s*[A-Z]{0,2}R\d{2}   # 31x10.50 R15
+        )\b
+        '''
+    )
+    v = str(row["Vehicle"] or "").strip()
+    s = str(row["Size"] or "").strip()
+
+    # If Size contains leading model text, move it into Vehicle
+    m = SIZE_CORE_RE.search(s)
+    if m:
+        prefix = s[:m.start()].strip()
+        core = m.group(1)
+        s = core
+        if prefix:
+            v = f"{v} {prefix}".strip()
+    else:
+        # Otherwise, try to extract size from Vehicle
+        vm = SIZE_CORE_RE.search(v)
+        if vm:
+            s = vm.group(1)
+            v = (v[:vm.start()] + " " + v[vm.end():]).strip()
+
+    # Tidy Vehicle: add space between letters and digits ("ROVER90" -> "ROVER 90")
+    v = re.sub(r'(?<=[A-Za-z])(?=\d)', ' ', v)
+    v = re.sub(r'\s+', ' ', v).strip()
+
+    # Normalize size spacing ("205/70R15" -> "205/70 R15", "225/40ZR18" -> "225/40 ZR18")
+    s = legacy_normalize_size(s)
+    return pd.Series({"Vehicle": v, "Size": s})
+
+def legacy_parse_vehicle_split(vehicle_str: str, known_makes: set):
+    """
+    Splits 'VAUXHALL GRANDLAND X' -> ('VAUXHALL', 'GRANDLAND X')
+    using the KNOWN_MAKES set.
+    """
+    v = str(vehicle_str or "").strip()
+    upper_v = v.upper()
+    
+    # longest makes first to avoid partial matches
+    sorted_makes = sorted(list(known_makes), key=len, reverse=True)
+    
+    best_make = "Unknown"
+    best_model = v
+
+    for make in sorted_makes:
+        if upper_v.startswith(make):
+            best_make = make
+            remainder = v[len(make):].strip()
+            best_model = remainder
+            break
+            
+    def to_title(s):
+        return " ".join([word.capitalize() for word in s.split()])
+
+    return to_title(best_make), to_title(best_model)
+
+def legacy_parse_size_split(size_str: str):
+    """
+    Splits '225/55 R18' or '225/55R18' -> ('225', '55', '18')
+    """
+    match = re.search(r'(\d{2,3})[/\\](\d{2,3}(?:\.\d+)?)\s*[A-Z]*\s*(\d{2})', str(size_str).upper())
+    if match:
+        return match.group(1), match.group(2), match.group(3)
+    return None, None, None
+
+
+def legacy_process_stage4_results(results, known_makes: set):
+    """
+    process_stage4_results before the vectorized rewrite (row-wise apply/iterrows),
+    kept verbatim as the golden reference.
+    """
+    rows = []
+    # results is list of (segment_id, items) or (mode, items)
+    for segment, items in results:
+        for it in items:
+            rows.append({
+                "Segment": segment,
+                "Vehicle": it.get("Vehicle"),
+                "Size": it.get("Size"),
+                "HB1": it.get("HB1"),
+                "HB2": it.get("HB2"),
+                "HB3": it.get("HB3"),
+                "HB4": it.get("HB4"),
+                "SKUs": " ".join(it.get("SKUs", [])),
+                "success": it.get("success", False),
+            })
+
+    df = pd.DataFrame(rows)
+    if df.empty:
+        logging.warning("⚠️ No results fetched in Stage 4.")
+        return None, None
+
+    # SUPPORT UP TO 24 SKUS NOW
+    SKU_COLS_24 = [f"SKU{i}" for i in range(1, 25)]
+    def explode_skus(s):
+        parts = str(s or "").split()
+        parts = parts[:24] + [""] * max(0, 24 - len(parts))
+        return pd.Series(parts, index=SKU_COLS_24)
+
+    sku_df = df["SKUs"].apply(explode_skus)
+    out = pd.concat([df[["Vehicle", "Size", "HB1", "HB2", "HB3", "HB4"]], sku_df], axis=1)
+
+    # Vehicle/Size repair
+    out[["Vehicle", "Size"]] = out.apply(legacy_repair_vehicle_size, axis=1)
+
+    # Replace duplicate SKUs
+    def _replace_duplicate_skus_in_row(row):
+        seen = set()
+        replaced = 0
+        for col in SKU_COLS_24:
+            val = row[col]
+            if pd.isna(val): continue
+            s = str(val).strip()
+            if not s or s == "-": continue
+            if s in seen:
+                row[col] = "-"
+                replaced += 1
+            else:
+                seen.add(s)
+        row["_dup_replaced"] = replaced
+        return row
+
+    out = out.apply(_replace_duplicate_skus_in_row, axis=1)
+    dup_cells_replaced = int(out["_dup_replaced"].sum())
+    out = out.drop(columns=["_dup_replaced"])
+    logging.info(f"🔁 Replaced {dup_cells_replaced} duplicate SKU cells with '-'.")
+
+    # Drop rows containing 'FormatError'
+    bad_mask = out.astype(str).apply(lambda col: col.str.contains(r'FormatError', na=False)).any(axis=1)
+    dropped_bad = int(bad_mask.sum())
+    out = out[~bad_mask].copy()
+    logging.info(f"🚮 Skipping {dropped_bad} rows containing 'FormatError'.")
+
+    # De-dup on Vehicle/Size
+    DEDUP_KEY_COLUMNS = ["Vehicle", "Size"]
+    before = len(out)
+    out = out.drop_duplicates(subset=DEDUP_KEY_COLUMNS, keep="first")
+    logging.info(f"🧹 Removed {before - len(out)} duplicate rows on {DEDUP_KEY_COLUMNS}.")
+
+    # --- PREPARE DATASET 1: AIMData ---
+    aim_cols = ["Vehicle","Size","HB1","HB2","HB3","HB4"] + [f"SKU{i}" for i in range(1, 21)]
+    aim_df = out[aim_cols].copy()
+
+    # --- PREPARE DATASET 2: CAM_SKU ---
+    cam_rows = []
+    # Force UTC aware for production/correctness
+    # But main.py legacy used: dt.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f UTC")
+    timestamp = dt.datetime.now(dt.timezone.utc).isoformat()
+    
+    for idx, row in out.iterrows():
+        make, model = legacy_parse_vehicle_split(row["Vehicle"], known_makes)
+        w, p, r = legacy_parse_size_split(row["Size"])
+        
+        new_row = {
+            "Vehicle": row["Vehicle"],
+            "Size": row["Size"],
+            "Make": make,
+            "Model": model,
+            "Width": w,
+            "Profile": p,
+            "Rim": r,
+            "last_modified": timestamp
+        }
+        for i in range(1, 25):
+            val = row.get(f"SKU{i}")
+            s_val = str(val) if val is not None else ""
+            if s_val == "-" or s_val.lower() == "nan": s_val = ""
+            if s_val.endswith(".0"): s_val = s_val[:-2] # pandas float/int artifact
+            s_val = s_val.strip()
+
+            if len(s_val) == 8:
+                 new_row[f"SKU{i}"] = s_val
+            else:
+                 new_row[f"SKU{i}"] = None
+            
+        cam_rows.append(new_row)
+        
+    cam_df = pd.DataFrame(cam_rows)
+    return aim_df, cam_df
+
+
+if __name__ == "__main__":
+    main()
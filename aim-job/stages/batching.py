@@ -0,0 +1,52 @@
+import logging
+from collections import OrderedDict
+from typing import List
+
+from stages.sizes import normalize_size
+
+
+def canonical_size(size) -> str:
+    return normalize_size(size).upper()
+
+
+def plan_batches(cams: List[dict], batch_size: int, window_batches: int = 0) -> List[List[int]]:
+    """
+    Splits a priority-ordered runlist into batches of runlist indices.
+
+    window_batches = 0 keeps plain priority slicing. Otherwise the runlist is
+    taken window_batches * batch_size CAMs at a time; inside a window, CAMs are
+    grouped by canonical size (sizes ordered by their best-priority CAM, CAMs
+    in priority order within a size) before slicing. A CAM never leaves its
+    window, so high-priority CAMs stay in the early batches, while each batch
+    carries far fewer distinct sizes for the engine's prefetch, shared size
+    tables and duplicate-table reuse.
+    """
+    batch_size = max(1, batch_size)
+    order = list(range(len(cams)))
+    if window_batches > 0:
+        window = window_batches * batch_size
+        order = []
+        for start in range(0, len(cams), window):
+            groups = OrderedDict()
+            for i in range(start, min(start + window, len(cams))):
+                groups.setdefault(canonical_size(cams[i].get("Size")), []).append(i)
+            for indices in groups.values():
+                order.extend(indices)
+    return [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def distinct_sizes(cams: List[dict], batch: List[int]) -> int:
+    return len({canonical_size(cams[i].get("Size")) for i in batch})
+
+
+def log_batch_plan(cams: List[dict], batches: List[List[int]]):
+    """Logs distinct sizes per batch next to what plain priority slicing would give."""
+    if not batches:
+        return
+    planned = [distinct_sizes(cams, b) for b in batches]
+    batch_size = max(len(b) for b in batches)
+    sliced = [len({canonical_size(c.get("Size")) for c in cams[i : i + batch_size]})
+              for i in range(0, len(cams), batch_size)]
+    logging.info(f"   🧩 Batch plan: {len(batches)} batch(es), distinct sizes per batch "
+                 f"avg {sum(planned) / len(planned):.1f} / max {max(planned)} "
+                 f"(priority slicing: avg {sum(sliced) / len(sliced):.1f} / max {max(sliced)}).")
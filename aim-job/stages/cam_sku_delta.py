@@ -0,0 +1,58 @@
+import io as _io
+import logging
+import re
+from typing import Dict, List, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Hash of every CAM_SKU row merged so far, stored next to the run outputs, one file per target table
+ROW_HASH_DIR = "output/cam_sku_row_hashes"
+ROW_HASH_SCHEMA = pa.schema([pa.field("key", pa.string()), pa.field("row_hash", pa.uint64())])
+HASHED_COLUMNS = ["Vehicle", "Size"] + [f"HB{i}" for i in range(1, 5)] + [f"SKU{i}" for i in range(1, 21)]
+
+
+def row_hash_path(table_id: str) -> str:
+    """Hash file of one CAM_SKU table ("project.dataset.table"), so test and prod targets never share hashes."""
+    return f"{ROW_HASH_DIR}/{re.sub(r'[^A-Za-z0-9_.-]', '_', table_id)}.parquet"
+
+
+def row_keys(df: pd.DataFrame) -> List[str]:
+    """'Vehicle|Size' key per staging row, as the MERGE builds it."""
+    return (df["Vehicle"].astype(str) + "|" + df["Size"].astype(str)).tolist()
+
+
+def row_hashes(df: pd.DataFrame) -> List[int]:
+    """64-bit hash of each recommendation row (keys, hotboxes, SKUs; last_modified excluded)."""
+    return pd.util.hash_pandas_object(df[HASHED_COLUMNS], index=False).tolist()
+
+
+def load_row_hashes(io, table_id: str) -> Dict[str, int]:
+    path = row_hash_path(table_id)
+    if not io.exists(path):
+        return {}
+    try:
+        table = pq.read_table(_io.BytesIO(io.read_bytes(path)))
+    except Exception as e:
+        logging.warning(f"⚠️ Unreadable CAM_SKU row hashes {path}, staging every row: {e}")
+        return {}
+    return dict(zip(table.column("key").to_pylist(), table.column("row_hash").to_pylist()))
+
+
+def changed_rows(df: pd.DataFrame, previous: Dict[str, int]) -> Tuple[pd.Series, List[str], List[int]]:
+    """(mask of new or changed rows, keys, hashes) of a prepared staging frame."""
+    keys = row_keys(df)
+    hashes = row_hashes(df)
+    mask = pd.Series([previous.get(k) != h for k, h in zip(keys, hashes)], index=df.index, dtype=bool)
+    return mask, keys, hashes
+
+
+def save_row_hashes(io, table_id: str, previous: Dict[str, int], keys: List[str], hashes: List[int]):
+    """Records this run's rows as merged (keys missing from the run keep their last hash)."""
+    merged = {**previous, **dict(zip(keys, hashes))}
+    table = pa.Table.from_pydict({"key": list(merged.keys()), "row_hash": list(merged.values())}, schema=ROW_HASH_SCHEMA)
+    path = row_hash_path(table_id)
+    with io.open_write(path) as f:
+        pq.write_table(table, f, compression="snappy")
+    logging.info(f"✅ Wrote {len(merged)} CAM_SKU row hashes to {path}")
@@ -0,0 +1,117 @@
+import datetime as dt
+import gzip
+import hashlib
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+CHECKPOINT_ROOT = "checkpoints/stage4"
+# Result fields kept in a checkpoint (everything processing and the cost report use)
+RESULT_FIELDS = ("Vehicle", "Size", "HB1", "HB2", "HB3", "HB4", "SKUs", "success", "error_code", "error_type",
+                 "usage", "ranker", "fallback_for", "reused_from", "input_fingerprint")
+
+
+def runlist_fingerprint(cams: List[dict], config) -> str:
+    """Identifies a GLOBAL run: the runlist CAMs plus every parameter sent with the batches."""
+    h = hashlib.sha256()
+    for cam in cams:
+        h.update(f"{cam.get('Vehicle')}|{cam.get('Size')}|{cam.get('ranker', '')}\n".encode())
+    params = (config.goldilocks_zone_pct, config.price_fluct_upper, config.price_fluct_lower,
+              config.brand_enhancer, config.model_enhancer, config.season, config.disable_search)
+    h.update(repr(params).encode())
+    return h.hexdigest()[:16]
+
+
+class RunCheckpoint:
+    """
+    Append-only checkpoint of a GLOBAL Stage 4 run through ctx.io (Local or GCS).
+
+    checkpoints/stage4/<fingerprint>/manifest.json   run id, size, status (running/complete)
+    checkpoints/stage4/<fingerprint>/<run_id>/<tag>.jsonl.gz
+        one immutable object per finished batch: a {"usage": ...} header line,
+        then one [runlist index, result] line per CAM.
+    """
+
+    def __init__(self, io, fingerprint: str, run_id: str, total_cams: int):
+        self.io = io
+        self.fingerprint = fingerprint
+        self.run_id = run_id
+        self.total_cams = total_cams
+        self.base = f"{CHECKPOINT_ROOT}/{fingerprint}"
+
+    @property
+    def manifest_path(self) -> str:
+        return f"{self.base}/manifest.json"
+
+    def _write_manifest(self, status: str, created: Optional[str] = None):
+        now = dt.datetime.now(dt.timezone.utc).isoformat()
+        self.io.write_text(self.manifest_path, json.dumps({
+            "fingerprint": self.fingerprint,
+            "run_id": self.run_id,
+            "total_cams": self.total_cams,
+            "status": status,
+            "created": created or now,
+            "updated": now,
+        }, indent=2))
+
+    @classmethod
+    def open(cls, io, cams: List[dict], config, new_run_id: str) -> Tuple["RunCheckpoint", Dict[int, dict], Dict[str, int]]:
+        """
+        Resumes the unfinished run of this runlist (same fingerprint, status running,
+        younger than checkpoint_max_age_h) or starts a new one.
+        Returns (checkpoint, successful results by runlist index, usage already spent).
+        """
+        fingerprint = runlist_fingerprint(cams, config)
+        probe = cls(io, fingerprint, new_run_id, len(cams))
+        manifest = None
+        if io.exists(probe.manifest_path):
+            try:
+                manifest = json.loads(io.read_text(probe.manifest_path))
+            except Exception as e:
+                logging.warning(f"   ⚠️ Unreadable checkpoint manifest {probe.manifest_path}: {e}")
+
+        if manifest and manifest.get("status") == "running" and manifest.get("total_cams") == len(cams):
+            created = dt.datetime.fromisoformat(manifest["created"])
+            age_h = (dt.datetime.now(dt.timezone.utc) - created).total_seconds() / 3600
+            if age_h <= config.checkpoint_max_age_h:
+                checkpoint = cls(io, fingerprint, manifest["run_id"], len(cams))
+                restored, usage = checkpoint.load()
+                checkpoint._write_manifest("running", created=manifest["created"])
+                logging.info(f"   ♻️ Resuming run {checkpoint.run_id}: {len(restored)}/{len(cams)} CAMs "
+                             f"already succeeded ({age_h:.1f}h old checkpoint).")
+                return checkpoint, restored, usage
+            logging.info(f"   ℹ️ Ignoring {age_h:.1f}h old unfinished checkpoint {manifest['run_id']}.")
+
+        probe._write_manifest("running")
+        return probe, {}, {}
+
+    def load(self) -> Tuple[Dict[int, dict], Dict[str, int]]:
+        """Successful results by runlist index (later batches win) and the summed usage of every batch."""
+        results, usage = {}, {}
+        for path in self.io.list_files(f"{self.base}/{self.run_id}/"):
+            if not path.endswith(".jsonl.gz"):
+                continue
+            try:
+                lines = gzip.decompress(self.io.read_bytes(path)).decode("utf-8").splitlines()
+            except Exception as e:
+                logging.warning(f"   ⚠️ Skipping unreadable checkpoint {path}: {e}")
+                continue
+            for k, v in json.loads(lines[0]).get("usage", {}).items():
+                usage[k] = usage.get(k, 0) + (v or 0)
+            for line in lines[1:]:
+                idx, res = json.loads(line)
+                if res and res.get("success"):
+                    results[idx] = res
+        return results, usage
+
+    def write_batch(self, tag: str, indices: List[int], results: List[Optional[dict]], usage: Dict[str, int]):
+        lines = [json.dumps({"usage": usage}, separators=(",", ":"))]
+        for idx, res in zip(indices, results):
+            compact = {k: res[k] for k in RESULT_FIELDS if res and k in res} if res else None
+            lines.append(json.dumps([idx, compact], separators=(",", ":")))
+        path = f"{self.base}/{self.run_id}/{tag}.jsonl.gz"
+        self.io.write_bytes(path, gzip.compress("\n".join(lines).encode("utf-8")))
+
+    def complete(self):
+        self._write_manifest("complete")
+        logging.info(f"   ✅ Checkpoint {self.run_id} marked complete.")
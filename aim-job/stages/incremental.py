@@ -0,0 +1,83 @@
+import gzip
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+# Stored next to the AIMData CSVs: the last run's successful results with their input fingerprints
+STATE_PATH = "output/aim_state.jsonl.gz"
+STATE_FIELDS = ("Vehicle", "Size", "HB1", "HB2", "HB3", "HB4", "SKUs", "success", "ranker", "fallback_for",
+                "input_fingerprint")
+FINGERPRINT_CHUNK = 2000
+
+
+def result_key(item: dict) -> Tuple[str, str]:
+    return (" ".join(str(item.get("Vehicle") or "").split()), " ".join(str(item.get("Size") or "").split()))
+
+
+def load_previous_results(io) -> Dict[Tuple[str, str], dict]:
+    """Previous run's fingerprinted results by (Vehicle, Size); empty if there is no usable state."""
+    if not io.exists(STATE_PATH):
+        return {}
+    try:
+        lines = gzip.decompress(io.read_bytes(STATE_PATH)).decode("utf-8").splitlines()
+    except Exception as e:
+        logging.warning(f"   ⚠️ Unreadable incremental state {STATE_PATH}: {e}")
+        return {}
+    previous = {}
+    for line in lines:
+        res = json.loads(line)
+        previous[result_key(res)] = res
+    return previous
+
+
+def save_results(io, results: List[Optional[dict]]) -> int:
+    """
+    Writes the successful, fingerprinted results of this run as the next run's state.
+    Local-ranker fallbacks and neighbour reuses are left out so they are regenerated.
+    """
+    lines = []
+    for res in results:
+        if not res or res.get("fallback_for") or res.get("reused_from"):
+            continue
+        if res.get("success") and res.get("input_fingerprint"):
+            lines.append(json.dumps({k: res[k] for k in STATE_FIELDS if k in res}, separators=(",", ":")))
+    io.write_bytes(STATE_PATH, gzip.compress("\n".join(lines).encode("utf-8")))
+    logging.info(f"✅ Wrote incremental state for {len(lines)} CAMs to {STATE_PATH}")
+    return len(lines)
+
+
+async def carry_forward_unchanged(ctx, client, cams: List[dict], results: List[Optional[dict]]) -> Dict[str, int]:
+    """
+    Fills results[k] with the previous output of every CAM still missing a result
+    whose input fingerprint (computed by the engine, no model calls) is unchanged.
+    Returns {"checked", "carried_forward"} for the cost report.
+    """
+    stats = {"checked": 0, "carried_forward": 0}
+    previous = load_previous_results(ctx.io)
+    if not previous:
+        logging.info("   ℹ️ Incremental: no previous state, every CAM is generated.")
+        return stats
+
+    todo = [k for k, r in enumerate(results) if r is None]
+    for start in range(0, len(todo), FINGERPRINT_CHUNK):
+        chunk = todo[start : start + FINGERPRINT_CHUNK]
+        try:
+            fingerprints = await ctx.waves.fetch_fingerprints(client, [cams[k] for k in chunk])
+        except Exception as e:
+            # Fingerprints are an optimisation: anything not checked is simply generated
+            logging.warning(f"   ⚠️ Incremental: fingerprint request failed, generating the rest: {e}")
+            break
+        stats["checked"] += len(chunk)
+        for k, fp in zip(chunk, fingerprints):
+            prev = previous.get(result_key(cams[k]))
+            if fp and prev and prev.get("success") and prev.get("input_fingerprint") == fp:
+                results[k] = dict(prev, Vehicle=cams[k]["Vehicle"], Size=cams[k]["Size"],
+                                  usage={}, carried_forward=True)
+                stats["carried_forward"] += 1
+
+    checked = stats["checked"]
+    if checked:
+        changed = checked - stats["carried_forward"]
+        logging.info(f"   ⏭️ Incremental: {stats['carried_forward']}/{checked} CAMs unchanged and carried forward, "
+                     f"{changed} changed or new ({changed / checked:.1%} change rate).")
+    return stats
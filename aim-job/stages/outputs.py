@@ -0,0 +1,37 @@
+import logging
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Rows per Parquet row group: each chunk is converted and streamed to the backend on its own
+PARQUET_CHUNK_ROWS = 50_000
+
+AIM_DATA_SCHEMA = pa.schema(
+    [pa.field(c, pa.string()) for c in ["Vehicle", "Size", "HB1", "HB2", "HB3", "HB4"]]
+    + [pa.field(f"SKU{i}", pa.string()) for i in range(1, 21)]
+)
+
+CAM_SKU_SCHEMA = pa.schema(
+    [pa.field("Vehicle", pa.string()), pa.field("Size", pa.string())]
+    + [pa.field(f"HB{i}", pa.string()) for i in range(1, 5)]
+    + [pa.field(f"SKU{i}", pa.string()) for i in range(1, 21)]
+    + [pa.field("last_modified", pa.timestamp("us", tz="UTC"))]
+)
+
+
+def write_parquet(io, path: str, df: pd.DataFrame, schema: pa.Schema, chunk_rows: int = PARQUET_CHUNK_ROWS) -> int:
+    """
+    Streams df to 'path' through the IO backend as Parquet with a typed schema,
+    one row group per chunk_rows rows (no full in-memory copy of the file).
+    Empty strings are written as NULL, as a CSV load would.
+    Returns the number of rows written.
+    """
+    df = df[schema.names]
+    with io.open_write(path) as f:
+        with pq.ParquetWriter(f, schema, compression="snappy") as writer:
+            for start in range(0, max(len(df), 1), chunk_rows):
+                chunk = df.iloc[start : start + chunk_rows]
+                chunk = chunk.mask(chunk.eq(""), None)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    logging.info(f"✅ Wrote {len(df)} rows as Parquet to {path}")
+    return len(df)
@@ -1,75 +1,109 @@
 import pandas as pd
+import numpy as np
 import logging
 import datetime as dt
-from stages.sizes import repair_vehicle_size, parse_vehicle_split, parse_size_split
+from stages.sizes import VehicleParser
 
-def process_stage4_results(results, known_makes: set):
+# SUPPORT UP TO 24 SKUS NOW
+SKU_COLS_24 = [f"SKU{i}" for i in range(1, 25)]
+HB_COLS = ["HB1", "HB2", "HB3", "HB4"]
+AIM_COLS = ["Vehicle", "Size"] + HB_COLS + [f"SKU{i}" for i in range(1, 21)]
+
+
+def explode_sku_matrix(sku_lists):
+    """(n, 24) object array of SKU strings, "" padded (the whitespace split of each joined SKU list)."""
+    n = len(sku_lists)
+    matrix = np.full((n, 24), "", dtype=object)
+    for i, skus in enumerate(sku_lists):
+        parts = " ".join(skus).split()[:24]
+        if parts:
+            matrix[i, :len(parts)] = parts
+    return matrix
+
+
+def replace_duplicate_skus(matrix):
+    """
+    Replaces repeated SKUs within a row with "-" (first occurrence kept, "" and "-"
+    ignored). Works on integer codes: a stable per-row sort puts equal SKUs next
+    to each other in column order, so every equal neighbour after the first is a duplicate.
+    Returns (matrix, cells replaced).
+    """
+    n, width = matrix.shape
+    if n == 0:
+        return matrix, 0
+    codes, _ = pd.factorize(matrix.ravel())
+    codes = codes.reshape(n, width)
+    ignored = (matrix == "") | (matrix == "-")
+    # Ignored cells get distinct negative codes so they never compare equal
+    codes = np.where(ignored, -1 - np.arange(width)[None, :], codes)
+
+    order = np.argsort(codes, axis=1, kind="stable")
+    ranked = np.take_along_axis(codes, order, axis=1)
+    dup_sorted = np.zeros_like(ranked, dtype=bool)
+    dup_sorted[:, 1:] = ranked[:, 1:] == ranked[:, :-1]
+    dup = np.zeros_like(dup_sorted)
+    np.put_along_axis(dup, order, dup_sorted, axis=1)
+
+    matrix = matrix.copy()
+    matrix[dup] = "-"
+    return matrix, int(dup.sum())
+
+
+def contains_format_error(values):
+    return pd.Series(values, dtype=object).astype(str).str.contains("FormatError", regex=False, na=False).to_numpy()
+
+
+def clean_cam_skus(matrix):
+    """CAM_SKU ids: '-', 'nan' and '.0' artefacts removed; only 8-character ids kept, else None."""
+    s = pd.Series(matrix.ravel(), dtype=object).astype(str)
+    s = s.mask(s.eq("-") | s.str.lower().eq("nan"), "")
+    s = s.mask(s.str.endswith(".0"), s.str[:-2])  # pandas float/int artifact
+    s = s.str.strip()
+    values = s.to_numpy(dtype=object)
+    values[(s.str.len() != 8).to_numpy()] = None
+    return values.reshape(matrix.shape)
+
+
+def process_stage4_results(results, known_makes):
     """
     Pure logic function to process API results into DataFrames.
+    known_makes is a set of makes or a VehicleParser built once for the run.
     Returns (aim_df, cam_df).
+    Column-wise on NumPy arrays: per-CAM work is limited to the SKU split and
+    one repair/parse per distinct Vehicle or Size.
     """
-    rows = []
     # results is list of (segment_id, items) or (mode, items)
-    for segment, items in results:
-        for it in items:
-            rows.append({
-                "Segment": segment,
-                "Vehicle": it.get("Vehicle"),
-                "Size": it.get("Size"),
-                "HB1": it.get("HB1"),
-                "HB2": it.get("HB2"),
-                "HB3": it.get("HB3"),
-                "HB4": it.get("HB4"),
-                "SKUs": " ".join(it.get("SKUs", [])),
-                "success": it.get("success", False),
-            })
-
-    df = pd.DataFrame(rows)
-    if df.empty:
+    items = [it for _, seg_items in results for it in seg_items]
+    if not items:
         logging.warning("⚠️ No results fetched in Stage 4.")
         return None, None
 
-    # SUPPORT UP TO 24 SKUS NOW
-    SKU_COLS_24 = [f"SKU{i}" for i in range(1, 25)]
-    def explode_skus(s):
-        parts = str(s or "").split()
-        parts = parts[:24] + [""] * max(0, 24 - len(parts))
-        return pd.Series(parts, index=SKU_COLS_24)
+    sku_matrix = explode_sku_matrix([it.get("SKUs", []) for it in items])
+    hb = {c: [it.get(c) for it in items] for c in HB_COLS}
 
-    sku_df = df["SKUs"].apply(explode_skus)
-    out = pd.concat([df[["Vehicle", "Size", "HB1", "HB2", "HB3", "HB4"]], sku_df], axis=1)
+    parser = known_makes if isinstance(known_makes, VehicleParser) else VehicleParser(known_makes)
 
     # Vehicle/Size repair
-    out[["Vehicle", "Size"]] = out.apply(repair_vehicle_size, axis=1)
+    repaired = [parser.repair(it.get("Vehicle"), it.get("Size")) for it in items]
+    vehicles = [v for v, _ in repaired]
+    sizes = [s for _, s in repaired]
 
     # Replace duplicate SKUs
-    def _replace_duplicate_skus_in_row(row):
-        seen = set()
-        replaced = 0
-        for col in SKU_COLS_24:
-            val = row[col]
-            if pd.isna(val): continue
-            s = str(val).strip()
-            if not s or s == "-": continue
-            if s in seen:
-                row[col] = "-"
-                replaced += 1
-            else:
-                seen.add(s)
-        row["_dup_replaced"] = replaced
-        return row
-
-    out = out.apply(_replace_duplicate_skus_in_row, axis=1)
-    dup_cells_replaced = int(out["_dup_replaced"].sum())
-    out = out.drop(columns=["_dup_replaced"])
+    sku_matrix, dup_cells_replaced = replace_duplicate_skus(sku_matrix)
     logging.info(f"🔁 Replaced {dup_cells_replaced} duplicate SKU cells with '-'.")
 
     # Drop rows containing 'FormatError'
-    bad_mask = out.astype(str).apply(lambda col: col.str.contains(r'FormatError', na=False)).any(axis=1)
+    bad_mask = contains_format_error(vehicles) | contains_format_error(sizes)
+    for c in HB_COLS:
+        bad_mask |= contains_format_error(hb[c])
+    bad_mask |= contains_format_error(sku_matrix.ravel()).reshape(sku_matrix.shape).any(axis=1)
     dropped_bad = int(bad_mask.sum())
-    out = out[~bad_mask].copy()
     logging.info(f"🚮 Skipping {dropped_bad} rows containing 'FormatError'.")
 
+    out = pd.DataFrame({"Vehicle": vehicles, "Size": sizes, **hb})
+    out = pd.concat([out, pd.DataFrame({c: sku_matrix[:, j].tolist() for j, c in enumerate(SKU_COLS_24)})], axis=1)
+    out = out[~bad_mask].copy()
+
     # De-dup on Vehicle/Size
     DEDUP_KEY_COLUMNS = ["Vehicle", "Size"]
     before = len(out)
@@ -77,42 +111,28 @@ def process_stage4_results(results, known_makes: set):
     logging.info(f"🧹 Removed {before - len(out)} duplicate rows on {DEDUP_KEY_COLUMNS}.")
 
     # --- PREPARE DATASET 1: AIMData ---
-    aim_cols = ["Vehicle","Size","HB1","HB2","HB3","HB4"] + [f"SKU{i}" for i in range(1, 21)]
-    aim_df = out[aim_cols].copy()
+    aim_df = out[AIM_COLS].copy()
 
     # --- PREPARE DATASET 2: CAM_SKU ---
-    cam_rows = []
     # Force UTC aware for production/correctness
     # But main.py legacy used: dt.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f UTC")
     timestamp = dt.datetime.now(dt.timezone.utc).isoformat()
-    
-    for idx, row in out.iterrows():
-        make, model = parse_vehicle_split(row["Vehicle"], known_makes)
-        w, p, r = parse_size_split(row["Size"])
-        
-        new_row = {
-            "Vehicle": row["Vehicle"],
-            "Size": row["Size"],
-            "Make": make,
-            "Model": model,
-            "Width": w,
-            "Profile": p,
-            "Rim": r,
-            "last_modified": timestamp
-        }
-        for i in range(1, 25):
-            val = row.get(f"SKU{i}")
-            s_val = str(val) if val is not None else ""
-            if s_val == "-" or s_val.lower() == "nan": s_val = ""
-            if s_val.endswith(".0"): s_val = s_val[:-2] # pandas float/int artifact
-            s_val = s_val.strip()
-
-            if len(s_val) == 8:
-                 new_row[f"SKU{i}"] = s_val
-            else:
-                 new_row[f"SKU{i}"] = None
-            
-        cam_rows.append(new_row)
-        
-    cam_df = pd.DataFrame(cam_rows)
+
+    kept_vehicles = out["Vehicle"].tolist()
+    kept_sizes = out["Size"].tolist()
+    makes = [parser.split_vehicle(v) for v in kept_vehicles]
+    parts = [parser.split_size(s) for s in kept_sizes]
+
+    cam_skus = clean_cam_skus(out[SKU_COLS_24].to_numpy(dtype=object))
+    cam_df = pd.DataFrame({
+        "Vehicle": kept_vehicles,
+        "Size": kept_sizes,
+        "Make": [m[0] for m in makes],
+        "Model": [m[1] for m in makes],
+        "Width": [p[0] for p in parts],
+        "Profile": [p[1] for p in parts],
+        "Rim": [p[2] for p in parts],
+        "last_modified": [timestamp] * len(kept_vehicles),
+        **{c: cam_skus[:, j].tolist() for j, c in enumerate(SKU_COLS_24)},
+    })
     return aim_df, cam_df
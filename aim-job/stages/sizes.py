@@ -1,25 +1,32 @@
 import re
 import pandas as pd
 
+RIM_SPACE_RE = re.compile(r'(?i)(?<=\d)([A-Z]{0,2})R(?=\d)')
+SPACES_RE = re.compile(r'\s+')
+SIZE_PARTS_RE = re.compile(r'(\d{2,3})[/\\](\d{2,3}(?:\.\d+)?)\s*[A-Z]*\s*(\d{2})')
+
 def normalize_size(s: str) -> str:
     s = str(s or "")
     # ensure a space before R / ZR / VR, etc.
-    s = re.sub(r'(?i)(?<=\d)([A-Z]{0,2})R(?=\d)', r' \1R', s)
-    return re.sub(r'\s+', ' ', s).strip()
+    s = RIM_SPACE_RE.sub(r' \1R', s)
+    return SPACES_RE.sub(' ', s).strip()
 
-def repair_vehicle_size(row):
-    SIZE_CORE_RE = re.compile(
-        r'''(?ix)
-        \b(
-            \d{3}/\d{2}\s*[A-Z]{0,2}R\d{2}            # 205/70R15, 225/40 ZR18
-          | \d{2}/\d{3,4}(?:\.\d{2})?\s*[A-Z]{0,2}R\d{2}  # 31/1050 R15, 31/10.50 R15
-          | \d{1,2}\.\d{2}\s*[A-Z]{0,2}R\d{2}         # 7.50 R16, 10.50 R15
-          | \d{1,2}x\d{2}\.\d{2}\s*[A-Z]{0,2}R\d{2}   # 31x10.50 R15
-        )\b
-        '''
-    )
-    v = str(row["Vehicle"] or "").strip()
-    s = str(row["Size"] or "").strip()
+SIZE_CORE_RE = re.compile(
+    r'''(?ix)
+    \b(
+        \d{3}/\d{2}\s*[A-Z]{0,2}R\d{2}            # 205/70R15, 225/40 ZR18
+      | \d{2}/\d{3,4}(?:\.\d{2})?\s*[A-Z]{0,2}R\d{2}  # 31/1050 R15, 31/10.50 R15
+      | \d{1,2}\.\d{2}\s*[A-Z]{0,2}R\d{2}         # 7.50 R16, 10.50 R15
+      | \d{1,2}x\d{2}\.\d{2}\s*[A-Z]{0,2}R\d{2}   # 31x10.50 R15
+    )\b
+    '''
+)
+LETTER_DIGIT_RE = re.compile(r'(?<=[A-Za-z])(?=\d)')
+
+def repair_pair(vehicle, size):
+    """Vehicle/Size repair for one CAM. Returns (vehicle, size) strings."""
+    v = str(vehicle or "").strip()
+    s = str(size or "").strip()
 
     # If Size contains leading model text, move it into Vehicle
     m = SIZE_CORE_RE.search(s)
@@ -37,44 +44,128 @@ def repair_vehicle_size(row):
             v = (v[:vm.start()] + " " + v[vm.end():]).strip()
 
     # Tidy Vehicle: add space between letters and digits ("ROVER90" -> "ROVER 90")
-    v = re.sub(r'(?<=[A-Za-z])(?=\d)', ' ', v)
-    v = re.sub(r'\s+', ' ', v).strip()
+    v = LETTER_DIGIT_RE.sub(' ', v)
+    v = SPACES_RE.sub(' ', v).strip()
 
     # Normalize size spacing ("205/70R15" -> "205/70 R15", "225/40ZR18" -> "225/40 ZR18")
     s = normalize_size(s)
+    return v, s
+
+def repair_vehicle_size(row):
+    v, s = repair_pair(row["Vehicle"], row["Size"])
     return pd.Series({"Vehicle": v, "Size": s})
 
+def canonicalize_runlist(df: pd.DataFrame):
+    """
+    Applies the Stage 4 output repair (repair_vehicle_size) to a runlist before
+    dispatch and drops duplicate Vehicle/Size rows, keeping the first (highest
+    priority) occurrence, so no duplicate costs a model call.
+    Returns (runlist, {"rows", "repaired", "duplicates_dropped"}).
+    """
+    report = {"rows": len(df), "repaired": 0, "duplicates_dropped": 0}
+    if df.empty:
+        return df, report
+
+    out = df.copy()
+    parser = VehicleParser()
+    repaired = [parser.repair(v, s) for v, s in zip(out["Vehicle"].tolist(), out["Size"].tolist())]
+    vehicles = [v for v, _ in repaired]
+    sizes = [s for _, s in repaired]
+    report["repaired"] = int(
+        ((out["Vehicle"].astype(str) != pd.Series(vehicles, index=out.index))
+         | (out["Size"].astype(str) != pd.Series(sizes, index=out.index))).sum()
+    )
+    out["Vehicle"] = vehicles
+    out["Size"] = sizes
+    out = out.drop_duplicates(subset=["Vehicle", "Size"], keep="first").reset_index(drop=True)
+    report["duplicates_dropped"] = report["rows"] - len(out)
+    return out, report
+
+def to_title(s):
+    return " ".join([word.capitalize() for word in s.split()])
+
 def parse_vehicle_split(vehicle_str: str, known_makes: set):
     """
     Splits 'VAUXHALL GRANDLAND X' -> ('VAUXHALL', 'GRANDLAND X')
-    using the KNOWN_MAKES set.
+    using the KNOWN_MAKES set. Builds a parser per call: use VehicleParser
+    for more than one vehicle.
     """
-    v = str(vehicle_str or "").strip()
-    upper_v = v.upper()
-    
-    # longest makes first to avoid partial matches
-    sorted_makes = sorted(list(known_makes), key=len, reverse=True)
-    
-    best_make = "Unknown"
-    best_model = v
-
-    for make in sorted_makes:
-        if upper_v.startswith(make):
-            best_make = make
-            remainder = v[len(make):].strip()
-            best_model = remainder
-            break
-            
-    def to_title(s):
-        return " ".join([word.capitalize() for word in s.split()])
-
-    return to_title(best_make), to_title(best_model)
+    return VehicleParser(known_makes).split_vehicle(vehicle_str)
 
 def parse_size_split(size_str: str):
     """
     Splits '225/55 R18' or '225/55R18' -> ('225', '55', '18')
     """
-    match = re.search(r'(\d{2,3})[/\\](\d{2,3}(?:\.\d+)?)\s*[A-Z]*\s*(\d{2})', str(size_str).upper())
+    match = SIZE_PARTS_RE.search(str(size_str).upper())
     if match:
         return match.group(1), match.group(2), match.group(3)
     return None, None, None
+
+class VehicleParser:
+    """
+    Vehicle/Size parsing for one run: a prefix trie over the known makes plus
+    per-string memos, so each distinct vehicle, size or Vehicle/Size pair is
+    parsed once and every repeat is a dict lookup.
+    """
+    _END = object()
+
+    def __init__(self, known_makes=()):
+        self._trie = {}
+        for make in known_makes:
+            node = self._trie
+            for ch in make:
+                node = node.setdefault(ch, {})
+            node[self._END] = make
+        self._vehicles = {}
+        self._sizes = {}
+        self._pairs = {}
+
+    def longest_make(self, upper_vehicle: str):
+        """Longest known make the (upper-cased) vehicle starts with, or None."""
+        node = self._trie
+        best = node.get(self._END)
+        for ch in upper_vehicle:
+            node = node.get(ch)
+            if node is None:
+                break
+            best = node.get(self._END, best)
+        return best
+
+    def split_vehicle(self, vehicle_str):
+        """parse_vehicle_split: (Make, Model) in title case, ("Unknown", vehicle) without a known make."""
+        try:
+            return self._vehicles[vehicle_str]
+        except KeyError:
+            pass
+        except TypeError:  # unhashable input
+            return self._split_vehicle(vehicle_str)
+        result = self._vehicles[vehicle_str] = self._split_vehicle(vehicle_str)
+        return result
+
+    def _split_vehicle(self, vehicle_str):
+        v = str(vehicle_str or "").strip()
+        make = self.longest_make(v.upper())
+        if make is None:
+            return to_title("Unknown"), to_title(v)
+        return to_title(make), to_title(v[len(make):].strip())
+
+    def split_size(self, size_str):
+        """parse_size_split, memoized."""
+        try:
+            return self._sizes[size_str]
+        except KeyError:
+            result = self._sizes[size_str] = parse_size_split(size_str)
+            return result
+        except TypeError:
+            return parse_size_split(size_str)
+
+    def repair(self, vehicle, size):
+        """repair_pair, memoized per (vehicle, size)."""
+        key = (vehicle, size)
+        try:
+            return self._pairs[key]
+        except KeyError:
+            result = self._pairs[key] = repair_pair(vehicle, size)
+            return result
+        except TypeError:
+            return repair_pair(vehicle, size)
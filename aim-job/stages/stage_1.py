@@ -1,8 +1,21 @@
+import csv
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List
 import pandas as pd
 from google.cloud import bigquery
 from context import Context
 
+# CarMakeModelSales files have no header row
+SALES_COLUMNS = ["ProductId", "CarMake", "CarModel", "Width", "Profile", "Rim", "Orders", "Units", "AvgPrice"]
+# Explicit load types per file; any other column loads as STRING.
+# tyrescore_algorithm.sql joins sales.ProductId (STRING) to CAST(ts.ProductId AS STRING).
+SALES_TYPES = {"Orders": "INT64", "Units": "INT64", "AvgPrice": "FLOAT64"}
+TYRESCORE_TYPES = {"ProductId": "INT64", "Price": "FLOAT64", "PrevPrice7": "FLOAT64", "PrevPrice28": "FLOAT64"}
+# Rows per chunk when scanning a file for its distinct makes
+MAKE_SCAN_CHUNK_ROWS = 100_000
+
 # Logic for Stage 1: Load S3/GCS files to BQ
 def run(ctx: Context):
     # KNOWN_MAKES acts as a side-output of Stage 1 to help parsing later.
@@ -51,66 +64,103 @@ def run(ctx: Context):
     # Car Sales
     f_sales = find_file("CarMakeModelSales")
     if f_sales:
-        # Original code reconstructed gs:// uri for BQ load.
-        # But we want to use 'load_table_from_dataframe' often for consistency/cleaning.
-        # Main.py read CSV into DF, cleaned columns, then uploaded.
-        data_jobs.append({"file": f_sales, "bq_table": "nexus_tyrescore.CarMakeModelSales"})
+        # The sales file has no header row
+        data_jobs.append({"file": f_sales, "bq_table": "nexus_tyrescore.CarMakeModelSales",
+                          "columns": SALES_COLUMNS, "types": SALES_TYPES})
     else:
         logging.warning("⚠️ Skipping CarMakeModelSales: file not found.")
 
     # Tyre Score
     f_score = find_file("TyreScore")
     if f_score:
-        data_jobs.append({"file": f_score, "bq_table": "nexus_tyrescore.TyreScore"})
+        data_jobs.append({"file": f_score, "bq_table": "nexus_tyrescore.TyreScore",
+                          "columns": None, "types": TYRESCORE_TYPES})
     else:
         logging.warning("⚠️ Skipping TyreScore: file not found.")
 
-    # BQ Config
+    known_makes = set()
+    if not data_jobs:
+        return known_makes
+
+    # BigQuery reads the files straight from GCS (explicit schema, no autodetect);
+    # both loads run in parallel while the makes are collected in a streaming pass.
+    with ThreadPoolExecutor(max_workers=len(data_jobs)) as pool:
+        futures = {}
+        for job in data_jobs:
+            try:
+                header = job["columns"] is None
+                columns = read_header(io_backend, job["file"]) if header else job["columns"]
+                job["make_index"] = columns.index("CarMake") if "CarMake" in columns else None
+                job["header"] = header
+                futures[pool.submit(load_file, ctx, io_backend, job, columns)] = job
+            except Exception as e:
+                logging.error(f"❌ Failed to process {job['file']}: {e}")
+
+        for job in futures.values():
+            if job["make_index"] is None:
+                continue
+            try:
+                makes = scan_makes(io_backend, job["file"], job["make_index"], job["header"])
+                known_makes.update(makes)
+                logging.info(f"✅ Captured {len(makes)} unique Makes.")
+            except Exception as e:
+                logging.error(f"❌ Failed to read makes from {job['file']}: {e}")
+
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"❌ Failed to process {futures[future]['file']}: {e}")
+
+    return known_makes
+
+
+def clean_column(col) -> str:
+    return str(col).strip().replace(' ', '_').replace('.', '_').replace('-', '_')
+
+
+def read_header(io_backend, path: str) -> List[str]:
+    """Cleaned column names from the first line of a CSV, without downloading the rest."""
+    with io_backend.open_read(path) as f:
+        first = f.readline().decode("utf-8-sig")
+    return [clean_column(c) for c in next(csv.reader([first]))]
+
+
+def build_schema(columns: List[str], types: dict) -> List[bigquery.SchemaField]:
+    return [bigquery.SchemaField(c, types.get(c, "STRING")) for c in columns]
+
+
+def load_file(ctx: Context, io_backend, job: dict, columns: List[str]):
+    from bq import load_table_from_file, load_table_from_uri
+
+    path = job["file"]
+    table_ref = f"{ctx.config.project_id}.{job['bq_table']}"
+    logging.info(f"📂 Processing {path} → {table_ref}")
     job_config = bigquery.LoadJobConfig(
         write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
-        autodetect=True,
         source_format=bigquery.SourceFormat.CSV,
-        skip_leading_rows=1, 
+        skip_leading_rows=1 if job["header"] else 0,
+        allow_quoted_newlines=True,
+        autodetect=False,
+        schema=build_schema(columns, job["types"]),
     )
+    t0 = time.monotonic()
+    if ctx.config.aim_mode == "local":
+        # No GCS URI for local files: stream the file to the load job instead
+        with io_backend.open_read(path) as f:
+            load_table_from_file(ctx.bq, f, table_ref, job_config, ctx.config.dry_run)
+    else:
+        uri = f"gs://{ctx.config.tyrescore_bucket}/{io_backend.resolve_path(path)}"
+        load_table_from_uri(ctx.bq, uri, table_ref, job_config, ctx.config.dry_run)
+    logging.info(f"⏱️ {job['bq_table']} load: {time.monotonic() - t0:.2f}s")
 
-    known_makes = set()
-
-    for job in data_jobs:
-        try:
-             path = job['file']
-             table = job['bq_table']
-             logging.info(f"📂 Processing {path} → {ctx.config.project_id}.{table}")
-             
-             # Read content via IO Backend
-             content = io_backend.read_text(path)
-             from io import StringIO
-             
-             if "CarMakeModelSales" in path:
-                 cols = ["ProductId", "CarMake", "CarModel", "Width", "Profile", "Rim", "Orders", "Units", "AvgPrice"]
-                 df = pd.read_csv(StringIO(content), header=None, names=cols)
-             else:
-                 df = pd.read_csv(StringIO(content), header=0)
-
-             # Clean cols
-             df.columns = [
-                str(col).strip().replace(' ', '_').replace('.', '_').replace('-', '_')
-                for col in df.columns
-             ]
-             
-             # Capture Makes
-             if "CarMake" in df.columns:
-                 uniques = df["CarMake"].dropna().unique()
-                 for mk in uniques:
-                     known_makes.add(str(mk).strip().upper())
-                 logging.info(f"✅ Captured {len(uniques)} unique Makes.")
-
-             # Load to BQ
-             # We use our bq wrapper
-             from bq import load_table_from_dataframe
-             table_ref = f"{ctx.config.project_id}.{table}"
-             load_table_from_dataframe(ctx.bq, df, table_ref, job_config, ctx.config.dry_run)
-
-        except Exception as e:
-            logging.error(f"❌ Failed to process {job['file']}: {e}")
 
-    return known_makes
+def scan_makes(io_backend, path: str, make_index: int, header: bool, chunk_rows: int = MAKE_SCAN_CHUNK_ROWS) -> set:
+    """Distinct upper-cased CarMake values, reading only that column chunk by chunk."""
+    makes = set()
+    with io_backend.open_read(path) as f:
+        reader = pd.read_csv(f, header=0 if header else None, usecols=[make_index], dtype=str, chunksize=chunk_rows)
+        for chunk in reader:
+            col = chunk.iloc[:, 0].dropna()
+            makes.update(col.str.strip().str.upper().unique())
+    return makes
@@ -3,13 +3,21 @@ import logging
 import math
 import os
 import tempfile
+import time
 import json
 import pandas as pd
 import datetime as dt
 from google.cloud import bigquery
 from context import Context
 from io_manager import load_priority_runlist
+from stages.checkpoint import RunCheckpoint
+from stages.incremental import carry_forward_unchanged, save_results
+from stages.cam_sku_delta import changed_rows, load_row_hashes, save_row_hashes
+from stages.batching import distinct_sizes, log_batch_plan, plan_batches
+from stages.outputs import AIM_DATA_SCHEMA, CAM_SKU_SCHEMA, write_parquet
 from stages.processing import process_stage4_results
+from stages.sizes import VehicleParser, canonicalize_runlist
+from clients.waves import PartialBatchError
 
 def build_cam_sku_df_from_aim(aim_df: pd.DataFrame) -> pd.DataFrame:
     required = ["Vehicle", "Size"] + [f"HB{i}" for i in range(1, 5)] + [f"SKU{i}" for i in range(1, 21)]
@@ -54,8 +62,8 @@ async def run(ctx: Context, known_makes: set):
         else:
              results = await run_per_segment_mode(ctx, client)
 
-    # Process Results
-    aim_df, _ = process_stage4_results(results, known_makes)
+    # Process Results (one parser per run: makes trie + per-string memos)
+    aim_df, _ = process_stage4_results(results, VehicleParser(known_makes))
 
     if aim_df is None:
         logging.warning("⚠️ Skipping upload/load for Stage 4 due to empty results.")
@@ -67,6 +75,13 @@ async def run(ctx: Context, known_makes: set):
     cam_df = build_cam_sku_df_from_aim(aim_df)
     write_cam_sku(ctx, cam_df)
 
+    if ctx.config.run_mode == "GLOBAL" and ctx.config.incremental:
+        save_results(ctx.io, results[0][1])
+
+    # Outputs are written: the next run of this runlist starts fresh
+    if getattr(ctx, "checkpoint", None):
+        ctx.checkpoint.complete()
+
 
 
 async def run_per_segment_mode(ctx: Context, client):
@@ -128,64 +143,242 @@ async def refresh_auth(ctx: Context, client: httpx.AsyncClient):
 
 
 
-async def fetch_batch_with_retry(ctx: Context, client: httpx.AsyncClient, run_id: str, batch: list, max_retries: int = 3) -> dict:
+def retry_after_seconds(response, cap: float = 300):
+    """
+    Parses a Retry-After header (delta-seconds or HTTP date).
+    Returns None when the header is missing or unparseable.
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            from email.utils import parsedate_to_datetime
+            when = parsedate_to_datetime(value)
+            seconds = (when - dt.datetime.now(dt.timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, seconds), cap)
+
+
+async def fetch_batch_with_retry(ctx: Context, client: httpx.AsyncClient, run_id: str, batch: list, max_retries: int = 3,
+                                 on_result=None) -> dict:
     """
     Robust fetch with:
     1. Token Refresh on 401 (max 2 attempts)
     2. Exponential Backoff on 429/5xx (max_retries)
+       A 429 carrying Retry-After (engine admission control) waits as told and
+       does not use up max_retries; those waits are bounded by max_overload_waits.
+    3. Partial streams: results that arrived before a dropped connection are kept
+       and only the remaining CAMs are re-sent.
+    on_result(index, result) is forwarded with indices relative to `batch`.
     """
     attempt = 0
     auth_refreshes = 0
+    overload_waits = 0
+    completed = {}  # batch index -> result, from interrupted streams
+    partial_usage = {}
     
-    while attempt <= max_retries:
-        try:
-            return await ctx.waves.fetch_batch(client, run_id, batch, log_file_backend=ctx.io)
+    try:
+        while attempt <= max_retries:
+            pending = [i for i in range(len(batch)) if i not in completed]
+
+            def record(j, res, pending=pending):
+                if on_result:
+                    on_result(pending[j], res)
+
+            try:
+                resp = await ctx.waves.fetch_batch(
+                    client, run_id, [batch[i] for i in pending], log_file_backend=ctx.io, on_result=record
+                )
+                if not completed:
+                    return resp
+
+                # Stitch the earlier partial stream(s) together with this response
+                for j, res in enumerate(resp.get("results", [])):
+                    completed[pending[j]] = res
+                usage = dict(resp.get("usage", {}))
+                for k, v in partial_usage.items():
+                    usage[k] = usage.get(k, 0) + v
+                return {**resp, "results": [completed.get(i) for i in range(len(batch))], "usage": usage}
+
+            except PartialBatchError as e:
+                for j, res in e.results.items():
+                    completed[pending[j]] = res
+                for k, v in e.usage.items():
+                    partial_usage[k] = partial_usage.get(k, 0) + v
+                if attempt < max_retries:
+                    delay = 2 ** attempt
+                    logging.warning(f"   ⚠️ Stream interrupted ({len(completed)}/{len(batch)} CAMs received): {e.cause}. "
+                                    f"Re-sending the rest in {delay}s (Attempt {attempt+1}/{max_retries})...")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                # Re-key to the full batch so the caller keeps everything that arrived
+                raise PartialBatchError(dict(completed), dict(partial_usage), e.cause) from e
             
-        except httpx.HTTPStatusError as e:
-            code = e.response.status_code
+            except httpx.HTTPStatusError as e:
+                code = e.response.status_code
+            
+                # Case 1: 401 Unauthorized -> Refresh Token
+                if code == 401:
+                    if auth_refreshes < 2:
+                        logging.warning(f"   ⚠️ 401 Unauthorized. Refreshing Token (Attempt {auth_refreshes+1}/2)...")
+                        try:
+                            await refresh_auth(ctx, client)
+                            auth_refreshes += 1
+                            # Do NOT increment 'attempt' counter for auth issues, 
+                            # so we still have full retries for other errors.
+                            continue 
+                        except Exception as auth_e:
+                            logging.error(f"   ❌ Failed to refresh auth: {auth_e}")
+                            raise # Fatal if we can't refresh
+                    else:
+                        logging.error("   ❌ Max auth refreshes exceeded.")
+                        raise
+
+                # Case 2: 429 with Retry-After -> engine is queueing us, wait as told
+                if code == 429:
+                    wait = retry_after_seconds(e.response, ctx.config.max_retry_after_s)
+                    if wait is not None and overload_waits < ctx.config.max_overload_waits:
+                        overload_waits += 1
+                        logging.warning(f"   🚦 Engine saturated (429). Retry-After {wait:.0f}s "
+                                        f"(Wait {overload_waits}/{ctx.config.max_overload_waits})...")
+                        await asyncio.sleep(wait)
+                        continue
+
+                # Case 3: 429/5xx -> Backoff and Retry
+                if code == 429 or 500 <= code < 600:
+                    if attempt < max_retries:
+                        delay = 2 ** attempt # 1s, 2s, 4s...
+                        logging.warning(f"   ⚠️ HTTP {code} Error. Retrying in {delay}s (Attempt {attempt+1}/{max_retries})...")
+                        await asyncio.sleep(delay)
+                        attempt += 1
+                        continue
+                    else:
+                        raise # Max retries hit
+
+                # Other Client Errors (400, 403, 404) -> Raise immediately
+                raise
             
-            # Case 1: 401 Unauthorized -> Refresh Token
-            if code == 401:
-                if auth_refreshes < 2:
-                    logging.warning(f"   ⚠️ 401 Unauthorized. Refreshing Token (Attempt {auth_refreshes+1}/2)...")
-                    try:
-                        await refresh_auth(ctx, client)
-                        auth_refreshes += 1
-                        # Do NOT increment 'attempt' counter for auth issues, 
-                        # so we still have full retries for other errors.
-                        continue 
-                    except Exception as auth_e:
-                        logging.error(f"   ❌ Failed to refresh auth: {auth_e}")
-                        raise # Fatal if we can't refresh
-                else:
-                    logging.error("   ❌ Max auth refreshes exceeded.")
-                    raise
-
-            # Case 2: 429/5xx -> Backoff and Retry
-            if code == 429 or 500 <= code < 600:
+            except (httpx.RequestError, httpx.TimeoutException) as e:
+                # Case 4: Network/Timeout -> Backoff and Retry
                 if attempt < max_retries:
-                    delay = 2 ** attempt # 1s, 2s, 4s...
-                    logging.warning(f"   ⚠️ HTTP {code} Error. Retrying in {delay}s (Attempt {attempt+1}/{max_retries})...")
+                    delay = 2 ** attempt
+                    logging.warning(f"   ⚠️ Transport/Timeout Error: {e}. Retrying in {delay}s (Attempt {attempt+1}/{max_retries})...")
                     await asyncio.sleep(delay)
                     attempt += 1
                     continue
-                else:
-                    raise # Max retries hit
+                raise
+    except (httpx.HTTPStatusError, httpx.RequestError) as e:
+        # Retries ran out after an interrupted stream: keep the CAMs that already arrived
+        if completed:
+            raise PartialBatchError(dict(completed), dict(partial_usage), e) from e
+        raise
 
-            # Other Client Errors (400, 403, 404) -> Raise immediately
-            raise
-            
-        except (httpx.RequestError, httpx.TimeoutException) as e:
-            # Case 3: Network/Timeout -> Backoff and Retry
-            if attempt < max_retries:
-                delay = 2 ** attempt
-                logging.warning(f"   ⚠️ Transport/Timeout Error: {e}. Retrying in {delay}s (Attempt {attempt+1}/{max_retries})...")
-                await asyncio.sleep(delay)
+    raise RuntimeError("Max retries exceeded unexpectedly")
+
+
+async def fetch_batch(ctx: Context, client: httpx.AsyncClient, run_id: str, batch: list, on_result=None) -> dict:
+    """One batch through the async job API or a (streamed) batch request, per config."""
+    if ctx.config.use_job_api:
+        return await fetch_batch_via_job(ctx, client, run_id, batch, on_result=on_result)
+    return await fetch_batch_with_retry(ctx, client, run_id, batch, on_result=on_result)
+
+
+async def _job_call(ctx: Context, client: httpx.AsyncClient, call, max_retries: int = 5):
+    """Runs one job-API call with auth refresh and backoff on transient errors."""
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except httpx.HTTPStatusError as e:
+            code = e.response.status_code
+            if code == 401 and attempt < max_retries:
+                await refresh_auth(ctx, client)
+            elif not (code == 429 or 500 <= code < 600) or attempt >= max_retries:
+                raise
+            wait = retry_after_seconds(e.response, ctx.config.max_retry_after_s) if code == 429 else None
+            if wait is not None:
+                await asyncio.sleep(wait)
                 attempt += 1
                 continue
-            raise
+        except (httpx.RequestError, httpx.TimeoutException):
+            if attempt >= max_retries:
+                raise
+        await asyncio.sleep(2 ** attempt)
+        attempt += 1
 
-    raise RuntimeError("Max retries exceeded unexpectedly")
+
+async def fetch_batch_via_job(ctx: Context, client: httpx.AsyncClient, run_id: str, batch: list,
+                              on_result=None, max_resumes: int = 1) -> dict:
+    """
+    Runs a batch through the engine's async job API instead of one long request.
+    Results are paged in by cursor while the engine works, so neither the engine
+    deadline nor a dropped connection loses finished CAMs; failed CAMs are
+    re-run engine-side with resume (finished CAMs are never redone).
+    A job with no new results for job_stall_polls polls (e.g. the engine restarted
+    and its worker is gone) is resumed once; a job still stalled, or still
+    unfinished after job_max_wait_s, raises TimeoutError.
+    Returns the same shape as fetch_batch.
+    """
+    job_id = await _job_call(ctx, client, lambda: ctx.waves.submit_job(client, run_id, batch))
+    logging.info(f"   🧾 Submitted job {job_id} ({len(batch)} CAMs)")
+
+    results = [None] * len(batch)
+    cursor = 0
+    resumes = 0
+    deadline = time.monotonic() + ctx.config.job_max_wait_s
+    idle_polls = 0
+
+    async def drain():
+        nonlocal cursor
+        while True:
+            page = await _job_call(ctx, client, lambda: ctx.waves.fetch_job_results(client, job_id, cursor))
+            for item in page.get("results", []):
+                idx, res = item["index"], item["result"]
+                results[idx] = res
+                if on_result:
+                    on_result(idx, res)
+            cursor = page.get("next_cursor", cursor)
+            if not page.get("has_more"):
+                return
+
+    while True:
+        await asyncio.sleep(ctx.config.job_poll_interval_s)
+        seen = cursor
+        await drain()
+        job = await _job_call(ctx, client, lambda: ctx.waves.get_job(client, job_id))
+        if job.get("pending", 0) > 0 and job.get("status") != "failed":
+            idle_polls = 0 if cursor != seen else idle_polls + 1
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Job {job_id} unfinished after {ctx.config.job_max_wait_s:.0f}s "
+                                   f"({job.get('pending')} CAMs pending)")
+            if idle_polls < ctx.config.job_stall_polls:
+                continue
+            if resumes >= max_resumes:
+                raise TimeoutError(f"Job {job_id} stalled: no results for {idle_polls} polls "
+                                   f"({job.get('pending')} CAMs pending)")
+            logging.warning(f"   ⚠️ Job {job_id} stalled ({idle_polls} polls without results), resuming it")
+            idle_polls = 0
+
+        # Finished (or the engine-side worker died): pick up the last results
+        await drain()
+        if (job.get("failed", 0) > 0 or job.get("pending", 0) > 0) and resumes < max_resumes:
+            requeued = await _job_call(ctx, client, lambda: ctx.waves.resume_job(client, job_id))
+            resumes += 1
+            logging.info(f"   🔁 Job {job_id}: re-running {len(requeued)} failed CAMs")
+            continue
+        break
+
+    usage = {"prompt_token_count": 0, "candidates_token_count": 0, "total_token_count": 0,
+             "cached_content_token_count": 0}
+    for res in results:
+        for k in usage:
+            usage[k] += ((res or {}).get("usage") or {}).get(k, 0) or 0
+    return {"run_id": run_id, "job_id": job_id, "results": results, "usage": usage}
 
 
 async def run_global_mode(ctx: Context, client):
@@ -196,107 +389,194 @@ async def run_global_mode(ctx: Context, client):
         raise RuntimeError("Priority runlist is empty or failed to load.")
 
     run_df = run_df.head(ctx.config.total_overall)
+
+    # Same Vehicle/Size repair as the output, before dispatch: duplicates cost no model call
+    run_df, runlist_report = canonicalize_runlist(run_df)
+    logging.info(f"   🧹 Runlist: {runlist_report['repaired']} rows canonicalised, "
+                 f"{runlist_report['duplicates_dropped']} duplicates dropped "
+                 f"({runlist_report['duplicates_dropped']} model calls avoided).")
     total_cams = len(run_df)
     logging.info(f"🚀 Starting GLOBAL mode for top {total_cams} CAMs (Batch size: {ctx.config.batch_size})")
     
     run_id = f"global_{datetime_now_str()}"
     all_cams = run_df[["Vehicle", "Size"]].to_dict("records")
-    batches = [all_cams[i : i + ctx.config.batch_size] for i in range(0, total_cams, ctx.config.batch_size)]
-    
+    if 0 < ctx.config.local_ranker_from < total_cams:
+        # Low-priority runlist tail: answered by the engine's local ranker, no model call
+        for cam in all_cams[ctx.config.local_ranker_from:]:
+            cam["ranker"] = "local"
+        logging.info(f"   🧮 CAMs {ctx.config.local_ranker_from + 1}-{total_cams} use the local ranker.")
+
     all_results = [None] * total_cams
-    total_usage = {"prompt_token_count": 0, "candidates_token_count": 0, "total_token_count": 0}
+    total_usage = {"prompt_token_count": 0, "candidates_token_count": 0, "total_token_count": 0,
+                   "cached_content_token_count": 0}
+
+    # Checkpoints: an unfinished run of the same runlist is resumed, and only CAMs
+    # without a successful result are sent again
+    checkpoint = None
+    if ctx.config.checkpoints:
+        checkpoint, restored, restored_usage = RunCheckpoint.open(ctx.io, all_cams, ctx.config, run_id)
+        run_id = checkpoint.run_id
+        for k, res in restored.items():
+            all_results[k] = res
+        for k in total_usage: total_usage[k] += restored_usage.get(k, 0)
+    ctx.checkpoint = checkpoint
+    resumed = sum(1 for r in all_results if r is not None)
+    attempt = datetime_now_str()
+
+    # Incremental runs: only changed or failed CAMs are dispatched
+    incremental = None
+    if ctx.config.incremental:
+        incremental = await carry_forward_unchanged(ctx, client, all_cams, all_results)
+
+    # Batches of runlist indices, grouped by size within priority windows
+    todo = [k for k in range(total_cams) if all_results[k] is None]
+    todo_cams = [all_cams[k] for k in todo]
+    planned = plan_batches(todo_cams, ctx.config.batch_size, ctx.config.size_affinity_window)
+    log_batch_plan(todo_cams, planned)
+    batches = [[todo[j] for j in b] for b in planned]
+
+    # Up to max_inflight_batches batches run at once (the engine autoscales and
+    # pushes back with 429 + Retry-After when saturated); results are placed by index.
+    max_inflight = max(1, ctx.config.max_inflight_batches)
+    inflight = asyncio.Semaphore(max_inflight)
+    logging.info(f"   🚦 Up to {max_inflight} batch(es) in flight.")
+    t_start = time.monotonic()
+
+    async def save_checkpoint(tag, batch_idx, usage):
+        if checkpoint is None:
+            return
+        try:
+            await asyncio.to_thread(checkpoint.write_batch, f"{attempt}_{tag}", batch_idx,
+                                    [all_results[k] for k in batch_idx], usage)
+        except Exception as e:
+            logging.warning(f"   ⚠️ Failed to write checkpoint {tag}: {e}")
+
+    def report_progress():
+        done = [r for r in all_results if r is not None]
+        ctx.tracker.update(progress={
+            "attempted": len(done),
+            "succeeded": sum(1 for r in done if r.get("success")),
+            "failed": sum(1 for r in done if not r.get("success"))
+        })
+
+    streamed = 0  # CAM results placed by on_result, across all batches
+
+    async def run_batch(i, batch_idx):
+        batch = [all_cams[k] for k in batch_idx]
+
+        # Place each CAM result as it arrives so progress (and partial results)
+        # survive a dropped stream.
+        def on_result(j, res):
+            nonlocal streamed
+            all_results[batch_idx[j]] = res
+            streamed += 1
+            if streamed % 50 == 0:
+                report_progress()
+
+        batch_usage = {}
+        async with inflight:
+            logging.info(f"   📦 Processing batch {i+1}/{len(batches)} "
+                         f"({len(batch)} CAMs, {distinct_sizes(all_cams, batch_idx)} sizes)...")
+            ctx.tracker.update(last_log_line=f"Processing batch {i+1}/{len(batches)}")
+            try:
+                batch_resp = await fetch_batch(ctx, client, run_id, batch, on_result=on_result)
 
-    # Processing Loop
-    for i, batch in enumerate(batches):
-         logging.info(f"   📦 Processing batch {i+1}/{len(batches)}...")
-         ctx.tracker.update(last_log_line=f"Processing batch {i+1}/{len(batches)}")
-         
-         start_idx = i * ctx.config.batch_size
-         try:
-             # Use ctx.io for logging if local mode
-             batch_resp = await fetch_batch_with_retry(ctx, client, run_id, batch)
-             
-             # Aggregate results
-             b_results = batch_resp.get("results", [])
-             for j, res in enumerate(b_results):
-                 all_results[start_idx + j] = res
-             
-             usage = batch_resp.get("usage", {})
-             for k in total_usage: total_usage[k] += usage.get(k, 0)
-
-         except Exception as e:
-             logging.error(f"   ❌ Batch failed after retries: {e}")
-             for j, cam in enumerate(batch):
-                 all_results[start_idx + j] = {"Vehicle": cam["Vehicle"], "Size": cam["Size"], "success": False, "error_code": "BATCH_FAILED"}
-
-         # Progress
-         processed = min((i + 1) * ctx.config.batch_size, total_cams)
-         succeeded = sum(1 for r in all_results[:processed] if r and r.get("success"))
-         failed = sum(1 for r in all_results[:processed] if r and not r.get("success"))
-
-         # Batch specific stats
-         batch_results = all_results[start_idx : start_idx + len(batch)]
-         batch_success = sum(1 for r in batch_results if r and r.get("success"))
-         logging.info(f"   📊 Batch Result: {batch_success}/{len(batch)} CAMs succeeded.")
-         
-         if failed > 0:
-             # Log first few errors to help debugging
-             start_fail_chk = i * ctx.config.batch_size
-             end_fail_chk = min((i + 1) * ctx.config.batch_size, total_cams)
-             errors_logged = 0
-             for k in range(start_fail_chk, end_fail_chk):
-                 res = all_results[k]
-                 if res and not res.get("success"):
-                     err = res.get("error_code") or res.get("error_type") or "Unknown Error"
-                     logging.warning(f"   ⚠️ Item {k} ({res.get('Vehicle', '?')}/{res.get('Size', '?')}) failed: {err}")
-                     errors_logged += 1
-                     if errors_logged >= 3: break # Don't spam
-         
-         ctx.tracker.update(progress={
-             "attempted": processed,
-             "succeeded": succeeded,
-             "failed": failed
-         })
+                # Aggregate results
+                for j, res in enumerate(batch_resp.get("results", [])):
+                    all_results[batch_idx[j]] = res
+                batch_usage = batch_resp.get("usage", {})
+                for k in total_usage: total_usage[k] += batch_usage.get(k, 0)
+
+            except Exception as e:
+                logging.error(f"   ❌ Batch {i+1} failed after retries: {e}")
+                partial = e.results if isinstance(e, PartialBatchError) else {}
+                if partial:
+                    batch_usage = e.usage
+                    for k in total_usage: total_usage[k] += e.usage.get(k, 0)
+                for j, cam in enumerate(batch):
+                    if j in partial:
+                        all_results[batch_idx[j]] = partial[j]
+                    # Keep results on_result already placed
+                    if all_results[batch_idx[j]] is not None:
+                        continue
+                    all_results[batch_idx[j]] = {"Vehicle": cam["Vehicle"], "Size": cam["Size"], "success": False, "error_code": "BATCH_FAILED"}
+
+        await save_checkpoint(f"batch_{i:05d}", batch_idx, batch_usage)
+
+        # Batch specific stats
+        batch_results = [all_results[k] for k in batch_idx]
+        batch_success = sum(1 for r in batch_results if r and r.get("success"))
+        done = sum(1 for r in all_results if r is not None)
+        rate = done / max(time.monotonic() - t_start, 1e-6) * 60
+        logging.info(f"   📊 Batch {i+1} Result: {batch_success}/{len(batch)} CAMs succeeded "
+                     f"({done}/{total_cams} done, {rate:,.0f} CAMs/min).")
+
+        if batch_success < len(batch):
+            # Log first few errors to help debugging
+            errors_logged = 0
+            for k, res in zip(batch_idx, batch_results):
+                if res and not res.get("success"):
+                    err = res.get("error_code") or res.get("error_type") or "Unknown Error"
+                    logging.warning(f"   ⚠️ Item {k} ({res.get('Vehicle', '?')}/{res.get('Size', '?')}) failed: {err}")
+                    errors_logged += 1
+                    if errors_logged >= 3: break # Don't spam
+
+        report_progress()
+
+    await asyncio.gather(*[run_batch(i, batch) for i, batch in enumerate(batches)])
 
     # Retry Logic (1 pass for individual failed items, distinct from batch retry)
     failed_indices = [i for i, r in enumerate(all_results) if not r or not r.get("success")]
     if failed_indices:
         logging.info(f"   🔄 Retrying {len(failed_indices)} failed CAMs (Individual Retry)...")
         failed_cams = [all_cams[i] for i in failed_indices]
-        retry_batches = [failed_cams[i:i+ctx.config.batch_size] for i in range(0, len(failed_cams), ctx.config.batch_size)]
-        
-        for i, batch in enumerate(retry_batches):
-            logging.info(f"   🔄 Retry Batch {i+1}/{len(retry_batches)} ({len(batch)} items)...")
-            try:
-                # Use the same robust fetch for retries
-                batch_resp = await fetch_batch_with_retry(ctx, client, run_id + "_retry", batch)
-                b_results = batch_resp.get("results", [])
-                
-                batch_start_failed = i * ctx.config.batch_size
-                for j, res in enumerate(b_results):
-                     # Aggregate usage
-                     usage = batch_resp.get("usage", {})
-                     for k in total_usage: total_usage[k] += usage.get(k, 0)
-                     
-                     if res.get("success"):
-                         orig_idx = failed_indices[batch_start_failed + j]
-                         all_results[orig_idx] = res
-            
-            except Exception as e:
-                logging.error(f"   ❌ Retry batch {i+1} failed completely: {e}")
+        retry_batches = [[failed_indices[j] for j in b] for b in
+                         plan_batches(failed_cams, ctx.config.batch_size, ctx.config.size_affinity_window)]
+
+        async def retry_batch(i, batch_idx):
+            batch = [all_cams[k] for k in batch_idx]
+            async with inflight:
+                logging.info(f"   🔄 Retry Batch {i+1}/{len(retry_batches)} ({len(batch)} items)...")
+                try:
+                    # Use the same robust fetch for retries
+                    batch_resp = await fetch_batch(ctx, client, run_id + "_retry", batch)
+                except Exception as e:
+                    logging.error(f"   ❌ Retry batch {i+1} failed completely: {e}")
+                    return
+
+            usage = batch_resp.get("usage", {})
+            for k in total_usage: total_usage[k] += usage.get(k, 0)
+            for j, res in enumerate(batch_resp.get("results", [])):
+                if res and res.get("success"):
+                    all_results[batch_idx[j]] = res
+            await save_checkpoint(f"retry_{i:05d}", batch_idx, usage)
+
+        await asyncio.gather(*[retry_batch(i, batch) for i, batch in enumerate(retry_batches)])
+        report_progress()
 
     # Final Report
     success_count = sum(1 for r in all_results if r and r.get("success"))
-    generate_cost_report(ctx, total_usage, success_count, total_cams)
+    local_count = sum(1 for r in all_results if r and r.get("ranker") == "local")
+    if local_count:
+        fallback_count = sum(1 for r in all_results if r and r.get("fallback_for"))
+        logging.info(f"   🧮 {local_count} CAMs answered by the local ranker ({fallback_count} as fallback).")
+    generate_cost_report(ctx, total_usage, success_count, total_cams, resumed=resumed, incremental=incremental,
+                         runlist=runlist_report)
     
     # Format for processing: List of (mode, results_flat)
     return [("GLOBAL", all_results)]
 
 
+def output_uri(ctx: Context, path: str) -> str:
+    # GCSBackend.resolve_path returns "root_prefix/path"
+    return f"gs://{ctx.config.aim_bucket_name}/{ctx.io.resolve_path(path)}"
+
+
 def write_aim_data(ctx: Context, df):
     # Upload AIMData to GCS and Load to BQ
     run_id = ctx.tracker.run_id # Use tracker's ID
-    basename = f"results_{run_id}.csv"
+    parquet = ctx.config.output_format == "parquet"
+    basename = f"results_{run_id}.{'parquet' if parquet else 'csv'}"
     
     # Save locally first (IOBackend)
     # If Cloud, we prefer tempfile but IOBackend is strict about paths relative to root.
@@ -305,8 +585,13 @@ def write_aim_data(ctx: Context, df):
     
     # Use output/ path in backend
     path = f"output/{basename}"
-    ctx.io.write_text(path, df.to_csv(index=False))
-    logging.info(f"✅ Wrote csv to {path}")
+    t0 = time.monotonic()
+    if parquet:
+        # Typed Arrow schema, streamed in row groups
+        write_parquet(ctx.io, path, df, AIM_DATA_SCHEMA)
+    else:
+        ctx.io.write_text(path, df.to_csv(index=False))
+    logging.info(f"✅ Wrote {'parquet' if parquet else 'csv'} to {path} ({time.monotonic() - t0:.2f}s)")
     ctx.tracker.update(output_file=basename)
 
     if ctx.config.aim_mode == "local":
@@ -319,67 +604,44 @@ def write_aim_data(ctx: Context, df):
     # We need to construct the gs:// URI for BQ.
     if ctx.config.aim_mode != "local":
          # Assume GCSBackend
-         # We need to know the bucket and key.
-         # Key inside backend is 'path' (resolved later by backend mechanics, but resolved path includes prefix?)
-         # GCSBackend.resolve_path returns "root_prefix/path".
-         object_name = ctx.io.resolve_path(path)
-         uri = f"gs://{ctx.config.aim_bucket_name}/{object_name}"
+         uri = output_uri(ctx, path)
          
          # Load BQ
          table_ref = f"{ctx.config.project_id}.{ctx.config.aim_dataset_id}.{ctx.config.aim_table_id}"
+         write_disposition = getattr(bigquery.WriteDisposition, ctx.config.bq_write_disposition, 'WRITE_TRUNCATE')
          
          from bq import load_table_from_uri
-         # Job Config...
-         j_conf = bigquery.LoadJobConfig(
-              source_format=bigquery.SourceFormat.CSV,
-              skip_leading_rows=1,
-              write_disposition=getattr(bigquery.WriteDisposition, ctx.config.bq_write_disposition, 'WRITE_TRUNCATE'),
-              autodetect=False,
-              # Schema hardcoded in main.py, replica here?
-              schema=[
-                  bigquery.SchemaField("Vehicle","STRING"),
-                  bigquery.SchemaField("Size","STRING"),
-                  bigquery.SchemaField("HB1","STRING"),
-                  bigquery.SchemaField("HB2","STRING"),
-                  bigquery.SchemaField("HB3","STRING"),
-                  bigquery.SchemaField("HB4","STRING"),
-                  *[bigquery.SchemaField(f"SKU{i}","STRING") for i in range(1,21)],
-              ]
-         )
+         if parquet:
+              # Parquet is self-describing: BigQuery reads the column types from the file
+              j_conf = bigquery.LoadJobConfig(
+                   source_format=bigquery.SourceFormat.PARQUET,
+                   write_disposition=write_disposition,
+              )
+         else:
+              # Job Config...
+              j_conf = bigquery.LoadJobConfig(
+                   source_format=bigquery.SourceFormat.CSV,
+                   skip_leading_rows=1,
+                   write_disposition=write_disposition,
+                   autodetect=False,
+                   # Schema hardcoded in main.py, replica here?
+                   schema=[
+                       bigquery.SchemaField("Vehicle","STRING"),
+                       bigquery.SchemaField("Size","STRING"),
+                       bigquery.SchemaField("HB1","STRING"),
+                       bigquery.SchemaField("HB2","STRING"),
+                       bigquery.SchemaField("HB3","STRING"),
+                       bigquery.SchemaField("HB4","STRING"),
+                       *[bigquery.SchemaField(f"SKU{i}","STRING") for i in range(1,21)],
+                   ]
+              )
+         t0 = time.monotonic()
          load_table_from_uri(ctx.bq, uri, table_ref, j_conf, ctx.config.dry_run)
+         logging.info(f"⏱️ AIMData load ({'parquet' if parquet else 'csv'}): {time.monotonic() - t0:.2f}s")
 
 
-def write_cam_sku(ctx: Context, df: pd.DataFrame):
-    """
-    Upload CAM_SKU staging data to a fixed schema staging table,
-    then run MERGE into CAM_SKU using aim_cam_sku_update.sql.
-    """
-    run_id = ctx.tracker.run_id
-    basename = f"cam_sku_{run_id}.csv"
-    path = f"output/{basename}"
-    ctx.io.write_text(path, df.to_csv(index=False))
-    logging.info(f"✅ Wrote CAM_SKU CSV to {path}")
-
-    if ctx.config.aim_mode == "local":
-        return
-
-    # Target and fixed staging
-    cam_table_id = ctx.config.cam_table_id  # e.g. bqsqltesting.CAM_files.CAM_SKU
-
-    # IMPORTANT: set this to the table you created
-    staging_id = getattr(ctx.config, "cam_sku_staging_table_id", None) or "bqsqltesting.CAM_files.CAM_SKU_staging"
-
-    from bq import load_table_from_dataframe, execute_query
-
-    # Force schema (NO autodetect)
-    schema = [
-        bigquery.SchemaField("Vehicle", "STRING"),
-        bigquery.SchemaField("Size", "STRING"),
-        *[bigquery.SchemaField(f"HB{i}", "STRING") for i in range(1, 5)],
-        *[bigquery.SchemaField(f"SKU{i}", "STRING") for i in range(1, 21)],
-        bigquery.SchemaField("last_modified", "TIMESTAMP"),
-    ]
-
+def prepare_cam_sku_staging(df: pd.DataFrame) -> pd.DataFrame:
+    """CAM_SKU rows in the staging schema: trimmed keys, blank/'-'/FormatError ids as NULL, last_modified set."""
     df = df.copy()
     df["Vehicle"] = df["Vehicle"].astype("string").str.strip()
     df["Size"] = df["Size"].astype("string").str.strip()
@@ -406,14 +668,82 @@ def write_cam_sku(ctx: Context, df: pd.DataFrame):
         )
     if "last_modified" not in df.columns:
         df["last_modified"] = dt.datetime.now(dt.timezone.utc)
+    return df
+
+
+def write_cam_sku(ctx: Context, df: pd.DataFrame):
+    """
+    Upload CAM_SKU staging data to a fixed schema staging table,
+    then run MERGE into CAM_SKU using aim_cam_sku_update.sql.
+    With output_format parquet, the staging rows are written once as Parquet
+    through ctx.io and BigQuery loads that file directly.
+    With cam_sku_delta, only rows whose hash differs from the last merged run
+    are staged and merged; once the MERGE has succeeded, the hashes of the keys
+    it accepted are saved (rows it filters out are staged again next run).
+    """
+    run_id = ctx.tracker.run_id
+    parquet = ctx.config.output_format == "parquet"
+    basename = f"cam_sku_{run_id}.{'parquet' if parquet else 'csv'}"
+    path = f"output/{basename}"
+    if parquet:
+        df = prepare_cam_sku_staging(df)
+        write_parquet(ctx.io, path, df, CAM_SKU_SCHEMA)
+    else:
+        ctx.io.write_text(path, df.to_csv(index=False))
+        logging.info(f"✅ Wrote CAM_SKU CSV to {path}")
+
+    if ctx.config.aim_mode == "local":
+        return
+
+    # Target and fixed staging
+    cam_table_id = ctx.config.cam_table_id  # e.g. bqsqltesting.CAM_files.CAM_SKU
+
+    # IMPORTANT: set this to the table you created
+    staging_id = getattr(ctx.config, "cam_sku_staging_table_id", None) or "bqsqltesting.CAM_files.CAM_SKU_staging"
+
+    from bq import load_table_from_dataframe, load_table_from_uri, execute_query
+
+    staging = df if parquet else prepare_cam_sku_staging(df)
+    delta = ctx.config.cam_sku_delta
+    # A full restage still records the hashes, so the next delta run starts from what was merged
+    previous = load_row_hashes(ctx.io, cam_table_id) if delta else {}
+    changed, keys, hashes = changed_rows(staging, previous)
+    if delta:
+        logging.info(f"🔁 CAM_SKU delta: {int(changed.sum())}/{len(staging)} rows new or changed "
+                     f"({len(previous)} hashes from previous runs)")
+        if not changed.any():
+            logging.info("⏭️ No CAM_SKU changes since the last merge, skipping staging load and MERGE.")
+            return
+        if not changed.all():
+            staging = staging[changed]
+            if parquet:
+                path = f"output/cam_sku_delta_{run_id}.parquet"
+                write_parquet(ctx.io, path, staging, CAM_SKU_SCHEMA)
 
     # 1) Load staging table (truncate each run)
-    j_conf = bigquery.LoadJobConfig(
-        write_disposition="WRITE_TRUNCATE",
-        autodetect=False,
-        schema=schema
-    )
-    load_table_from_dataframe(ctx.bq, df, staging_id, j_conf, ctx.config.dry_run)
+    t0 = time.monotonic()
+    if parquet:
+        j_conf = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition="WRITE_TRUNCATE",
+        )
+        load_table_from_uri(ctx.bq, output_uri(ctx, path), staging_id, j_conf, ctx.config.dry_run)
+    else:
+        # Force schema (NO autodetect)
+        schema = [
+            bigquery.SchemaField("Vehicle", "STRING"),
+            bigquery.SchemaField("Size", "STRING"),
+            *[bigquery.SchemaField(f"HB{i}", "STRING") for i in range(1, 5)],
+            *[bigquery.SchemaField(f"SKU{i}", "STRING") for i in range(1, 21)],
+            bigquery.SchemaField("last_modified", "TIMESTAMP"),
+        ]
+        j_conf = bigquery.LoadJobConfig(
+            write_disposition="WRITE_TRUNCATE",
+            autodetect=False,
+            schema=schema
+        )
+        load_table_from_dataframe(ctx.bq, staging, staging_id, j_conf, ctx.config.dry_run)
+    logging.info(f"⏱️ CAM_SKU staging load ({'parquet' if parquet else 'dataframe'}): {time.monotonic() - t0:.2f}s")
 
     # 2) Execute MERGE (staging -> target)
     # The SQL file is in the root (parent of stages/)
@@ -427,25 +757,46 @@ def write_cam_sku(ctx: Context, df: pd.DataFrame):
         .replace("{cam_table_id}", cam_table_id)
         .replace("{staging_table_id}", staging_id)
     )
-    execute_query(ctx.bq, sql, ctx.config.dry_run)
-    logging.info("✅ CAM_SKU merge executed successfully.")
+    # Staging holds only the new/changed rows on delta runs, so the MERGE reads all of it
+    rows = execute_query(ctx.bq, sql, ctx.config.dry_run)
+    logging.info(f"✅ CAM_SKU merge executed successfully ({len(staging)} rows staged).")
+
+    if not ctx.config.dry_run:
+        # The script ends by returning the staged keys the MERGE accepted
+        accepted = {row["stage_key"] for row in rows}
+        kept = [(k, h) for k, h in zip(keys, hashes) if k in accepted or previous.get(k) == h]
+        rejected = int(changed.sum()) - sum(1 for k, h in kept if previous.get(k) != h)
+        if rejected:
+            logging.warning(f"⚠️ CAM_SKU MERGE dropped {rejected} staged rows (no vehicle mapping or unparseable size); "
+                            f"they will be staged again next run.")
+        save_row_hashes(ctx.io, cam_table_id, previous, [k for k, _ in kept], [h for _, h in kept])
 
 
 def datetime_now_str():
     return dt.datetime.now().strftime("%Y%m%d_%H%M%S")
 
-def generate_cost_report(ctx: Context, total_usage: dict, success: int, total: int):
+def generate_cost_report(ctx: Context, total_usage: dict, success: int, total: int, resumed: int = 0,
+                         incremental: dict = None, runlist: dict = None):
     """
     Calculates cost based on Gemini 2.5 Flash-Lite pricing and records it.
     Input: £0.072505 / 1M tokens, Output: £0.29002 / 1M tokens
+    Cached input tokens (part of prompt_token_count) are billed at 25% of the input price.
+    total_usage includes the usage of checkpointed batches when a run was resumed
+    (resumed = CAMs restored from the checkpoint).
+    incremental ({"checked", "carried_forward"}) adds the change rate and the calls
+    skipped by carrying unchanged CAMs forward, priced at this run's cost per CAM.
+    runlist ({"rows", "repaired", "duplicates_dropped"}) records the pre-dispatch dedup.
     """
     input_price = 0.072505 / 1_000_000
     output_price = 0.29002 / 1_000_000
+    cached_input_price = input_price * 0.25
     
     input_tokens = total_usage.get("prompt_token_count", 0)
     output_tokens = total_usage.get("candidates_token_count", 0)
+    cached_tokens = min(total_usage.get("cached_content_token_count", 0) or 0, input_tokens)
     
-    total_cost = (input_tokens * input_price) + (output_tokens * output_price)
+    total_cost = ((input_tokens - cached_tokens) * input_price) + (cached_tokens * cached_input_price) + (output_tokens * output_price)
+    cache_saving = cached_tokens * (input_price - cached_input_price)
     
     report = {
         "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
@@ -454,17 +805,39 @@ def generate_cost_report(ctx: Context, total_usage: dict, success: int, total: i
         "units": {
             "cams_attempted": total,
             "cams_succeeded": success,
+            "cams_resumed": resumed,
         },
         "usage": total_usage,
-        "estimated_cost_gbp": round(total_cost, 5)
+        "cached_input_ratio": round(cached_tokens / input_tokens, 4) if input_tokens else 0.0,
+        "estimated_cost_gbp": round(total_cost, 5),
+        "estimated_cache_saving_gbp": round(cache_saving, 5)
     }
     
+    if runlist is not None:
+        report["runlist"] = {**runlist, "calls_avoided": runlist.get("duplicates_dropped", 0)}
+
+    if incremental is not None:
+        carried = incremental.get("carried_forward", 0)
+        checked = incremental.get("checked", 0)
+        generated = total - carried
+        report["incremental"] = {
+            "cams_checked": checked,
+            "cams_carried_forward": carried,
+            "change_rate": round((checked - carried) / checked, 4) if checked else 1.0,
+            "skipped_calls": carried,
+            "estimated_saving_gbp": round(total_cost / generated * carried, 5) if generated else 0.0,
+        }
+
     # Log to console
     logging.info("=" * 40)
     logging.info("📊 STAGE 4 COST REPORT")
-    logging.info(f"   Tokens: {input_tokens:,} in / {output_tokens:,} out")
-    logging.info(f"   Cost:   £{total_cost:.5f}")
+    logging.info(f"   Tokens: {input_tokens:,} in ({cached_tokens:,} cached) / {output_tokens:,} out")
+    logging.info(f"   Cost:   £{total_cost:.5f} (cache saved £{cache_saving:.5f})")
     logging.info(f"   Success: {success}/{total}")
+    if incremental is not None:
+        inc = report["incremental"]
+        logging.info(f"   Incremental: {inc['skipped_calls']} calls skipped, change rate {inc['change_rate']:.1%}, "
+                     f"saved ~£{inc['estimated_saving_gbp']:.5f}")
     logging.info("=" * 40)
     
     # Save via IOBackend
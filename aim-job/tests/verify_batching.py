@@ -0,0 +1,42 @@
+import unittest
+import logging
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from stages.batching import plan_batches, distinct_sizes
+
+
+def cams(sizes):
+    return [{"Vehicle": f"V{i}", "Size": s} for i, s in enumerate(sizes)]
+
+
+class TestBatchPlanner(unittest.TestCase):
+    def test_window_zero_is_priority_slicing(self):
+        runlist = cams(["205/55 R16", "195/65R15", "205/55R16"] * 3)
+        self.assertEqual(plan_batches(runlist, 4), [[0, 1, 2, 3], [4, 5, 6, 7], [8]])
+
+    def test_sizes_grouped_within_window(self):
+        # "205/55R16" and "205/55 r16" are the same canonical size
+        runlist = cams(["205/55 R16", "195/65 R15", "205/55R16", "225/45 R17",
+                        "195/65 R15", "205/55 r16", "225/45 R17", "195/65 R15"])
+        batches = plan_batches(runlist, 2, window_batches=2)
+
+        # CAMs never leave their window of 2 batches x 2 CAMs; sizes ordered by their
+        # highest-priority CAM, priority order within a size
+        self.assertEqual(batches, [[0, 2], [1, 3], [4, 7], [5, 6]])
+        self.assertEqual([distinct_sizes(runlist, b) for b in batches], [1, 2, 1, 2])
+
+    def test_fewer_distinct_sizes_than_slicing(self):
+        sizes = ["205/55 R16", "195/65 R15", "225/45 R17", "215/55 R18", "225/40 R18"]
+        runlist = cams([sizes[i % 5] for i in range(100)])
+        sliced = plan_batches(runlist, 10)
+        planned = plan_batches(runlist, 10, window_batches=5)
+        self.assertEqual(max(distinct_sizes(runlist, b) for b in sliced), 5)
+        self.assertEqual(max(distinct_sizes(runlist, b) for b in planned), 1)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.CRITICAL)
+    unittest.main()
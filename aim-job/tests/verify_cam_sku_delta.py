@@ -0,0 +1,133 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import logging
+import tempfile
+import pandas as pd
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from file_io.local_backend import LocalBackend
+from stages.cam_sku_delta import load_row_hashes, row_hash_path
+from stages.stage_4 import write_cam_sku
+
+
+def cam_rows(n, changed=()):
+    rows = []
+    for i in range(n):
+        row = {"Vehicle": f"FORD FOCUS {i}", "Size": "205/55 R16", "HB1": "10000001", "HB2": "-", "HB3": "", "HB4": ""}
+        row.update({f"SKU{k}": (f"1{k:07d}" if k < 18 else "") for k in range(1, 21)})
+        if i in changed:
+            row["HB1"] = "19999999"
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+class TestCamSkuDelta(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.io = LocalBackend(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_ctx(self, output_format="csv", delta=True):
+        ctx = MagicMock()
+        ctx.io = self.io
+        ctx.config.output_format = output_format
+        ctx.config.aim_mode = "cloud"
+        ctx.config.dry_run = False
+        ctx.config.cam_sku_delta = delta
+        ctx.config.cam_table_id = "p.d.CAM_SKU"
+        ctx.config.cam_sku_staging_table_id = "p.d.CAM_SKU_staging"
+        ctx.tracker.run_id = "run"
+        return ctx
+
+    def run_write(self, ctx, df, unmapped=()):
+        def merge(client, sql, dry_run):
+            # Stands in for the script's final SELECT: staged keys whose vehicle is mapped
+            if load_df.called:
+                staged = load_df.call_args.args[1]
+            else:
+                uri = load_uri.call_args.args[1]
+                staged = pd.read_parquet(self.io.resolve_path("output/" + uri.split("/output/")[-1]))
+            return [{"stage_key": f"{v}|{sz}"} for v, sz in zip(staged["Vehicle"], staged["Size"]) if v not in unmapped]
+
+        with patch("bq.load_table_from_dataframe") as load_df, patch("bq.load_table_from_uri") as load_uri, \
+                patch("bq.execute_query", side_effect=merge) as query:
+            write_cam_sku(ctx, df)
+        return load_df, load_uri, query
+
+    def test_only_new_or_changed_rows_are_staged(self):
+        ctx = self.make_ctx()
+        load_df, _, query = self.run_write(ctx, cam_rows(5))
+        self.assertEqual(len(load_df.call_args.args[1]), 5)
+        self.assertEqual(len(load_row_hashes(self.io, "p.d.CAM_SKU")), 5)
+
+        # last_modified moves on every run but is not part of the row hash
+        load_df, _, query = self.run_write(ctx, cam_rows(6, changed={2}))
+        staged = load_df.call_args.args[1]
+        self.assertEqual(staged["Vehicle"].tolist(), ["FORD FOCUS 2", "FORD FOCUS 5"])
+        sql = query.call_args.args[1]
+        self.assertIn("`p.d.CAM_SKU_staging`", sql)
+        self.assertNotIn("@stage_keys", sql)
+        self.assertEqual(len(load_row_hashes(self.io, "p.d.CAM_SKU")), 6)
+
+    def test_rows_dropped_by_the_merge_are_staged_again(self):
+        ctx = self.make_ctx()
+        self.run_write(ctx, cam_rows(3), unmapped={"FORD FOCUS 1"})
+        self.assertNotIn("FORD FOCUS 1|205/55 R16", load_row_hashes(self.io, "p.d.CAM_SKU"))
+
+        # Once the vehicle mapping exists, the unchanged row is staged and merged
+        load_df, _, query = self.run_write(ctx, cam_rows(3))
+        self.assertEqual(load_df.call_args.args[1]["Vehicle"].tolist(), ["FORD FOCUS 1"])
+        self.assertIn("SELECT DISTINCT stage_key FROM Stage", query.call_args.args[1])
+        self.assertEqual(len(load_row_hashes(self.io, "p.d.CAM_SKU")), 3)
+
+    def test_unchanged_run_skips_load_and_merge(self):
+        ctx = self.make_ctx()
+        self.run_write(ctx, cam_rows(3))
+        load_df, _, query = self.run_write(ctx, cam_rows(3))
+        load_df.assert_not_called()
+        query.assert_not_called()
+
+    def test_failed_merge_keeps_previous_hashes(self):
+        ctx = self.make_ctx()
+        with patch("bq.load_table_from_dataframe"), patch("bq.execute_query", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                write_cam_sku(ctx, cam_rows(3))
+        self.assertFalse(self.io.exists(row_hash_path("p.d.CAM_SKU")))
+        load_df, _, _ = self.run_write(ctx, cam_rows(3))
+        self.assertEqual(len(load_df.call_args.args[1]), 3)
+
+    def test_hashes_are_kept_per_target_table(self):
+        self.run_write(self.make_ctx(), cam_rows(3))
+
+        # A different CAM_SKU table (e.g. test instead of prod) has never received these rows
+        ctx = self.make_ctx()
+        ctx.config.cam_table_id = "p.test.CAM_SKU"
+        load_df, _, _ = self.run_write(ctx, cam_rows(3))
+        self.assertEqual(len(load_df.call_args.args[1]), 3)
+        self.assertEqual(len(load_row_hashes(self.io, "p.test.CAM_SKU")), 3)
+
+    def test_parquet_delta_loads_a_delta_file(self):
+        ctx = self.make_ctx(output_format="parquet")
+        self.run_write(ctx, cam_rows(4))
+        _, load_uri, _ = self.run_write(ctx, cam_rows(4, changed={1}))
+        self.assertTrue(load_uri.call_args.args[1].endswith("output/cam_sku_delta_run.parquet"))
+        delta = pd.read_parquet(self.io.resolve_path("output/cam_sku_delta_run.parquet"))
+        self.assertEqual(delta["Vehicle"].tolist(), ["FORD FOCUS 1"])
+
+    def test_delta_disabled_stages_everything(self):
+        ctx = self.make_ctx(delta=False)
+        self.run_write(ctx, cam_rows(3))
+        load_df, _, query = self.run_write(ctx, cam_rows(3))
+        self.assertEqual(len(load_df.call_args.args[1]), 3)
+        # The full restage resets the hashes for the next delta run
+        self.assertEqual(len(load_row_hashes(self.io, "p.d.CAM_SKU")), 3)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.CRITICAL)
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+import httpx
+import logging
+import tempfile
+import pandas as pd
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from file_io.local_backend import LocalBackend
+from stages.stage_4 import run_global_mode
+
+
+class Crash(BaseException):
+    """Simulates the job being killed mid-run (not caught by batch error handling)."""
+
+
+class TestCheckpointResume(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.io = LocalBackend(self.tmp.name)
+        self.runlist = pd.DataFrame({"Vehicle": [f"V {i}" for i in range(10)], "Size": ["205/55 R16"] * 10})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_ctx(self):
+        ctx = MagicMock()
+        ctx.io = self.io
+        ctx.config.total_overall = 10
+        ctx.config.batch_size = 2
+        ctx.config.max_inflight_batches = 1
+        ctx.config.size_affinity_window = 0
+        ctx.config.use_job_api = False
+        ctx.config.local_ranker_from = 0
+        ctx.config.run_mode = "GLOBAL"
+        ctx.config.checkpoints = True
+        ctx.config.checkpoint_max_age_h = 24
+        ctx.config.incremental = False
+        for name in ("goldilocks_zone_pct", "price_fluct_upper", "price_fluct_lower",
+                     "brand_enhancer", "model_enhancer", "season", "disable_search"):
+            setattr(ctx.config, name, None)
+        ctx.tracker.run_id = "run"
+        return ctx
+
+    async def run_mode(self, ctx, fetch):
+        ctx.waves.fetch_batch = AsyncMock(side_effect=fetch)
+        with patch("stages.stage_4.load_priority_runlist", return_value=self.runlist):
+            [(mode, results)] = await run_global_mode(ctx, AsyncMock(spec=httpx.AsyncClient))
+        return results
+
+    async def test_resumed_run_only_sends_missing_cams(self):
+        sent = []
+
+        async def fetch(client, run_id, cams, log_file_backend=None, on_result=None):
+            if int(cams[0]["Vehicle"][1:]) >= 6:
+                raise Crash()
+            sent.extend(c["Vehicle"] for c in cams)
+            # V3 fails in the first run and must be sent again
+            return {"results": [{"Vehicle": c["Vehicle"], "Size": c["Size"],
+                                 "success": c["Vehicle"] != "V 3"} for c in cams],
+                    "usage": {"prompt_token_count": len(cams)}}
+
+        with self.assertRaises(Crash):
+            await self.run_mode(self.make_ctx(), fetch)
+        self.assertEqual(sent, ["V 0", "V 1", "V 2", "V 3", "V 4", "V 5"])
+
+        async def resume_fetch(client, run_id, cams, log_file_backend=None, on_result=None):
+            sent.extend(c["Vehicle"] for c in cams)
+            return {"results": [{"Vehicle": c["Vehicle"], "Size": c["Size"], "success": True} for c in cams],
+                    "usage": {"prompt_token_count": len(cams)}}
+
+        sent.clear()
+        ctx = self.make_ctx()
+        results = await self.run_mode(ctx, resume_fetch)
+
+        self.assertEqual(sent, ["V 3", "V 6", "V 7", "V 8", "V 9"])
+        self.assertEqual([r["Vehicle"] for r in results], [f"V {i}" for i in range(10)])
+        self.assertTrue(all(r["success"] for r in results))
+        report = ctx.tracker.update.call_args_list[-1].kwargs.get("report")
+        self.assertEqual(report["usage"]["prompt_token_count"], 6 + 5)
+        self.assertEqual(report["units"]["cams_resumed"], 5)
+
+        # Once complete, the same runlist starts a fresh run
+        ctx.checkpoint.complete()
+        sent.clear()
+        await self.run_mode(self.make_ctx(), resume_fetch)
+        self.assertEqual(len(sent), 10)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.CRITICAL)
+    unittest.main()
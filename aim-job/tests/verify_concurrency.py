@@ -0,0 +1,116 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+import httpx
+import logging
+import pandas as pd
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from stages.stage_4 import run_global_mode
+
+
+class TestInflightBatches(unittest.IsolatedAsyncioTestCase):
+    def make_ctx(self, max_inflight):
+        ctx = MagicMock()
+        ctx.config.total_overall = 10
+        ctx.config.batch_size = 2
+        ctx.config.max_inflight_batches = max_inflight
+        ctx.config.size_affinity_window = 0
+        ctx.config.checkpoints = False
+        ctx.config.incremental = False
+        ctx.config.use_job_api = False
+        ctx.config.local_ranker_from = 0
+        ctx.config.run_mode = "GLOBAL"
+        ctx.tracker.run_id = "run"
+        return ctx
+
+    async def run_mode(self, ctx, fetch):
+        runlist = pd.DataFrame({"Vehicle": [f"V {i}" for i in range(10)], "Size": ["205/55 R16"] * 10})
+        ctx.waves.fetch_batch = AsyncMock(side_effect=fetch)
+        with patch("stages.stage_4.load_priority_runlist", return_value=runlist):
+            [(mode, results)] = await run_global_mode(ctx, AsyncMock(spec=httpx.AsyncClient))
+        return results
+
+    async def test_batches_overlap_up_to_the_limit(self):
+        inflight, peak = 0, 0
+
+        async def fetch(client, run_id, cams, log_file_backend=None, on_result=None):
+            nonlocal inflight, peak
+            inflight += 1
+            peak = max(peak, inflight)
+            # Later batches finish first: results must still land at their own index
+            await asyncio.sleep(0.01 * (10 - int(cams[0]["Vehicle"][1:])) / 10)
+            inflight -= 1
+            return {"results": [{"Vehicle": c["Vehicle"], "success": True} for c in cams],
+                    "usage": {"prompt_token_count": len(cams)}}
+
+        ctx = self.make_ctx(max_inflight=3)
+        results = await self.run_mode(ctx, fetch)
+
+        self.assertEqual(peak, 3)
+        self.assertEqual([r["Vehicle"] for r in results], [f"V {i}" for i in range(10)])
+        report = ctx.tracker.update.call_args_list[-1].kwargs.get("report")
+        self.assertEqual(report["usage"]["prompt_token_count"], 10)
+
+    async def test_failed_batch_is_retried_once_with_usage_counted_once(self):
+        calls = []
+
+        async def fetch(client, run_id, cams, log_file_backend=None, on_result=None):
+            calls.append(run_id)
+            if cams[0]["Vehicle"] == "V 4" and not run_id.endswith("_retry"):
+                raise httpx.HTTPStatusError("400", request=MagicMock(), response=MagicMock(status_code=400))
+            return {"results": [{"Vehicle": c["Vehicle"], "success": True} for c in cams],
+                    "usage": {"prompt_token_count": len(cams)}}
+
+        ctx = self.make_ctx(max_inflight=1)
+        results = await self.run_mode(ctx, fetch)
+
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual(sum(1 for r in calls if r.endswith("_retry")), 1)
+        report = ctx.tracker.update.call_args_list[-1].kwargs.get("report")
+        self.assertEqual(report["usage"]["prompt_token_count"], 10)
+
+    async def test_streamed_results_survive_a_failed_batch(self):
+        retried = []
+
+        async def fetch(client, run_id, cams, log_file_backend=None, on_result=None):
+            if run_id.endswith("_retry"):
+                retried.extend(c["Vehicle"] for c in cams)
+            elif cams[0]["Vehicle"] == "V 4":
+                on_result(0, {"Vehicle": "V 4", "success": True})
+                raise httpx.HTTPStatusError("400", request=MagicMock(), response=MagicMock(status_code=400))
+            return {"results": [{"Vehicle": c["Vehicle"], "success": True} for c in cams],
+                    "usage": {"prompt_token_count": len(cams)}}
+
+        ctx = self.make_ctx(max_inflight=1)
+        results = await self.run_mode(ctx, fetch)
+
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual(retried, ["V 5"])
+
+    async def test_streamed_progress_reported_every_50_cams(self):
+        async def fetch(client, run_id, cams, log_file_backend=None, on_result=None):
+            for j, c in enumerate(cams):
+                on_result(j, {"Vehicle": c["Vehicle"], "success": True})
+            return {"results": [{"Vehicle": c["Vehicle"], "success": True} for c in cams], "usage": {}}
+
+        ctx = self.make_ctx(max_inflight=1)
+        ctx.config.total_overall = 120
+        ctx.config.batch_size = 40
+        runlist = pd.DataFrame({"Vehicle": [f"V {i}" for i in range(120)], "Size": ["205/55 R16"] * 120})
+        ctx.waves.fetch_batch = AsyncMock(side_effect=fetch)
+        with patch("stages.stage_4.load_priority_runlist", return_value=runlist):
+            await run_global_mode(ctx, AsyncMock(spec=httpx.AsyncClient))
+
+        attempted = [c.kwargs["progress"]["attempted"] for c in ctx.tracker.update.call_args_list
+                     if "progress" in c.kwargs]
+        # Two mid-stream reports (50th and 100th CAM) plus one per finished batch
+        self.assertEqual(attempted, [40, 50, 80, 100, 120])
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.CRITICAL)
+    unittest.main()
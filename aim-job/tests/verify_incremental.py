@@ -0,0 +1,106 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+import httpx
+import logging
+import tempfile
+import pandas as pd
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from file_io.local_backend import LocalBackend
+from stages.incremental import load_previous_results, save_results
+from stages.stage_4 import run_global_mode
+
+
+class TestIncrementalRuns(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.io = LocalBackend(self.tmp.name)
+        self.runlist = pd.DataFrame({"Vehicle": [f"V {i}" for i in range(6)], "Size": ["205/55 R16"] * 6})
+        # Engine-side input fingerprints; a change means the CAM must be generated again
+        self.inputs = {f"V {i}": f"fp{i}" for i in range(6)}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_ctx(self):
+        ctx = MagicMock()
+        ctx.io = self.io
+        ctx.config.total_overall = 6
+        ctx.config.batch_size = 2
+        ctx.config.max_inflight_batches = 1
+        ctx.config.size_affinity_window = 0
+        ctx.config.use_job_api = False
+        ctx.config.local_ranker_from = 0
+        ctx.config.run_mode = "GLOBAL"
+        ctx.config.checkpoints = False
+        ctx.config.incremental = True
+        ctx.tracker.run_id = "run"
+        return ctx
+
+    async def run_mode(self, ctx, sent):
+        async def fetch(client, run_id, cams, log_file_backend=None, on_result=None):
+            sent.extend(c["Vehicle"] for c in cams)
+            return {"results": [{"Vehicle": c["Vehicle"], "Size": c["Size"], "HB1": f"{c['Vehicle']}-new",
+                                 "success": c["Vehicle"] != "V 4", "input_fingerprint": self.inputs[c["Vehicle"]]}
+                                for c in cams],
+                    "usage": {"prompt_token_count": len(cams)}}
+
+        async def fingerprints(client, cams):
+            return [self.inputs[c["Vehicle"]] for c in cams]
+
+        ctx.waves.fetch_batch = AsyncMock(side_effect=fetch)
+        ctx.waves.fetch_fingerprints = AsyncMock(side_effect=fingerprints)
+        with patch("stages.stage_4.load_priority_runlist", return_value=self.runlist):
+            [(mode, results)] = await run_global_mode(ctx, AsyncMock(spec=httpx.AsyncClient))
+        return results
+
+    async def test_only_changed_or_failed_cams_are_dispatched(self):
+        sent = []
+        first = await self.run_mode(self.make_ctx(), sent)
+        save_results(self.io, first)
+        self.assertEqual(sorted(set(sent)), [f"V {i}" for i in range(6)])
+
+        # V2's rows changed, V5 lost its rows (no fingerprint), V4 failed last time
+        self.inputs["V 2"] = "fp2-changed"
+        self.inputs["V 5"] = None
+        sent.clear()
+        ctx = self.make_ctx()
+        results = await self.run_mode(ctx, sent)
+
+        self.assertEqual(sorted(set(sent)), ["V 2", "V 4", "V 5"])
+        self.assertEqual([r["Vehicle"] for r in results], [f"V {i}" for i in range(6)])
+        self.assertTrue(results[0]["carried_forward"])
+        self.assertEqual(results[0]["HB1"], "V 0-new")
+        self.assertNotIn("carried_forward", results[2])
+
+        report = ctx.tracker.update.call_args_list[-1].kwargs.get("report")
+        self.assertEqual(report["incremental"]["cams_checked"], 6)
+        self.assertEqual(report["incremental"]["skipped_calls"], 3)
+        self.assertEqual(report["incremental"]["change_rate"], 0.5)
+
+    async def test_no_previous_state_generates_everything(self):
+        sent = []
+        ctx = self.make_ctx()
+        await self.run_mode(ctx, sent)
+        ctx.waves.fetch_fingerprints.assert_not_called()
+        self.assertEqual(len(set(sent)), 6)
+
+    def test_fallbacks_and_reuses_are_not_carried_forward(self):
+        ok = {"Size": "205/55 R16", "success": True, "input_fingerprint": "fp"}
+        saved = save_results(self.io, [
+            {"Vehicle": "V 0", **ok},
+            {"Vehicle": "V 1", "ranker": "local", "fallback_for": "TIMEOUT", **ok},
+            {"Vehicle": "V 2", "ranker": "neighbour", "reused_from": {"Vehicle": "V 0"}, **ok},
+            {"Vehicle": "V 3", "ranker": "local", **ok},
+        ])
+
+        self.assertEqual(saved, 2)
+        self.assertEqual(sorted(v for v, _ in load_previous_results(self.io)), ["V 0", "V 3"])
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.CRITICAL)
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import MagicMock
+import logging
+import tempfile
+import pandas as pd
+import pyarrow.parquet as pq
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from file_io.local_backend import LocalBackend
+from stages.outputs import AIM_DATA_SCHEMA, write_parquet
+from stages.stage_4 import build_cam_sku_df_from_aim, write_aim_data, write_cam_sku
+
+
+def aim_rows(n):
+    rows = []
+    for i in range(n):
+        row = {"Vehicle": f"FORD FOCUS {i}", "Size": "205/55 R16", "HB1": "10000001", "HB2": "10000002",
+               "HB3": "-", "HB4": "FormatError"}
+        row.update({f"SKU{k}": (f"1{k:07d}" if k < 18 else "") for k in range(1, 21)})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+class TestParquetOutputs(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.io = LocalBackend(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_ctx(self):
+        ctx = MagicMock()
+        ctx.io = self.io
+        ctx.config.output_format = "parquet"
+        ctx.config.aim_mode = "local"
+        ctx.tracker.run_id = "run"
+        return ctx
+
+    def test_parquet_is_written_in_row_groups_with_typed_schema(self):
+        df = aim_rows(25)
+        self.assertEqual(write_parquet(self.io, "output/aim.parquet", df, AIM_DATA_SCHEMA, chunk_rows=10), 25)
+
+        f = pq.ParquetFile(self.io.resolve_path("output/aim.parquet"))
+        self.assertEqual(f.metadata.num_row_groups, 3)
+        self.assertEqual(f.schema_arrow, AIM_DATA_SCHEMA)
+        table = f.read()
+        # Empty strings become NULL, as in a CSV load
+        self.assertEqual(table.column("SKU19").null_count, 25)
+        self.assertEqual(table.column("Vehicle").to_pylist(), df["Vehicle"].tolist())
+
+    def test_aim_data_and_cam_sku_parquet_outputs(self):
+        ctx = self.make_ctx()
+        df = aim_rows(3)
+        write_aim_data(ctx, df)
+        write_cam_sku(ctx, build_cam_sku_df_from_aim(df))
+
+        aim = pq.read_table(self.io.resolve_path("output/results_run.parquet")).to_pandas()
+        self.assertEqual(aim["HB3"].tolist(), ["-"] * 3)
+        cam = pq.read_table(self.io.resolve_path("output/cam_sku_run.parquet"))
+        self.assertEqual(str(cam.schema.field("last_modified").type), "timestamp[us, tz=UTC]")
+        self.assertEqual(cam.column("HB3").null_count, 3)
+        self.assertEqual(cam.column("HB4").null_count, 3)
+        self.assertEqual(cam.column("SKU1").to_pylist(), ["10000001"] * 3)
+        ctx.tracker.update.assert_called_with(output_file="results_run.parquet")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.CRITICAL)
+    unittest.main()
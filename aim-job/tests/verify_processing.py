@@ -0,0 +1,44 @@
+import unittest
+import logging
+import numpy as np
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts")))
+
+from stages.processing import process_stage4_results, replace_duplicate_skus
+from benchmark_processing import KNOWN_MAKES, assert_same_output, legacy_process_stage4_results, synthetic_results
+
+
+class TestProcessStage4Results(unittest.TestCase):
+    def test_matches_the_row_wise_implementation(self):
+        results = synthetic_results(300, seed=11)
+        assert_same_output(process_stage4_results(results, KNOWN_MAKES),
+                           legacy_process_stage4_results(results, KNOWN_MAKES))
+
+    def test_duplicate_skus_keep_the_first_occurrence(self):
+        matrix = np.array([["A", "B", "A", "-", "-", "", "", "B"],
+                           ["C", "C", "C", "", "D", "", "D", "E"]], dtype=object)
+        out, replaced = replace_duplicate_skus(matrix)
+        self.assertEqual(out.tolist(), [["A", "B", "-", "-", "-", "", "", "-"],
+                                        ["C", "-", "-", "", "D", "", "-", "E"]])
+        self.assertEqual(replaced, 5)
+
+    def test_format_error_rows_and_duplicate_cams_are_dropped(self):
+        items = [
+            {"Vehicle": "FORD FOCUS", "Size": "205/55R16", "HB1": "10000001", "SKUs": ["10000002", "10000002.0"]},
+            {"Vehicle": "FORD FOCUS", "Size": "205/55 R16", "HB1": "10000009", "SKUs": []},
+            {"Vehicle": "KIA RIO", "Size": "185/65 R15", "HB1": "FormatError", "SKUs": []},
+        ]
+        aim_df, cam_df = process_stage4_results([("GLOBAL", items)], {"FORD", "KIA"})
+        self.assertEqual(aim_df["HB1"].tolist(), ["10000001"])
+        self.assertEqual(cam_df.iloc[0][["Make", "Model", "Width", "Profile", "Rim", "SKU1", "SKU2"]].tolist(),
+                         ["Ford", "Focus", "205", "55", "16", "10000002", "10000002"])
+        self.assertIsNone(cam_df.iloc[0]["SKU3"])
+        self.assertEqual(process_stage4_results([("GLOBAL", [])], set()), (None, None))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.CRITICAL)
+    unittest.main()
@@ -73,6 +73,23 @@ class TestRetryLogic(unittest.IsolatedAsyncioTestCase):
             self.assertEqual(ctx.waves.fetch_batch.call_count, 3)
             self.assertEqual(mock_sleep.call_count, 2) # Slept twice
 
+    async def test_429_honours_retry_after(self):
+        ctx = MagicMock()
+        ctx.config.max_overload_waits = 5
+        ctx.config.max_retry_after_s = 300
+        client = AsyncMock(spec=httpx.AsyncClient)
+
+        # Setup: Engine saturated 4 times (more than max_retries), then Success
+        resp_429 = httpx.Response(429, headers={"Retry-After": "7"})
+        error_429 = httpx.HTTPStatusError("429", request=MagicMock(), response=resp_429)
+        ctx.waves.fetch_batch = AsyncMock(side_effect=[error_429] * 4 + [{"results": [], "success": True}])
+
+        with patch('asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+            res = await fetch_batch_with_retry(ctx, client, "run_id", [], max_retries=2)
+
+            self.assertTrue(res["success"])
+            self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [7.0] * 4)
+
     async def test_fatal_error(self):
         ctx = MagicMock()
         client = AsyncMock(spec=httpx.AsyncClient)
@@ -0,0 +1,36 @@
+import unittest
+import logging
+import pandas as pd
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from stages.sizes import canonicalize_runlist
+
+
+class TestRunlistCanonicalisation(unittest.TestCase):
+    def test_duplicates_are_dropped_keeping_the_first_occurrence(self):
+        runlist = pd.DataFrame({
+            "Vehicle": ["ROVER90", "FORD FOCUS", "ROVER 90", "FORD FOCUS", "KIA RIO 1.2"],
+            "Size": ["205/55 R16", "205/55R16", "205/55R16", "205/55 R16", "185/65R15"],
+            "PriorityRank": [1, 2, 3, 4, 5],
+        })
+
+        out, report = canonicalize_runlist(runlist)
+
+        self.assertEqual(out["Vehicle"].tolist(), ["ROVER 90", "FORD FOCUS", "KIA RIO 1.2"])
+        self.assertEqual(out["Size"].tolist(), ["205/55 R16", "205/55 R16", "185/65 R15"])
+        self.assertEqual(out["PriorityRank"].tolist(), [1, 2, 5])
+        self.assertEqual(report, {"rows": 5, "repaired": 4, "duplicates_dropped": 2})
+
+    def test_size_text_in_vehicle_is_moved(self):
+        runlist = pd.DataFrame({"Vehicle": ["MINI COOPER 195/55R16"], "Size": [""]})
+        out, report = canonicalize_runlist(runlist)
+        self.assertEqual(out.iloc[0].tolist(), ["MINI COOPER", "195/55 R16"])
+        self.assertEqual(report["duplicates_dropped"], 0)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.CRITICAL)
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from unittest.mock import MagicMock
+import logging
+import tempfile
+import threading
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from file_io.local_backend import LocalBackend
+from stages import stage_1
+
+SALES = "\n".join(
+    f"{1000 + i},{mk},MODEL {i},205,55,16,{i % 3},{i % 5},{60 + i}.5"
+    for i, mk in enumerate(["FORD", " ford", "LAND ROVER", "KIA", "", "Mini"] * 5)
+) + "\n"
+TYRESCORE = "ProductId,Manufacturer,Size,Price,Wet Grip,PrevPrice7,PrevPrice28\n10000001,MICHELIN,205/55 R16,80.0,A,79.0,78.5\n"
+
+
+class TestStage1(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.io = LocalBackend(self.tmp.name)
+        self.io.write_text("daily/CarMakeModelSales.csv", SALES)
+        self.io.write_text("daily/TyreScore.csv", TYRESCORE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_ctx(self):
+        ctx = MagicMock()
+        ctx.io = self.io
+        ctx.config.aim_mode = "local"
+        ctx.config.dry_run = False
+        ctx.config.project_id = "p"
+        ctx.config.tyrescore_prefix = "daily/"
+        ctx.config.tyrescore_file_extension = ".csv"
+        return ctx
+
+    def test_loads_with_explicit_schemas_in_parallel(self):
+        ctx = self.make_ctx()
+        # Both load jobs must be in flight at the same time to pass the barrier
+        barrier = threading.Barrier(2, timeout=5)
+        loads = {}
+
+        def load(f, table_ref, job_config):
+            loads[table_ref] = (job_config, f.read())
+            barrier.wait()
+            return MagicMock()
+
+        ctx.bq.load_table_from_file.side_effect = load
+        makes = stage_1.run(ctx)
+
+        self.assertEqual(makes, {"FORD", "LAND ROVER", "KIA", "MINI"})
+        sales_conf, sales_bytes = loads["p.nexus_tyrescore.CarMakeModelSales"]
+        self.assertEqual(sales_bytes.decode(), SALES)
+        self.assertFalse(sales_conf.autodetect)
+        self.assertEqual(sales_conf.skip_leading_rows, 0)
+        self.assertEqual([(f.name, f.field_type) for f in sales_conf.schema][-3:],
+                         [("Orders", "INT64"), ("Units", "INT64"), ("AvgPrice", "FLOAT64")])
+
+        score_conf, _ = loads["p.nexus_tyrescore.TyreScore"]
+        self.assertEqual(score_conf.skip_leading_rows, 1)
+        self.assertEqual([(f.name, f.field_type) for f in score_conf.schema], [
+            ("ProductId", "INT64"), ("Manufacturer", "STRING"), ("Size", "STRING"), ("Price", "FLOAT64"),
+            ("Wet_Grip", "STRING"), ("PrevPrice7", "FLOAT64"), ("PrevPrice28", "FLOAT64"),
+        ])
+
+    def test_make_scan_reads_in_chunks(self):
+        makes = stage_1.scan_makes(self.io, "daily/CarMakeModelSales.csv", 1, header=False, chunk_rows=4)
+        self.assertEqual(makes, {"FORD", "LAND ROVER", "KIA", "MINI"})
+
+    def test_failed_load_is_logged_and_makes_still_returned(self):
+        ctx = self.make_ctx()
+        ctx.bq.load_table_from_file.side_effect = RuntimeError("quota")
+        with self.assertLogs(level="ERROR") as logs:
+            makes = stage_1.run(ctx)
+        self.assertEqual(len(makes), 4)
+        self.assertEqual(len(logs.output), 2)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.CRITICAL)
+    unittest.main()
@@ -0,0 +1,161 @@
+import json
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+import httpx
+import logging
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config import AimConfig
+from clients.waves import WavesClient, PartialBatchError
+from stages.stage_4 import fetch_batch_with_retry, fetch_batch_via_job
+
+
+def ndjson(records):
+    return "".join(json.dumps(r) + "\n" for r in records).encode()
+
+
+def result(i):
+    return {"type": "result", "index": i, "result": {"Vehicle": f"V{i}", "Size": "205/55 R16", "success": True,
+                                                     "usage": {"prompt_token_count": 10}}}
+
+
+class TestStreamingClient(unittest.IsolatedAsyncioTestCase):
+    def make_client(self):
+        conf = AimConfig()
+        conf.stream_results = True
+        conf.aim_waves_url = "http://engine"
+        return WavesClient(conf)
+
+    async def test_stream_consumed_incrementally(self):
+        body = ndjson([result(1), result(0), {"type": "summary", "run_id": "r", "usage": {"prompt_token_count": 20}}])
+
+        def handler(request):
+            assert request.headers["Accept"] == "application/x-ndjson"
+            return httpx.Response(200, content=body)
+
+        seen = []
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            resp = await self.make_client().fetch_batch(client, "r", [{}, {}], on_result=lambda i, r: seen.append(i))
+
+        self.assertEqual(seen, [1, 0])
+        self.assertEqual([r["Vehicle"] for r in resp["results"]], ["V0", "V1"])
+        self.assertEqual(resp["usage"]["prompt_token_count"], 20)
+
+    async def test_missing_summary_raises_partial(self):
+        body = ndjson([result(0)])
+        async with httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(200, content=body))) as client:
+            with self.assertRaises(PartialBatchError) as cm:
+                await self.make_client().fetch_batch(client, "r", [{}, {}])
+
+        self.assertEqual(list(cm.exception.results.keys()), [0])
+        self.assertEqual(cm.exception.usage["prompt_token_count"], 10)
+
+
+class TestPartialResume(unittest.IsolatedAsyncioTestCase):
+    async def test_only_missing_cams_resent(self):
+        ctx = MagicMock()
+        client = AsyncMock(spec=httpx.AsyncClient)
+        batch = [{"Vehicle": f"V{i}", "Size": "205/55 R16"} for i in range(3)]
+
+        partial = PartialBatchError({1: {"Vehicle": "V1", "success": True}}, {"prompt_token_count": 5})
+        second = {"results": [{"Vehicle": "V0", "success": True}, {"Vehicle": "V2", "success": True}],
+                  "usage": {"prompt_token_count": 7}}
+        ctx.waves.fetch_batch = AsyncMock(side_effect=[partial, second])
+
+        with patch('asyncio.sleep', new_callable=AsyncMock):
+            res = await fetch_batch_with_retry(ctx, client, "run_id", batch, max_retries=2)
+
+        resent = ctx.waves.fetch_batch.call_args_list[1].args[2]
+        self.assertEqual([c["Vehicle"] for c in resent], ["V0", "V2"])
+        self.assertEqual([r["Vehicle"] for r in res["results"]], ["V0", "V1", "V2"])
+        self.assertEqual(res["usage"]["prompt_token_count"], 12)
+
+    async def test_partial_results_kept_when_retries_run_out(self):
+        ctx = MagicMock()
+        client = AsyncMock(spec=httpx.AsyncClient)
+        batch = [{"Vehicle": f"V{i}", "Size": "205/55 R16"} for i in range(3)]
+
+        partial = PartialBatchError({1: {"Vehicle": "V1", "success": True}}, {"prompt_token_count": 5})
+        dropped = httpx.ConnectError("connection refused")
+        ctx.waves.fetch_batch = AsyncMock(side_effect=[partial, dropped, dropped])
+
+        with patch('asyncio.sleep', new_callable=AsyncMock):
+            with self.assertRaises(PartialBatchError) as cm:
+                await fetch_batch_with_retry(ctx, client, "run_id", batch, max_retries=2)
+
+        self.assertEqual(cm.exception.results, {1: {"Vehicle": "V1", "success": True}})
+        self.assertEqual(cm.exception.usage, {"prompt_token_count": 5})
+        self.assertIs(cm.exception.cause, dropped)
+
+
+class TestJobApi(unittest.IsolatedAsyncioTestCase):
+    async def test_job_polled_by_cursor_and_failed_resumed(self):
+        ctx = MagicMock()
+        ctx.config.job_poll_interval_s = 0
+        client = AsyncMock(spec=httpx.AsyncClient)
+        ok = lambda v: {"Vehicle": v, "success": True, "usage": {"prompt_token_count": 1}}
+
+        ctx.waves.submit_job = AsyncMock(return_value="job1")
+        ctx.waves.fetch_job_results = AsyncMock(side_effect=[
+            {"results": [{"index": 0, "result": ok("A")}], "next_cursor": 1, "has_more": False},
+            {"results": [{"index": 1, "result": {"Vehicle": "B", "success": False}}], "next_cursor": 2, "has_more": False},
+            {"results": [{"index": 1, "result": ok("B")}], "next_cursor": 3, "has_more": False},
+            {"results": [], "next_cursor": 3, "has_more": False},
+        ])
+        ctx.waves.get_job = AsyncMock(side_effect=[
+            {"status": "completed", "pending": 0, "failed": 1},
+            {"status": "completed", "pending": 0, "failed": 0},
+        ])
+        ctx.waves.resume_job = AsyncMock(return_value=[1])
+
+        seen = []
+        res = await fetch_batch_via_job(ctx, client, "run", [{}, {}], on_result=lambda i, r: seen.append(i))
+
+        self.assertEqual([r["Vehicle"] for r in res["results"]], ["A", "B"])
+        self.assertTrue(all(r["success"] for r in res["results"]))
+        self.assertEqual(ctx.waves.resume_job.call_count, 1)
+        self.assertEqual(seen, [0, 1, 1])
+        self.assertEqual(res["usage"]["prompt_token_count"], 2)
+
+    async def test_stalled_job_is_resumed_once_then_fails(self):
+        ctx = MagicMock()
+        ctx.config.job_poll_interval_s = 0
+        ctx.config.job_max_wait_s = 60
+        ctx.config.job_stall_polls = 3
+        client = AsyncMock(spec=httpx.AsyncClient)
+
+        ctx.waves.submit_job = AsyncMock(return_value="job1")
+        # One result, then nothing: the engine-side worker is gone
+        first = {"results": [{"index": 0, "result": {"Vehicle": "A", "success": True}}], "next_cursor": 1, "has_more": False}
+        empty = {"results": [], "next_cursor": 1, "has_more": False}
+        ctx.waves.fetch_job_results = AsyncMock(side_effect=[first] + [empty] * 50)
+        ctx.waves.get_job = AsyncMock(return_value={"status": "running", "pending": 1, "failed": 0})
+        ctx.waves.resume_job = AsyncMock(return_value=[])
+
+        seen = []
+        with self.assertRaises(TimeoutError):
+            await fetch_batch_via_job(ctx, client, "run", [{}, {}], on_result=lambda i, r: seen.append(i))
+
+        self.assertEqual(ctx.waves.resume_job.call_count, 1)
+        self.assertEqual(seen, [0])
+
+    async def test_job_fails_after_max_wait(self):
+        ctx = MagicMock()
+        ctx.config.job_poll_interval_s = 0
+        ctx.config.job_max_wait_s = 0
+        ctx.config.job_stall_polls = 100
+        client = AsyncMock(spec=httpx.AsyncClient)
+        ctx.waves.submit_job = AsyncMock(return_value="job1")
+        ctx.waves.fetch_job_results = AsyncMock(return_value={"results": [], "next_cursor": 0, "has_more": False})
+        ctx.waves.get_job = AsyncMock(return_value={"status": "running", "pending": 2, "failed": 0})
+
+        with self.assertRaises(TimeoutError):
+            await fetch_batch_via_job(ctx, client, "run", [{}, {}])
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.CRITICAL)
+    unittest.main()
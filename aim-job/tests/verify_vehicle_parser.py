@@ -0,0 +1,41 @@
+import unittest
+import logging
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts")))
+
+from stages.sizes import VehicleParser
+from benchmark_processing import KNOWN_MAKES, legacy_parse_vehicle_split, legacy_parse_size_split
+
+
+class TestVehicleParser(unittest.TestCase):
+    def test_longest_known_make_wins(self):
+        parser = VehicleParser({"LAND ROVER", "ROVER", "MERCEDES", "MERCEDES-BENZ"})
+        self.assertEqual(parser.split_vehicle("LAND ROVER DEFENDER 110"), ("Land Rover", "Defender 110"))
+        self.assertEqual(parser.split_vehicle("rover 75 tourer"), ("Rover", "75 Tourer"))
+        self.assertEqual(parser.split_vehicle("MERCEDES-BENZ C CLASS"), ("Mercedes-benz", "C Class"))
+        self.assertEqual(parser.split_vehicle("MERCEDESBENZ A"), ("Mercedes", "Benz A"))
+        self.assertEqual(parser.split_vehicle("LADA NIVA"), ("Unknown", "Lada Niva"))
+        self.assertEqual(parser.split_vehicle(None), ("Unknown", ""))
+
+    def test_matches_the_previous_split(self):
+        parser = VehicleParser(KNOWN_MAKES)
+        for vehicle in ["FORD FOCUS", "LAND ROVER RANGE ROVER SPORT", "ROVER 90", "MINI COOPER S", "  KIA  RIO ",
+                        "BMW", "VOLKSWAGENGOLF", "", "TESLA MODEL 3"]:
+            self.assertEqual(parser.split_vehicle(vehicle), legacy_parse_vehicle_split(vehicle, KNOWN_MAKES))
+        for size in ["205/55 R16", "225/40ZR18", "31x10.50 R15", "7.50 R16", "", None]:
+            self.assertEqual(parser.split_size(size), legacy_parse_size_split(size))
+
+    def test_repeats_are_memoized(self):
+        parser = VehicleParser({"ROVER"})
+        first = parser.repair("ROVER90", "205/55R16")
+        self.assertEqual(first, ("ROVER 90", "205/55 R16"))
+        self.assertIs(parser.repair("ROVER90", "205/55R16"), first)
+        self.assertIs(parser.split_vehicle("ROVER 90"), parser.split_vehicle("ROVER 90"))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.CRITICAL)
+    unittest.main()